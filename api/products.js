@@ -6,103 +6,124 @@ import { fileURLToPath } from 'url';
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+const DATA_DIR = path.join(__dirname, '..', 'data');
+
+// Known insurers, in id order; ids of the others come from _ids.json
+const COMPANY_REGISTRY = [
+  'Liberty Life Botswana (Pty) Limited',
+  'Metropolitan Life Botswana',
+  'Botsogo Health Plan',
+  'Botswana Public Officers Medical Aid Scheme (BPOMAS)',
+  'Pula Medical Aid Fund (Pulamed)'
+];
+
+// File name prefix -> category, for products that do not name one
+const FILE_PREFIX_CATEGORIES = {
+  funeral: 'funeral',
+  hospital: 'hospital_cash',
+  life: 'life',
+  medical: 'medical'
+};
+
+// Top-level collection -> normalizer
+const NORMALIZERS = {
+  plans: (plan, company) => ({
+    name: plan.plan_name || 'Unknown Plan',
+    category: plan.category || 'medical',
+    company,
+    annual_limit: plan.annual_limit,
+    co_payment: plan.co_payment,
+    hospital_network: plan.hospital_network,
+    waiting_period_natural: plan.waiting_period,
+    premiums: plan.premiums || [],
+    key_features: []
+  }),
+  products: (p, company, fileCategory) => ({
+    name: p.name || p.product_name || 'Unknown Product',
+    category: p.category || fileCategory,
+    company,
+    sum_assured: p.sum_assured,
+    premiums: p.premiums || [],
+    waiting_period_natural: p.waiting_period_natural,
+    key_features: p.key_features || []
+  })
+};
+
 // Load JSON data
 const loadJSON = (filename) => {
   try {
-    const filePath = path.join(__dirname, '..', 'data', filename);
-    const data = fs.readFileSync(filePath, 'utf8');
+    const data = fs.readFileSync(path.join(DATA_DIR, filename), 'utf8');
     return JSON.parse(data);
   } catch (error) {
     console.error(`Error loading ${filename}:`, error);
-    return { products: [], plans: [] };
+    return {};
   }
 };
 
-// Load all data
-const funeral = loadJSON('funeral_liberty_boago.json');
-const hospital = loadJSON('hospital_cashback.json');
-const life = loadJSON('life_metropolitan_mothusi.json');
-const botsogo = loadJSON('medical_botsogo_2025.json');
-const bpomas = loadJSON('medical_bpomas_2025.json');
-const pulamed = loadJSON('medical_pulamed_2025.json');
-
-// All products
-let allProducts = [];
+// Ids issued by the Python loader (backend/data_sources.py), keyed by insurer, category and name.
+// Ids are only ever issued there, so both APIs give every product the same id.
+const issued = loadJSON('_ids.json');
+const issuedIds = new Map(
+  (issued.products || []).map(entry => [JSON.stringify([entry.company, entry.category, entry.name, entry.copy || 0]), entry.id])
+);
+const companyIds = issued.companies || {};
 
-// Add products
-let id = 1;
+// First day a file's prices apply, from its document_year; null without one
+const effectiveFrom = (data) => {
+  const match = String(data.document_year || '').match(/\b(19|20)\d\d\b/);
+  return match ? `${match[0]}-01-01` : null;
+};
 
-// Liberty Funeral
-if (funeral.products) {
-  funeral.products.forEach(p => {
-    allProducts.push({
-      id: id++,
-      name: p.product_name || 'Unknown',
-      category: p.category || 'funeral',
-      company: 'Liberty Life Botswana (Pty) Limited',
-      sum_assured: p.sum_assured,
-      premiums: p.premiums || [],
-      waiting_period_natural: p.waiting_period_natural,
-      key_features: p.key_features || []
-    });
-  });
-}
+// Entries of the same insurer, category and name are versions of one product, as in
+// iter_products: a product already holding a version from a date starts a copy of its own
+const lineages = new Map();
+const companies = [...COMPANY_REGISTRY];
 
-// Liberty Hospital Cash
-if (hospital.products) {
-  hospital.products.forEach(p => {
-    allProducts.push({
-      id: id++,
-      name: p.product_name || 'Unknown',
-      category: p.category || 'hospital_cash',
-      company: 'Liberty Life Botswana (Pty) Limited',
-      sum_assured: p.sum_assured,
-      premiums: p.premiums || [],
-      waiting_period_natural: p.waiting_period_natural,
-      key_features: p.key_features || []
+fs.readdirSync(DATA_DIR)
+  .filter(filename => filename.endsWith('.json') && !filename.startsWith('_'))
+  .sort()
+  .forEach(filename => {
+    const data = loadJSON(filename);
+    const company = data.insurer || filename.replace(/\.json$/, '');
+    if (!companies.includes(company)) companies.push(company);
+    const fileCategory = FILE_PREFIX_CATEGORIES[filename.split('_')[0]];
+    const starts = effectiveFrom(data);
+    
+    Object.entries(NORMALIZERS).forEach(([collection, normalize]) => {
+      (data[collection] || []).forEach(entry => {
+        const product = { ...normalize(entry, company, fileCategory), effective_from: starts };
+        const base = JSON.stringify([company, product.category, product.name]);
+        const candidates = lineages.get(base) || [];
+        lineages.set(base, candidates);
+        let lineage = candidates.find(c => c.every(version => version.effective_from !== starts));
+        if (!lineage) {
+          lineage = [];
+          candidates.push(lineage);
+        }
+        lineage.push(product);
+      });
     });
   });
-}
 
-// Metropolitan Life
-if (life.products) {
-  life.products.forEach(p => {
-    allProducts.push({
-      id: id++,
-      name: p.product_name || 'Unknown',
-      category: p.category || 'life',
-      company: 'Metropolitan Life Botswana',
-      sum_assured: p.sum_assured,
-      premiums: p.premiums || [],
-      waiting_period_natural: p.waiting_period_natural,
-      key_features: p.key_features || []
-    });
+// All products, from every file in data/, described by their newest version
+let allProducts = [];
+lineages.forEach((candidates, base) => {
+  candidates.forEach((lineage, copy) => {
+    const [company, category, name] = JSON.parse(base);
+    const id = issuedIds.get(JSON.stringify([company, category, name, copy]));
+    if (id === undefined) {
+      console.warn(`No id issued for ${name} (${company}); run python backend/snapshot.py build`);
+      return;
+    }
+    lineage.sort((a, b) => (a.effective_from || '').localeCompare(b.effective_from || ''));
+    const product = { id, ...lineage[lineage.length - 1] };
+    if (lineage.length > 1) {
+      product.price_schedule = lineage.map(version => ({ effective_from: version.effective_from, premiums: version.premiums }));
+    }
+    allProducts.push(product);
   });
-}
-
-// Medical plans
-const addMedicalPlans = (plans, companyName) => {
-  if (plans) {
-    plans.forEach(plan => {
-      allProducts.push({
-        id: id++,
-        name: plan.plan_name || 'Unknown',
-        category: 'medical',
-        company: companyName,
-        annual_limit: plan.annual_limit,
-        co_payment: plan.co_payment,
-        hospital_network: plan.hospital_network,
-        waiting_period_natural: plan.waiting_period,
-        premiums: plan.premiums || [],
-        key_features: []
-      });
-    });
-  }
-};
-
-addMedicalPlans(botsogo.plans, 'Botsogo Health Plan');
-addMedicalPlans(bpomas.plans, 'Botswana Public Officers Medical Aid Scheme (BPOMAS)');
-addMedicalPlans(pulamed.plans, 'Pula Medical Aid Fund (Pulamed)');
+});
+allProducts.sort((a, b) => a.id - b.id);
 
 console.log(`Total products: ${allProducts.length}`);
 
@@ -140,6 +161,25 @@ export default function handler(req, res) {
     return;
   }
   
+  // GET /api/catalog - every category in one response
+  if (method === 'GET' && path === '/api/catalog') {
+    const fields = query.fields ? query.fields.split(',').map(f => f.trim()).filter(Boolean) : null;
+    const categories = {};
+    allProducts.forEach(p => {
+      let item = p;
+      if (fields) {
+        item = {};
+        fields.forEach(f => {
+          if (f in p) item[f] = p[f];
+        });
+      }
+      (categories[p.category] = categories[p.category] || []).push(item);
+    });
+    
+    res.status(200).json({ categories });
+    return;
+  }
+  
   // GET /api/compare
   if (method === 'GET' && path === '/api/compare') {
     const ids = query.product_ids ? query.product_ids.split(',').map(id => parseInt(id)) : [];
@@ -167,14 +207,7 @@ export default function handler(req, res) {
   
   // GET /api/companies
   if (method === 'GET' && path === '/api/companies') {
-    const companies = [
-      'Liberty Life Botswana (Pty) Limited',
-      'Metropolitan Life Botswana',
-      'Botsogo Health Plan',
-      'Botswana Public Officers Medical Aid Scheme (BPOMAS)',
-      'Pula Medical Aid Fund (Pulamed)'
-    ];
-    res.status(200).json(companies.map((name, idx) => ({ id: idx + 1, name })));
+    res.status(200).json(companies.map((name, idx) => ({ id: companyIds[name] || idx + 1, name })));
     return;
   }
   
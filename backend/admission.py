@@ -0,0 +1,257 @@
+"""Admission control for the CPU-bound endpoints: fail fast instead of queueing forever.
+
+The guarded handlers do their work on AnyIO's threadpool: server_json.py's
+are sync, server.py's hand it over with run_in_threadpool (or run_db). The
+pool takes every request it is given, so under a burst everyone waits and
+latency collapses for all. For each route in ROUTE_LIMITS,
+AdmissionMiddleware
+
+  * lets at most `concurrency` requests run at once;
+  * queues at most `queue` more, first in first out, each for at most
+    `timeout` seconds; a request whose estimated wait (queue position times
+    the route's recent service time) already exceeds that is refused on
+    arrival rather than after waiting for nothing, and requests whose
+    deadline passed while queued are dropped instead of being served late;
+  * rate-limits every client with a token bucket of `rate` requests per
+    second and `burst` capacity.
+
+Queue overflow and missed deadlines get a 503, rate limits a 429, both with
+Retry-After and right away. Active, queued and shed counts per route are
+exported on /metrics (app_admission_*).
+
+ADMISSION_ENABLED=0 turns it off. ADMISSION_CONCURRENCY, ADMISSION_QUEUE,
+ADMISSION_QUEUE_TIMEOUT, ADMISSION_RATE and ADMISSION_BURST scale every
+route's limits (e.g. ADMISSION_CONCURRENCY=2 doubles them). Clients are told
+apart by IP; set TRUST_FORWARDED_FOR=1 behind a proxy that appends to
+X-Forwarded-For, and TRUSTED_PROXY_HOPS to the number of such proxies in
+front of the app (1 by default). Entries to the left of those were written
+by the client and are ignored.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from metrics import LATENCY_BUCKETS, Histogram, format_labels, header, register_collector
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") == "1"
+TRUSTED_PROXY_HOPS = max(1, int(os.getenv("TRUSTED_PROXY_HOPS", "1")))
+# Token buckets kept per route; the least recently seen clients are forgotten first
+MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+# Weight of the newest request in a route's average service time
+SERVICE_TIME_WEIGHT = 0.1
+
+
+def _scale(name: str) -> float:
+    return float(os.getenv(name, "1"))
+
+
+class RouteLimit:
+    __slots__ = ("concurrency", "queue", "timeout", "rate", "burst")
+
+    def __init__(self, concurrency: int, queue: int, timeout: float, rate: float, burst: float):
+        self.concurrency = max(1, round(concurrency * _scale("ADMISSION_CONCURRENCY")))
+        self.queue = max(0, round(queue * _scale("ADMISSION_QUEUE")))
+        self.timeout = timeout * _scale("ADMISSION_QUEUE_TIMEOUT")
+        self.rate = rate * _scale("ADMISSION_RATE")
+        self.burst = max(1.0, burst * _scale("ADMISSION_BURST"))
+
+
+# Path -> limits, the same for both servers since both run these routes'
+# work on the threadpool. It runs 40 jobs at most; these leave room for the
+# cheap endpoints that never wait behind them.
+ROUTE_LIMITS = {
+    "/api/compare": RouteLimit(concurrency=16, queue=64, timeout=0.5, rate=20, burst=40),
+    "/api/products/calculate": RouteLimit(concurrency=16, queue=64, timeout=0.5, rate=20, burst=40),
+    "/api/quote": RouteLimit(concurrency=16, queue=64, timeout=0.5, rate=20, burst=40),
+    "/api/quote/batch": RouteLimit(concurrency=4, queue=8, timeout=2.0, rate=1, burst=5),
+}
+
+QUEUE_SECONDS = Histogram("app_admission_queue_seconds", "Time admitted requests waited for a slot", LATENCY_BUCKETS)
+
+
+class Shed(Exception):
+    """The request is refused; `status` and `retry_after` (seconds) say how"""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteGate:
+    """Concurrency slots, wait queue and client buckets of one route.
+
+    Only ever used from the event loop thread, so there are no locks.
+    """
+
+    def __init__(self, route: str, limit: RouteLimit):
+        self.route = route
+        self.limit = limit
+        self.active = 0
+        # (deadline, future) per queued request, oldest first
+        self.waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+        self.buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.service_time = 0.0
+        self.admitted = 0
+        self.shed: Dict[str, int] = {}
+
+    def take_token(self, client: str, now: float):
+        """Spend one of the client's tokens, or raise Shed(429)"""
+        limit = self.limit
+        bucket = self.buckets.pop(client, None)
+        if bucket is None:
+            bucket = [limit.burst, now]
+        else:
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+        self.buckets[client] = bucket
+        if len(self.buckets) > MAX_CLIENTS:
+            self.buckets.popitem(last=False)
+        if bucket[0] < 1:
+            raise Shed(429, "rate_limited", (1 - bucket[0]) / limit.rate if limit.rate else 60)
+        bucket[0] -= 1
+
+    async def acquire(self, now: float):
+        """Wait for a slot, or raise Shed(503) when the queue is full or the deadline can't be met"""
+        limit = self.limit
+        if self.active < limit.concurrency and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= limit.queue:
+            raise Shed(503, "queue_full", self.expected_wait(len(self.waiters)))
+        expected = self.expected_wait(len(self.waiters) + 1)
+        if expected > limit.timeout:
+            raise Shed(503, "deadline", expected)
+
+        # release() resolves the future: True hands over a slot, False means the deadline passed
+        future = asyncio.get_running_loop().create_future()
+        entry = (now + limit.timeout, future)
+        self.waiters.append(entry)
+        try:
+            admitted = await asyncio.wait_for(asyncio.shield(future), limit.timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._discard(entry)
+                raise Shed(503, "deadline", self.expected_wait(len(self.waiters)))
+            admitted = future.result()  # resolved just as the wait ran out
+        except asyncio.CancelledError:  # client went away or server shutting down
+            if future.done() and future.result():
+                self.release(0.0)
+            else:
+                self._discard(entry)
+            raise
+        if not admitted:
+            raise Shed(503, "expired", self.expected_wait(len(self.waiters)))
+        QUEUE_SECONDS.observe(time.monotonic() - now, route=self.route)
+
+    def release(self, elapsed: float):
+        """Free a slot and give it to the oldest waiter whose deadline has not passed"""
+        if elapsed:
+            # The first request sets the average; later ones move it by SERVICE_TIME_WEIGHT
+            self.service_time += (SERVICE_TIME_WEIGHT if self.service_time else 1.0) * (elapsed - self.service_time)
+        now = time.monotonic()
+        while self.waiters:
+            deadline, future = self.waiters.popleft()
+            if future.done():
+                continue
+            if deadline <= now:
+                # Serving it now would only produce an answer nobody waits for any more
+                future.set_result(False)
+                self.count_shed("expired")
+                continue
+            future.set_result(True)
+            return
+        self.active -= 1
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the request at `position` in the queue would get a slot"""
+        return position * self.service_time / self.limit.concurrency
+
+    def count_shed(self, reason: str):
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+
+    def _discard(self, entry):
+        try:
+            self.waiters.remove(entry)
+        except ValueError:
+            pass
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying ROUTE_LIMITS to the requests of those paths"""
+
+    def __init__(self, app, limits: Optional[Dict[str, RouteLimit]] = None):
+        self.app = app
+        self.gates = {route: RouteGate(route, limit) for route, limit in (limits or ROUTE_LIMITS).items()}
+        register_collector("admission", self.render)
+
+    async def __call__(self, scope, receive, send):
+        gate = self.gates.get(scope["path"]) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if gate is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        now = time.monotonic()
+        try:
+            gate.take_token(client_id(scope), now)
+            await gate.acquire(now)
+        except Shed as shed:
+            if shed.reason != "expired":
+                gate.count_shed(shed.reason)
+            scope["route_path"] = gate.route
+            await refuse(send, shed)
+            return
+
+        gate.admitted += 1
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.monotonic() - started)
+
+    def render(self) -> List[str]:
+        gates = sorted(self.gates.items())
+        lines = ["# TYPE app_admission_active gauge"]
+        lines.extend(f"app_admission_active{format_labels((('route', route),))} {gate.active}" for route, gate in gates)
+        lines.append("# TYPE app_admission_queue_depth gauge")
+        lines.extend(f"app_admission_queue_depth{format_labels((('route', route),))} {len(gate.waiters)}" for route, gate in gates)
+        lines.append("# TYPE app_admission_admitted_total counter")
+        lines.extend(f"app_admission_admitted_total{format_labels((('route', route),))} {gate.admitted}" for route, gate in gates)
+        lines.append("# TYPE app_admission_shed_total counter")
+        for route, gate in gates:
+            for reason, count in sorted(gate.shed.items()):
+                lines.append(f"app_admission_shed_total{format_labels((('route', route), ('reason', reason)))} {count}")
+        lines.extend(QUEUE_SECONDS.render())
+        return lines
+
+
+def client_id(scope, trusted_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = header(scope, b"x-forwarded-for", lower=False)
+        if forwarded:
+            # The rightmost entries were appended by our proxies; the one the
+            # outermost proxy appended is the address it saw the client at
+            hops = [hop.strip() for hop in forwarded.split(",")]
+            return hops[-min(trusted_hops, len(hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def refuse(send, shed: Shed):
+    detail = "Too many requests" if shed.status == 429 else "Server busy, try again shortly"
+    body = json.dumps({"detail": detail, "reason": shed.reason}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": shed.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(max(1, math.ceil(shed.retry_after))).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,76 @@
+"""Lookup latency of ProductCatalog vs. the old linear scans as the catalog grows.
+
+Run from the backend folder:  python benchmarks/bench_catalog.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog import ProductCatalog, comparison_row  # noqa: E402
+from data_sources import load_catalog_data  # noqa: E402
+from pricing import SalaryBands  # noqa: E402
+
+ALL_PRODUCTS, ALL_COMPANIES = load_catalog_data()
+
+SIZES = [30, 500, 5_000, 50_000]
+REPEAT = 200
+
+
+def synthetic_products(size):
+    """Replicate the real products until the catalog holds `size` entries"""
+    products = []
+    while len(products) < size:
+        for product in ALL_PRODUCTS:
+            if len(products) == size:
+                break
+            products.append(dict(product, id=len(products) + 1))
+    return products
+
+
+def linear_get(products, product_id):
+    return next((p for p in products if p.get("id") == product_id), None)
+
+
+def linear_filter(products, category, company):
+    filtered = [p for p in products if p.get("category") == category]
+    return [p for p in filtered if company.lower() in p["company"]["name"].lower()]
+
+
+def linear_compare(products, ids, salary):
+    """The old compare: scan for the ids and build every row per request"""
+    rows = []
+    for product in products:
+        if product.get("id") in ids:
+            row = comparison_row(product)
+            if "calculated_premium" in row:
+                row["calculated_premium"] = SalaryBands(product.get("premiums")).lookup(salary)
+            rows.append(row)
+    return rows
+
+
+def per_call_us(fn):
+    return timeit.timeit(fn, number=REPEAT) / REPEAT * 1e6
+
+
+def main():
+    print(f"{'products':>9} | {'get (scan/idx) us':>22} | {'filter (scan/idx) us':>22} | {'compare (scan/idx) us':>22}")
+    for size in SIZES:
+        products = synthetic_products(size)
+        catalog = ProductCatalog(products, ALL_COMPANIES)
+        last_id = products[-1]["id"]
+        ids = [1, size // 2, last_id]
+
+        rows = [
+            (per_call_us(lambda: linear_get(products, last_id)), per_call_us(lambda: catalog.get(last_id))),
+            (per_call_us(lambda: linear_filter(products, "medical", "pula")),
+             per_call_us(lambda: catalog.filter(category="medical", company="pula"))),
+            (per_call_us(lambda: linear_compare(products, ids, 6000)), per_call_us(lambda: catalog.compare(ids, 6000))),
+        ]
+        cells = " | ".join(f"{scan:>10.1f} / {idx:>9.2f}" for scan, idx in rows)
+        print(f"{size:>9} | {cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Product-list throughput of the sync and async database paths under concurrency.
+
+Seeds a throwaway SQLite database (or uses DATABASE_URL if set) and runs the
+same eager-loaded product-list query from CONCURRENCY concurrent clients:
+threads on the sync engine, asyncio tasks on the async engine. The lazy,
+N+1 version of the sync query is included for reference.
+
+Run from the backend folder:  python benchmarks/bench_db.py
+Needs aiosqlite (SQLite) or asyncpg (Postgres) for the async rows.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from sqlalchemy import select  # noqa: E402
+
+from database import AsyncSessionLocal, SessionLocal, get_async_engine  # noqa: E402
+from models import Product  # noqa: E402
+from queries import list_products  # noqa: E402
+from schemas import ProductResponse  # noqa: E402
+from seed_data import seed_database  # noqa: E402
+
+CONCURRENCY = [1, 8, 32]
+REQUESTS = 400
+
+
+def serialize(products):
+    return [ProductResponse.model_validate(product).model_dump() for product in products]
+
+
+def sync_eager():
+    with SessionLocal() as db:
+        return serialize(list_products(db))
+
+
+def sync_lazy():
+    with SessionLocal() as db:
+        return serialize(db.scalars(select(Product).order_by(Product.id)).all())
+
+
+async def async_eager():
+    # The same path server.py takes with DB_ASYNC: the sync helper through run_sync
+    async with AsyncSessionLocal() as db:
+        return serialize(await db.run_sync(list_products))
+
+
+def run_threads(fn, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: fn(), range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - started)
+
+
+async def run_tasks(fn, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await fn()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - started)
+
+
+def main():
+    seed_database()
+    print(f"{'clients':>7} | {'sync lazy req/s':>15} | {'sync eager req/s':>16} | {'async eager req/s':>17}")
+    for concurrency in CONCURRENCY:
+        lazy = run_threads(sync_lazy, concurrency)
+        eager = run_threads(sync_eager, concurrency)
+        try:
+            async_rate = f"{asyncio.run(run_tasks(async_eager, concurrency)):>17.0f}"
+        except ImportError as e:
+            async_rate = f"{'n/a (' + e.name + ')':>17}"
+        print(f"{concurrency:>7} | {lazy:>15.0f} | {eager:>16.0f} | {async_rate}")
+    try:
+        asyncio.run(get_async_engine().dispose())
+    except ImportError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""/api/products page latency vs. filtering and sorting the whole catalog per request.
+
+The first call of each sort order builds its presorted array; the timings are
+for the calls after that, which is what a running server sees.
+
+Run from the backend folder:  python benchmarks/bench_listing.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_catalog import ALL_COMPANIES, synthetic_products  # noqa: E402
+from catalog import ProductCatalog  # noqa: E402
+from listing import parse_sort  # noqa: E402
+
+SIZES = [5_000, 50_000]
+QUERIES = {
+    "medical by -annual_limit": dict(category="medical", sort="-annual_limit"),
+    "premium at P6000 <= 800": dict(salary=6000, ranges={"premium": (None, 800)}, sort="premium"),
+    "age 64, cover >= 20000": dict(age=64, ranges={"cover": (20000, None)}, sort="-cover,name"),
+}
+REPEAT = 50
+
+
+def full_sort(catalog, category=None, salary=None, age=None, ranges=None, sort=None):
+    """Filter and sort every product, then cut the first page"""
+    listing = catalog.listing()
+    segment = listing.segment(salary)
+    order = parse_sort(sort)
+    matches = []
+    for position, product in enumerate(catalog.products):
+        terms = catalog.terms(product)
+        if category and product["category"] != category:
+            continue
+        if age is not None and ((terms.age_min or 0) > age or (terms.age_max or 200) < age):
+            continue
+        values = {field: listing.values(field, segment)[position] for field in (ranges or {})}
+        if any(values[f] is None or (lo is not None and values[f] < lo) or (hi is not None and values[f] > hi)
+               for f, (lo, hi) in (ranges or {}).items()):
+            continue
+        matches.append(position)
+    columns = [listing.values(field, segment) for field, _ in order]
+    matches.sort(key=lambda p: tuple(((c[p] is None), c[p] or 0) for c in columns[:1]))
+    return [catalog.products[p] for p in matches[:100]]
+
+
+def per_call_us(fn, repeat=REPEAT):
+    return timeit.timeit(fn, number=repeat) / repeat * 1e6
+
+
+def main():
+    print(f"{'products':>9} | {'query':<26} | {'full sort us':>12} | {'page 1 us':>9} | {'page 20 us':>10}")
+    for size in SIZES:
+        catalog = ProductCatalog(synthetic_products(size), ALL_COMPANIES)
+        listing = catalog.listing()
+        for label, query in QUERIES.items():
+            args = dict(query, sort=parse_sort(query["sort"]))
+            listing.page(**args)  # build the presorted arrays
+            cursor = None
+            for _ in range(19):
+                _, cursor = listing.page(**args, cursor=cursor)
+            full = per_call_us(lambda: full_sort(catalog, **query), repeat=3)
+            first = per_call_us(lambda: listing.page(**args))
+            later = per_call_us(lambda: listing.page(**args, cursor=cursor))
+            print(f"{size:>9} | {label:<26} | {full:>12.0f} | {first:>9.0f} | {later:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""/api/quote/batch cost: QuoteEngine vs. checking every product's raw fields per profile.
+
+The naive version is what compare_products would need to grow into: walk the
+premiums list of each product for each profile.
+
+Run from the backend folder:  python benchmarks/bench_quote.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_catalog import ALL_COMPANIES, synthetic_products  # noqa: E402
+from catalog import ProductCatalog  # noqa: E402
+
+SIZES = [16, 500, 5_000]
+PROFILES = 5_000
+
+
+def random_profiles(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "age": rng.randint(18, 70),
+            "salary": rng.randrange(1_000, 40_000, 250),
+            "dependants": rng.randint(0, 6),
+            "cover": rng.choice([None, 10_000, 20_000, 50_000, 250_000]),
+        }
+        for _ in range(count)
+    ]
+
+
+def naive_quote(products, age, salary, dependants, cover, limit=5):
+    quotes = []
+    for product in products:
+        if (product.get("age_min") or 0) > age or (product.get("age_max") or 200) < age:
+            continue
+        premium = None
+        for option in product.get("premiums") or []:
+            if "cover_amount" in option:
+                if option["cover_amount"] >= (cover or 0) and (premium is None or option["monthly_premium"] < premium):
+                    premium = option["monthly_premium"]
+            elif (option.get("min_salary") or 0) <= salary <= (option.get("max_salary") or float("inf")):
+                premium = option["monthly_premium"]
+                break
+        quotes.append((premium is None, premium or 0, product["id"]))
+    return sorted(quotes)[:limit]
+
+
+def main():
+    profiles = random_profiles(PROFILES)
+    print(f"{PROFILES} profiles per batch")
+    print(f"{'products':>9} | {'naive ms':>9} | {'engine ms':>9} | {'distinct profiles':>17}")
+    for size in SIZES:
+        catalog = ProductCatalog(synthetic_products(size), ALL_COMPANIES)
+        engine = catalog.quotes()
+
+        started = time.perf_counter()
+        for profile in profiles:
+            naive_quote(catalog.products, **profile)
+        naive = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        engine.quote_many(profiles, limit=5)
+        quoted = (time.perf_counter() - started) * 1000
+
+        distinct = len({engine.key(**profile) for profile in profiles})
+        print(f"{size:>9} | {naive:>9.0f} | {quoted:>9.0f} | {distinct:>17}")
+
+
+if __name__ == "__main__":
+    main()
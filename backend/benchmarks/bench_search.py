@@ -0,0 +1,67 @@
+"""/api/search latency: SearchIndex vs. a substring scan over every product's text.
+
+The scan is what a client has to do today: fetch the whole catalog and test
+each product's text fields. Replicated catalogs are the index's worst case,
+since every word then occurs in a fixed share of all products.
+
+Run from the backend folder:  python benchmarks/bench_search.py
+"""
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_sources import load_catalog_data  # noqa: E402
+from search import FIELD_WEIGHTS, SearchIndex, field_text  # noqa: E402
+
+ALL_PRODUCTS, ALL_COMPANIES = load_catalog_data()
+
+SIZES = [500, 5_000, 50_000]
+QUERIES = ["funeral", "pulamed", "dental optical", "hosp", "chronic medicine specialist"]
+REPEAT = 50
+
+
+def synthetic_products(size):
+    """Replicate the real products until the catalog holds `size` entries"""
+    products = []
+    while len(products) < size:
+        for product in ALL_PRODUCTS:
+            if len(products) == size:
+                break
+            products.append(dict(product, id=len(products) + 1))
+    return products
+
+
+def linear_search(products, query):
+    words = query.lower().split()
+    matches = []
+    for product in products:
+        text = " ".join(field_text(product, field) for field in FIELD_WEIGHTS).lower()
+        if all(word in text for word in words):
+            matches.append(product)
+    return matches[:20]
+
+
+def per_call_us(fn, repeat=REPEAT):
+    return timeit.timeit(fn, number=repeat) / repeat * 1e6
+
+
+def main():
+    for size in SIZES:
+        products = synthetic_products(size)
+        started = time.perf_counter()
+        index = SearchIndex(products)
+        build_ms = (time.perf_counter() - started) * 1000
+        print(f"{size} products: index built in {build_ms:.0f} ms, {len(index.vocabulary)} words")
+        print(f"  {'query':<28} | {'matches':>7} | {'scan us':>10} | {'index us':>9}")
+        for query in QUERIES:
+            total, _ = index.search(query)
+            scan = per_call_us(lambda: linear_search(products, query), repeat=3)
+            indexed = per_call_us(lambda: index.search(query))
+            print(f"  {query:<28} | {total:>7} | {scan:>10.0f} | {indexed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Catalog start-up time: parsing data/ JSON vs. loading the compiled snapshot.
+
+Run from the backend folder:  python benchmarks/bench_startup.py
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog_store import CatalogStore  # noqa: E402
+from data_sources import discover  # noqa: E402
+from snapshot import build_snapshot  # noqa: E402
+from synthetic import replicate  # noqa: E402
+
+# How many copies of each real data file to start from
+COPIES = [1, 20, 200]
+REPEAT = 3
+
+
+def best_of(fn):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    print(f"{'files':>6} | {'products':>8} | {'json ms':>9} | {'snapshot ms':>11} | speed-up")
+    for copies in COPIES:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(tmp) / "data"
+            data_dir.mkdir()
+            replicate(data_dir, copies)
+            snapshot_path = Path(tmp) / "catalog.snapshot"
+            catalog = build_snapshot(data_dir, snapshot_path)
+
+            json_s = best_of(lambda: CatalogStore(data_dir).refresh())
+            snapshot_s = best_of(lambda: CatalogStore(data_dir).load_snapshot(snapshot_path))
+            files = len(discover(data_dir))
+            print(f"{files:>6} | {len(catalog):>8} | {json_s * 1e3:>9.1f} | {snapshot_s * 1e3:>11.1f} | {json_s / snapshot_s:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
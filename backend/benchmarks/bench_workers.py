@@ -0,0 +1,165 @@
+"""Per-worker memory at 1, 4 and 16 workers: separate imports vs. pre-forked catalogs.
+
+Modes:
+    independent      every worker imports the app itself, as `uvicorn --workers` does
+    preload          the parent imports the app once and forks (CATALOG_COMPACT=0, GC on)
+    preload_compact  compact catalog, warm_up() and gc.freeze() before forking (prefork.py)
+
+Each worker serves the load.py request mix in process, then reports its USS
+(pages only it holds) and PSS (its fair share of the pages it uses) from
+/proc/self/smaps_rollup while every worker is still alive. `total_mb` is the
+PSS of the parent plus all workers, i.e. what the deployment costs. Linux only.
+
+Results go to benchmarks/results/workers-<commit>.json; compare two runs with
+benchmarks/report.py.
+
+Run from the backend folder:
+    python benchmarks/bench_workers.py
+    python benchmarks/bench_workers.py --scales 10 --workers 1,4 --requests 50
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from load import ENDPOINTS, hammer  # noqa: E402
+from report import write  # noqa: E402
+from synthetic import scaled_data_dir  # noqa: E402
+
+MODES = ["independent", "preload", "preload_compact"]
+WORKERS = [1, 4, 16]
+SCALES = [100]
+# Requests per endpoint each worker serves before it is measured
+REQUESTS = 100
+
+
+def memory() -> Dict[str, float]:
+    """USS and PSS of this process in MB"""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"uss_mb": uss / 1024, "pss_mb": fields.get("Pss", 0) / 1024}
+
+
+def import_app(mode: str):
+    if mode == "preload_compact":
+        from prefork import preload
+        return preload("server_json:app")
+    import server_json
+    return server_json.app
+
+
+async def serve_requests(app, requests: int):
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for method, path, make_args in ENDPOINTS.values():
+                await hammer(client, method, path, make_args, requests, concurrency=4)
+    finally:
+        await app.router.shutdown()
+
+
+def run_worker(mode: str, app, requests: int, results_fd: int, release_fd: int):
+    """Child process: serve, report memory, then stay alive until every worker has reported"""
+    gc.enable()
+    if app is None:
+        app = import_app(mode)
+    asyncio.run(serve_requests(app, requests))
+    os.write(results_fd, (json.dumps(memory()) + "\n").encode())
+    os.read(release_fd, 1)
+
+
+def run_mode(mode: str, workers: int, requests: int) -> dict:
+    """Fork `workers` workers the way `mode` does and collect their memory"""
+    app = None if mode == "independent" else import_app(mode)
+    results_read, results_write = os.pipe()
+    release_read, release_write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(results_read)
+                os.close(release_write)
+                run_worker(mode, app, requests, results_write, release_read)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    os.close(results_write)
+    os.close(release_read)
+
+    rows = []
+    with os.fdopen(results_read) as results:
+        for _ in range(workers):
+            rows.append(json.loads(results.readline()))
+    parent = memory()
+    os.close(release_write)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    return {
+        "uss_mb": sum(row["uss_mb"] for row in rows) / workers,
+        "pss_mb": sum(row["pss_mb"] for row in rows) / workers,
+        "total_mb": parent["pss_mb"] + sum(row["pss_mb"] for row in rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--workers", default=",".join(map(str, WORKERS)), help="comma-separated worker counts")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="comma-separated multiples of data/")
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/workers-<commit>.json)")
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "WORKERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        mode, workers = args.run
+        print(json.dumps(run_mode(mode, int(workers), args.requests)))
+        return
+
+    results = []
+    print(f"{'mode':<16} | {'scale':>5} | {'workers':>7} | {'USS/worker MB':>13} | {'PSS/worker MB':>13} | {'total MB':>8}")
+    for scale in (int(scale) for scale in args.scales.split(",")):
+        with scaled_data_dir(scale) as data_dir, tempfile.TemporaryDirectory() as scratch:
+            for mode in args.modes.split(","):
+                for workers in (int(workers) for workers in args.workers.split(",")):
+                    # A fresh interpreter per run, so no run inherits another's heap
+                    env = dict(
+                        os.environ,
+                        DATA_DIR=str(data_dir),
+                        DATA_WATCH_INTERVAL="0",
+                        CATALOG_SNAPSHOT=str(Path(scratch) / "none.snapshot"),
+                        CATALOG_COMPACT="1" if mode == "preload_compact" else "0",
+                        LEAD_LOG_DIR=str(Path(scratch) / "leads"),
+                        ADMISSION_ENABLED="0",
+                        PYTHONPATH=str(Path(__file__).resolve().parent.parent),
+                    )
+                    command = [sys.executable, __file__, "--run", mode, str(workers), "--requests", str(args.requests)]
+                    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+                    row = dict(json.loads(output.strip().splitlines()[-1]), case=f"{mode} x{workers}", scale=scale)
+                    results.append(row)
+                    print(f"{mode:<16} | {scale:>5} | {workers:>7} | {row['uss_mb']:>13.1f} | "
+                          f"{row['pss_mb']:>13.1f} | {row['total_mb']:>8.1f}")
+
+    print(f"Results written to {write('workers', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""In-process load test: httpx against the ASGI app, no sockets, no server.
+
+Every endpoint in ENDPOINTS gets REQUESTS requests from CONCURRENCY
+concurrent clients, and its p50/p95/p99 latency and requests per second are
+reported. Each scale runs in a fresh interpreter with DATA_DIR pointing at a
+catalog that many times the size of data/, so caches and imports start cold
+the same way every time. The numbers include routing, validation and
+serialization but not the network or uvicorn's HTTP parsing.
+
+Results go to benchmarks/results/load-<commit>.json; compare two runs with
+benchmarks/report.py.
+
+Run from the backend folder:
+    python benchmarks/load.py                             # server_json, every scale
+    python benchmarks/load.py --app server --scales 10 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from report import write  # noqa: E402
+from synthetic import SCALES, scaled_data_dir  # noqa: E402
+
+REQUESTS = 2000
+CONCURRENCY = 32
+SEED = 42
+
+# name -> (method, path, query parameters or JSON body)
+ENDPOINTS = {
+    "products_page": ("GET", "/api/products", lambda rng: {"category": "medical", "limit": 50}),
+    "products_premium_sort": ("GET", "/api/products", lambda rng: {
+        "salary": rng.randrange(0, 40_000, 500), "sort": "premium", "max_premium": 1000, "limit": 50,
+    }),
+    "product_detail": ("GET", "/api/products/{id}", lambda rng: {}),
+    "calculate": ("GET", "/api/products/calculate", lambda rng: {"salary": rng.randrange(0, 40_000, 50)}),
+    "compare": ("GET", "/api/compare", lambda rng: {
+        "product_ids": ",".join(str(rng.randint(1, 16)) for _ in range(3)), "salary": rng.randrange(0, 40_000, 50),
+    }),
+    "search": ("GET", "/api/search", lambda rng: {"q": rng.choice(["funeral", "chronic", "dental optical", "hosp"])}),
+    "quote": ("POST", "/api/quote", lambda rng: {
+        "age": rng.randint(18, 70), "salary": rng.randrange(0, 40_000, 50), "dependants": rng.randint(0, 4),
+    }),
+    "catalog": ("GET", "/api/catalog", lambda rng: {"fields": "id,name,category"}),
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def hammer(client, method: str, path: str, make_args, requests: int, concurrency: int) -> dict:
+    rng = random.Random(SEED)
+    jobs = []
+    for _ in range(requests):
+        args = make_args(rng)
+        url = path.replace("{id}", str(rng.randint(1, 16)))
+        jobs.append((url, args))
+    queue = iter(jobs)
+    latencies: List[float] = []
+    errors = 0
+
+    async def client_loop():
+        nonlocal errors
+        for url, args in queue:
+            started = time.perf_counter()
+            if method == "GET":
+                response = await client.get(url, params=args)
+            else:
+                response = await client.post(url, json=args)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+
+
+async def run_worker(app_module: str, requests: int, concurrency: int, endpoints: List[str]) -> List[dict]:
+    """Load-test every endpoint of the app in this process (DATA_DIR is already set)"""
+    import httpx
+
+    module = __import__(app_module)
+    app = module.app
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            rows = []
+            for name in endpoints:
+                method, path, make_args = ENDPOINTS[name]
+                # One pass to fill the caches, as a server that has been up a while would have
+                await hammer(client, method, path, make_args, min(requests, 200), concurrency)
+                rows.append(dict(case=name, **await hammer(client, method, path, make_args, requests, concurrency)))
+            return rows
+    finally:
+        await app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="server_json", choices=["server_json", "server"])
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="comma-separated multiples of data/")
+    parser.add_argument("--generated", action="store_true", help="use generate_catalog.py catalogs instead of copies of data/")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated endpoint names")
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--admission", action="store_true", help="keep admission control on (see how much is shed)")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    endpoints = [name for name in args.endpoints.split(",") if name]
+
+    if args.worker:
+        rows = asyncio.run(run_worker(args.app, args.requests, args.concurrency, endpoints))
+        print(json.dumps(rows))
+        return
+
+    results = []
+    print(f"{'endpoint':<22} | {'scale':>5} | {'req/s':>8} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | errors")
+    for scale in (int(scale) for scale in args.scales.split(",")):
+        with scaled_data_dir(scale, args.generated) as data_dir, tempfile.TemporaryDirectory() as scratch:
+            env = dict(
+                os.environ,
+                DATA_DIR=str(data_dir),
+                DATA_WATCH_INTERVAL="0",
+                CATALOG_SNAPSHOT=str(Path(scratch) / "none.snapshot"),
+                LEAD_LOG_DIR=str(Path(scratch) / "leads"),
+                # One client hammering one route is exactly what the rate limits refuse
+                ADMISSION_ENABLED="1" if args.admission else "0",
+                PYTHONPATH=str(Path(__file__).resolve().parent.parent),
+            )
+            command = [
+                sys.executable, __file__, "--worker", "--app", args.app, "--endpoints", ",".join(endpoints),
+                "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+            ]
+            output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+            # The app prints its start-up lines first; the rows are the last line
+            for row in json.loads(output.strip().splitlines()[-1]):
+                row = dict(row, scale=scale, app=args.app)
+                results.append(row)
+                print(f"{row['case']:<22} | {scale:>5} | {row['rps']:>8.0f} | {row['p50_ms']:>7.2f} | "
+                      f"{row['p95_ms']:>7.2f} | {row['p99_ms']:>7.2f} | {row['errors']}")
+
+    print(f"Results written to {write('load', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Microbenchmarks of the hot paths at 10x, 100x and 1000x the size of data/.
+
+Each case is timed with timeit: the loop count is picked so one run takes
+at least 0.2 s, then the run is repeated and the median per-call time kept.
+Results go to benchmarks/results/micro-<commit>.json; compare two runs with
+benchmarks/report.py.
+
+Run from the backend folder:
+    python benchmarks/micro.py                      # every case at every scale
+    python benchmarks/micro.py --scales 10 --cases compare_products,quote
+"""
+import argparse
+import random
+import statistics
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog import ProductCatalog  # noqa: E402
+from data_sources import load_catalog_data  # noqa: E402
+from listing import parse_sort  # noqa: E402
+from parsing import extract_number  # noqa: E402
+from report import write  # noqa: E402
+from responses import EncodedPayload  # noqa: E402
+from synthetic import SCALES, scaled_data_dir  # noqa: E402
+
+REPEAT = 5
+SEED = 42
+
+
+def cases(data_dir: Path, catalog: ProductCatalog) -> Dict[str, Callable[[], object]]:
+    """name -> a call doing the work of one request (or one load)"""
+    rng = random.Random(SEED)
+    products = catalog.products
+    listing = catalog.listing()
+    medical = catalog.band_matrix("medical")
+    texts = [
+        str(product.get(field)) for product in products
+        for field in ("annual_limit", "sum_assured", "maternity_cover") if product.get(field)
+    ]
+    salaries = [rng.randrange(0, 60_000, 50) for _ in range(1024)]
+    id_sets = [rng.sample([product["id"] for product in products], 3) for _ in range(256)]
+    calls = {"salary": 0, "compare": 0}
+
+    def next_salary():
+        calls["salary"] += 1
+        return salaries[calls["salary"] % len(salaries)]
+
+    def compare_products():
+        calls["compare"] += 1
+        return catalog.compare(id_sets[calls["compare"] % len(id_sets)], next_salary())
+
+    return {
+        "load_all_data": lambda: load_catalog_data(data_dir),
+        "build_catalog": lambda: ProductCatalog(products, catalog.companies),
+        "extract_number": lambda: [extract_number(text) for text in texts],
+        # One salary priced against every medical plan, as /api/products/calculate does
+        "calculate_medical_premium": lambda: medical.row(next_salary()),
+        "salary_band_lookup": lambda: catalog.salary_bands(products[-1]).lookup(next_salary()),
+        "get_products_category_company": lambda: listing.page(category="medical", company="pula", limit=100),
+        "get_products_premium_sort": lambda: listing.page(
+            salary=next_salary(), ranges={"premium": (None, 1000)}, sort=parse_sort("premium"), limit=100
+        ),
+        "compare_products": compare_products,
+        "search": lambda: catalog.search("chronic medicine", limit=20),
+        "quote": lambda: catalog.quotes().quote(age=rng.randint(18, 70), salary=next_salary(), dependants=2, cover=20_000),
+        "encode_catalog_page": lambda: EncodedPayload.from_content(products[:100]),
+    }
+
+
+def time_call(fn: Callable[[], object]) -> dict:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [elapsed / number for elapsed in timer.repeat(repeat=REPEAT, number=number)]
+    return {
+        "median_us": statistics.median(runs) * 1e6,
+        "min_us": min(runs) * 1e6,
+        "loops": number,
+        "repeat": REPEAT,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="comma-separated multiples of data/")
+    parser.add_argument("--generated", action="store_true", help="use generate_catalog.py catalogs instead of copies of data/")
+    parser.add_argument("--cases", help="comma-separated case names (default: all)")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/micro-<commit>.json)")
+    args = parser.parse_args()
+    wanted = set(args.cases.split(",")) if args.cases else None
+
+    results = []
+    print(f"{'case':<32} | {'scale':>5} | {'products':>8} | {'median us':>11} | {'min us':>11}")
+    for scale in (int(scale) for scale in args.scales.split(",")):
+        with scaled_data_dir(scale, args.generated) as data_dir:
+            products, companies = load_catalog_data(data_dir)
+            catalog = ProductCatalog(products, companies)
+            for name, fn in cases(data_dir, catalog).items():
+                if wanted is not None and name not in wanted:
+                    continue
+                fn()  # first call builds lazy indexes; steady state is what is timed
+                row = dict(case=name, scale=scale, products=len(products), **time_call(fn))
+                results.append(row)
+                print(f"{name:<32} | {scale:>5} | {len(products):>8} | {row['median_us']:>11.1f} | {row['min_us']:>11.1f}")
+
+    print(f"Results written to {write('micro', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
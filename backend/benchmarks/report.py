@@ -0,0 +1,98 @@
+"""JSON results of the benchmark suite, and comparing two runs.
+
+micro.py and load.py write benchmarks/results/<kind>-<commit>.json. Compare
+two of them (e.g. main vs. a branch) with:
+
+    python benchmarks/report.py results/micro-abc1234.json results/micro-def5678.json
+
+Rows that got slower by more than --threshold (default 10%) are flagged and
+make the command exit with status 1, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def commit() -> str:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+                               cwd=Path(__file__).resolve().parent).stdout.strip()
+        return output.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment() -> dict:
+    return {
+        "commit": commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write(kind: str, results: List[dict], output: Optional[Path] = None) -> Path:
+    """Save one run's rows with the environment they were measured in"""
+    document = dict(environment(), kind=kind, results=results)
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{kind}-{document['commit']}.json"
+    Path(output).write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+    return Path(output)
+
+
+# The number compared per row; lower is better for both
+METRICS = {"micro": "median_us", "load": "p95_ms", "workers": "uss_mb"}
+
+
+def rows(document: dict) -> Dict[Tuple[str, int], float]:
+    field = METRICS[document["kind"]]
+    return {(row["case"], row["scale"]): row[field] for row in document["results"]}
+
+
+def compare(old: dict, new: dict, threshold: float) -> bool:
+    """Print old vs. new per row; True if any row regressed by more than `threshold`"""
+    if old["kind"] != new["kind"]:
+        raise SystemExit(f"Cannot compare a {old['kind']} run with a {new['kind']} run")
+    field = METRICS[new["kind"]]
+    before, after = rows(old), rows(new)
+    regressed = False
+    print(f"{old['commit']} -> {new['commit']} ({field})")
+    print(f"{'case':<34} | {'scale':>5} | {'before':>10} | {'after':>10} | change")
+    for key in sorted(after, key=lambda key: (key[0], key[1])):
+        if key not in before:
+            continue
+        change = after[key] / before[key] - 1 if before[key] else 0.0
+        flag = ""
+        if change > threshold:
+            flag, regressed = "  <- slower", True
+        print(f"{key[0]:<34} | {key[1]:>5} | {before[key]:>10.2f} | {after[key]:>10.2f} | {change:+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.10, help="slow-down that counts as a regression")
+    args = parser.parse_args()
+    old = json.loads(args.old.read_text(encoding="utf-8"))
+    new = json.loads(args.new.read_text(encoding="utf-8"))
+    sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Scaled catalogs for the benchmarks.
+
+A catalog at scale N holds N copies of every real data file, each under its
+own insurer, so it parses, indexes and prices like data/ but N times over.
+With `generated=True` it is a generate_catalog.py catalog of the same size
+instead: many distinct insurers, plans and texts rather than repeats.
+"""
+import json
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_sources import DATA_DIR, discover  # noqa: E402
+from generate_catalog import generate  # noqa: E402
+
+# Catalog sizes the suite runs at, as multiples of data/
+SCALES = [10, 100, 1000]
+
+
+def replicate(data_dir: Path, copies: int):
+    """Copy every data file `copies` times, each copy under its own insurer"""
+    for path in discover(DATA_DIR):
+        document = json.loads(path.read_text(encoding="utf-8"))
+        for copy in range(copies):
+            document_copy = dict(document, insurer=f"{document.get('insurer')} #{copy}")
+            (data_dir / f"{path.stem}_{copy}.json").write_text(json.dumps(document_copy), encoding="utf-8")
+
+
+@contextmanager
+def scaled_data_dir(scale: int, generated: bool = False) -> Iterator[Path]:
+    """A temporary data folder `scale` times the size of data/"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        data_dir.mkdir()
+        if generated:
+            files = discover(DATA_DIR)
+            products = sum(
+                len(document.get("plans") or document.get("products") or [])
+                for document in (json.loads(path.read_text(encoding="utf-8")) for path in files)
+            )
+            generate(data_dir, insurers=len(files) * scale, products=products * scale)
+        else:
+            replicate(data_dir, scale)
+        yield data_dir
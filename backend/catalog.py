@@ -0,0 +1,302 @@
+from bisect import bisect_right
+from datetime import date
+from heapq import merge
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from listing import ProductListing
+from metrics import span
+from parsing import ProductTerms, parse_terms
+from pricing import BandMatrix, PriceSchedule, SalaryBands
+from quote import QuoteEngine
+from search import SearchIndex
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Normalize a `fields=id,name,premiums` projection into a sorted tuple"""
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    return tuple(sorted(names)) or None
+
+
+def parse_as_of(as_of: Optional[str]) -> Optional[date]:
+    """`as_of=2024` (1 January) or `as_of=2024-06-30` as a date; ValueError for anything else"""
+    if not as_of:
+        return None
+    as_of = as_of.strip()
+    if len(as_of) == 4 and as_of.isdigit():
+        return date(int(as_of), 1, 1)
+    try:
+        return date.fromisoformat(as_of)
+    except ValueError:
+        raise ValueError(f"as_of must be a year or a YYYY-MM-DD date, not {as_of!r}")
+
+
+def project(product: dict, fields: Optional[Tuple[str, ...]]) -> dict:
+    if fields is None:
+        return product
+    return {key: value for key, value in product.items() if key in fields}
+
+
+def comparison_row(product: dict) -> dict:
+    """/api/compare row of a product; medical rows get the premium at the asked salary"""
+    row = {
+        "id": product.get("id"),
+        "name": product.get("name"),
+        "company": (product.get("company") or {}).get("name", ""),
+        "category": product.get("category", ""),
+        "image": product.get("image"),
+        "effective_from": product.get("effective_from"),
+        "key_features": product.get("key_features", []),
+        "waiting_period_natural": product.get("waiting_period_natural"),
+        "waiting_period_accidental": product.get("waiting_period_accidental"),
+    }
+    if product.get("category") == "medical":
+        row.update({
+            "annual_limit": product.get("annual_limit"),
+            "co_payment": product.get("co_payment"),
+            "hospital_network": product.get("hospital_network"),
+            "calculated_premium": None,
+        })
+    else:
+        row.update({
+            "sum_assured": product.get("sum_assured"),
+            "premiums": product.get("premiums", []),
+        })
+    return row
+
+
+def dated_row(row: dict, version: Optional[dict]) -> dict:
+    """`row` with the start date and premiums of another price version (None: nothing in force)"""
+    version = version or {}
+    row = {**row, "effective_from": version.get("effective_from")}
+    if "premiums" in row:
+        row["premiums"] = version.get("premiums", [])
+    return row
+
+
+def priced_row(row: dict, premium: Optional[float]) -> dict:
+    """`row` with its calculated premium filled in; rows without one are shared as they are"""
+    if premium is None or "calculated_premium" not in row:
+        return row
+    return {**row, "calculated_premium": premium}
+
+
+class ProductCatalog:
+    """In-memory product catalog with prebuilt lookup indexes.
+
+    Products are kept in load order and every index stores products in that
+    same order, so filtered results match what a linear scan would return.
+    `version` identifies the data the catalog was built from; caches of
+    anything derived from the catalog should include it in their keys.
+
+    Prices are those of each product's newest version unless an `as_of`
+    date is given. The start days of all price versions split time into
+    eras within which no product's price changes; `era(as_of)` numbers them,
+    and the premium matrices of past eras are built on first use and kept.
+    """
+
+    def __init__(self, products: Iterable[dict], companies: Iterable[dict], version: int = 1):
+        self.products: List[dict] = list(products)
+        self.companies: List[dict] = list(companies)
+        self.version = version
+
+        self._by_id: Dict[int, dict] = {}
+        self._position: Dict[int, int] = {}
+        self._by_category: Dict[str, List[dict]] = {}
+        self._by_company_id: Dict[int, List[dict]] = {}
+        self._by_category_company: Dict[Tuple[str, int], List[dict]] = {}
+
+        for position, product in enumerate(self.products):
+            product_id = product.get("id")
+            self._by_id[product_id] = product
+            self._position[product_id] = position
+
+            category = product.get("category")
+            company_id = product.get("company_id")
+            self._by_category.setdefault(category, []).append(product)
+            self._by_company_id.setdefault(company_id, []).append(product)
+            self._by_category_company.setdefault((category, company_id), []).append(product)
+
+        # Salary bands are compiled here so premium lookups never walk the premiums list
+        self._salary_bands: Dict[int, SalaryBands] = {
+            product.get("id"): SalaryBands(product.get("premiums")) for product in self.products
+        }
+        # Every price version of every product, and the days any of them starts
+        self._schedules: Dict[int, PriceSchedule] = {
+            product.get("id"): PriceSchedule(product, self._salary_bands[product.get("id")]) for product in self.products
+        }
+        self._era_starts: List[int] = sorted({day for schedule in self._schedules.values() for day in schedule.starts if day})
+        self._era_matrices: Dict[Tuple[Optional[str], int], BandMatrix] = {}
+
+        # The union of band edges per category is worked out up front as well
+        self._band_matrices: Dict[str, BandMatrix] = {
+            category: BandMatrix([self._salary_bands[p.get("id")] for p in products])
+            for category, products in self._by_category.items()
+        }
+
+        # Numbers in the free-text fields, parsed once instead of per request
+        self._terms: Dict[int, ProductTerms] = {product.get("id"): parse_terms(product) for product in self.products}
+
+        # /api/compare rows only need the salary-dependent premium merged in per request
+        self._comparison_rows: Dict[int, dict] = {product.get("id"): comparison_row(product) for product in self.products}
+
+        # Inverted index over product text for search()
+        self.search_index = SearchIndex(self.products)
+
+        # Premiums of every product per salary band segment, sorted views for
+        # paginated listings and compiled quote pricers, all built on first use
+        self._premium_matrix: Optional[BandMatrix] = None
+        self._listing: Optional[ProductListing] = None
+        self._quotes: Optional[QuoteEngine] = None
+
+        # Lowercase names are computed once here instead of once per product per request
+        self._company_names: List[Tuple[str, int]] = [
+            (company["name"].lower(), company["id"]) for company in self.companies
+        ]
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id: int) -> Optional[dict]:
+        return self._by_id.get(product_id)
+
+    def position(self, product_id: int) -> int:
+        """Index of the product in `products`"""
+        return self._position[product_id]
+
+    def get_many(self, product_ids: Iterable[int]) -> List[dict]:
+        """Return the products for the given ids in catalog order, skipping unknown ids"""
+        positions = sorted({self._position[i] for i in product_ids if i in self._position})
+        return [self.products[position] for position in positions]
+
+    def compare(self, product_ids: Iterable[int], salary: Optional[float] = None, as_of: Optional[date] = None) -> List[dict]:
+        """Comparison rows of the given products in catalog order, medical ones priced at `salary`"""
+        rows = []
+        current = self.era(as_of) == self.latest_era
+        with span("premiums"):
+            for product in self.get_many(product_ids):
+                row = self._comparison_rows[product.get("id")]
+                if not current:
+                    row = dated_row(row, self.price_version(product, as_of))
+                if salary and "calculated_premium" in row:
+                    row = priced_row(row, self.salary_bands(product, as_of).lookup(salary))
+                rows.append(row)
+        return rows
+
+    def by_category(self, category: str) -> List[dict]:
+        return self._by_category.get(category, [])
+
+    def grouped(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, List[dict]]:
+        """All products grouped by category, optionally projected to `fields`"""
+        return {
+            category: [project(product, fields) for product in products]
+            for category, products in self._by_category.items()
+        }
+
+    def listing(self) -> ProductListing:
+        """Filtering, sorting and keyset pagination over this catalog"""
+        if self._listing is None:
+            self._listing = ProductListing(self)
+        return self._listing
+
+    def quotes(self) -> QuoteEngine:
+        """Eligibility and premiums of every product for a household profile"""
+        if self._quotes is None:
+            self._quotes = QuoteEngine(self)
+        return self._quotes
+
+    def schedule(self, product: dict) -> PriceSchedule:
+        schedule = self._schedules.get(product.get("id"))
+        if schedule is None:
+            schedule = PriceSchedule(product)
+        return schedule
+
+    def price_version(self, product: dict, as_of: Optional[date] = None) -> Optional[dict]:
+        """{"effective_from", "premiums"} in force on `as_of` (the product itself when None), or None"""
+        if as_of is None:
+            return product
+        return self.schedule(product).version(as_of.toordinal())
+
+    def salary_bands(self, product: dict, as_of: Optional[date] = None) -> SalaryBands:
+        if as_of is not None:
+            return self.schedule(product).bands_at(as_of.toordinal())
+        bands = self._salary_bands.get(product.get("id"))
+        if bands is None:
+            bands = SalaryBands(product.get("premiums"))
+        return bands
+
+    @property
+    def latest_era(self) -> int:
+        return len(self._era_starts)
+
+    def era(self, as_of: Optional[date] = None) -> int:
+        """Number of the era `as_of` falls in; the latest (newest prices) when None"""
+        if as_of is None:
+            return self.latest_era
+        return bisect_right(self._era_starts, as_of.toordinal())
+
+    def _era_matrix(self, category: Optional[str], era: int) -> BandMatrix:
+        """Premium matrix over `category` (every product when None) with the prices of a past era"""
+        matrix = self._era_matrices.get((category, era))
+        if matrix is None:
+            day = self._era_starts[era - 1] if era else 0
+            products = self.products if category is None else self.by_category(category)
+            matrix = BandMatrix([self._schedules[p.get("id")].bands_at(day) for p in products])
+            self._era_matrices[(category, era)] = matrix
+        return matrix
+
+    def terms(self, product: dict) -> ProductTerms:
+        terms = self._terms.get(product.get("id"))
+        if terms is None:
+            terms = parse_terms(product)
+        return terms
+
+    def band_matrix(self, category: str, as_of: Optional[date] = None) -> BandMatrix:
+        """Premium matrix over the products of a category, in `by_category` order"""
+        era = self.era(as_of)
+        if era != self.latest_era and category in self._band_matrices:
+            return self._era_matrix(category, era)
+        matrix = self._band_matrices.get(category)
+        if matrix is None:
+            # Unknown category: nothing to price, and not worth remembering
+            matrix = BandMatrix([])
+        return matrix
+
+    def warm(self):
+        """Build the parts that are otherwise built on first use, e.g. before forking workers"""
+        self.premium_matrix()
+        self.listing().page(limit=1)
+        self.quotes()
+
+    def premium_matrix(self, as_of: Optional[date] = None) -> BandMatrix:
+        """Premium matrix over every product, in catalog order"""
+        era = self.era(as_of)
+        if era != self.latest_era:
+            return self._era_matrix(None, era)
+        if self._premium_matrix is None:
+            self._premium_matrix = BandMatrix([self._salary_bands[p.get("id")] for p in self.products])
+        return self._premium_matrix
+
+    def match_companies(self, text: str) -> List[int]:
+        """Ids of companies whose name contains `text` (case-insensitive)"""
+        needle = text.lower()
+        return [company_id for name, company_id in self._company_names if needle in name]
+
+    def filter(self, category: Optional[str] = None, company: Optional[str] = None) -> List[dict]:
+        if not company:
+            return self.by_category(category) if category else self.products
+
+        if category:
+            postings = [self._by_category_company.get((category, cid), []) for cid in self.match_companies(company)]
+        else:
+            postings = [self._by_company_id.get(cid, []) for cid in self.match_companies(company)]
+
+        postings = [p for p in postings if p]
+        if len(postings) == 1:
+            return postings[0]
+        return list(merge(*postings, key=lambda p: self._position[p["id"]]))
+
+    def search(self, query: str, limit: int = 20, category: Optional[str] = None) -> Tuple[int, List[Tuple[dict, float]]]:
+        """(number of matches, best `limit` products with their BM25 scores)"""
+        return self.search_index.search(query, limit=limit, category=category)
@@ -0,0 +1,121 @@
+"""Hot-reloadable holder for the current ProductCatalog snapshot.
+
+Request handlers read `store.catalog` once and use that snapshot for the whole
+request. A reload parses only the data files whose mtime or size changed,
+builds a brand new catalog and swaps the reference in one assignment, so
+in-flight requests keep the snapshot they started with.
+
+Product ids come from the data folder's id map (see data_sources.IdMap), so
+a reload never renumbers products: ids and listing cursors handed out before
+a swap still point at the same products afterwards.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from catalog import ProductCatalog
+from data_sources import DATA_DIR, build_catalog_data, discover, read_sources
+from metrics import span
+from snapshot import SNAPSHOT_PATH, load_snapshot
+
+
+class CatalogStore:
+    def __init__(self, data_dir: Path = DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self.catalog: ProductCatalog = ProductCatalog([], [], version=0)
+        # path -> ((mtime_ns, size), parsed document or None if not parsed yet)
+        self._sources: Dict[Path, Tuple[Tuple[int, int], dict]] = {}
+        self._listeners: List[Callable[[ProductCatalog], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def version(self) -> int:
+        return self.catalog.version
+
+    def subscribe(self, listener: Callable[[ProductCatalog], None]):
+        """Call `listener(new_catalog)` after every swap"""
+        self._listeners.append(listener)
+
+    def load_snapshot(self, path: Path = SNAPSHOT_PATH) -> bool:
+        """Install a prebuilt snapshot if it still matches data/.
+
+        Returns False when it is missing or stale; call refresh() then.
+        """
+        with span("load_snapshot"):
+            catalog = load_snapshot(self.data_dir, path)
+        if catalog is None:
+            return False
+
+        with self._lock:
+            # Documents are parsed lazily, the first time any file changes
+            self._sources = {path: (_stamp(path), None) for path in discover(self.data_dir)}
+            catalog.version = self.catalog.version + 1
+            self.catalog = catalog
+
+        for listener in self._listeners:
+            listener(catalog)
+        return True
+
+    def refresh(self, force: bool = False) -> List[str]:
+        """Reload changed data files and swap in a new catalog if anything changed.
+
+        Returns the names of the files that were added, changed or removed.
+        """
+        with self._lock:
+            paths = discover(self.data_dir)
+            stamps = {path: _stamp(path) for path in paths}
+
+            changed = [path for path in paths if force or path not in self._sources or self._sources[path][0] != stamps[path]]
+            removed = [path for path in self._sources if path not in stamps]
+            if not changed and not removed and self.catalog.version:
+                return []
+
+            # Files that came from a snapshot have no parsed document yet
+            stale = changed + [path for path in paths if path not in changed and self._sources[path][1] is None]
+
+            with span("load_data"):
+                for path, data in zip(stale, read_sources(stale)):
+                    self._sources[path] = (stamps[path], data)
+            for path in removed:
+                del self._sources[path]
+
+            with span("build_catalog"):
+                sources = ((path, self._sources[path][1]) for path in paths)
+                catalog = ProductCatalog(*build_catalog_data(sources, self.data_dir), version=self.catalog.version + 1)
+            self.catalog = catalog
+
+        for listener in self._listeners:
+            listener(catalog)
+        return sorted({path.name for path in changed + removed})
+
+    def start_watching(self, interval: float):
+        """Poll the data folder every `interval` seconds on a daemon thread"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                changed = self.refresh()
+            except Exception as e:  # a half-written file must not kill the watcher
+                print(f"⚠️ Catalog reload failed: {e}")
+                continue
+            if changed:
+                print(f"🔄 Reloaded catalog v{self.version} ({len(self.catalog)} products): {', '.join(changed)}")
+
+
+def _stamp(path: Path) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
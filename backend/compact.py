@@ -0,0 +1,62 @@
+"""Compact, copy-on-write-friendly product records.
+
+Every loaded file brings its own copies of the same keys, company names and
+long benefit texts, and every list carries spare capacity. compact_catalog()
+rewrites the normalized products once, before the catalog is built:
+
+- every string goes through one pool, so equal texts become one object
+  (keys included, which also makes dict lookups hit the identity fast path)
+- lists become tuples, which are exact-size and read-only
+- equal leaf records (premium rows, company dicts) become one shared dict
+
+Fewer, immutable objects mean fewer pages a forked worker dirties when it
+touches them; see prefork.py. Records stay plain dicts because every index,
+projection and payload encoder reads them by key.
+
+CATALOG_COMPACT=0 keeps the records exactly as loaded.
+"""
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+COMPACT_CATALOG = os.getenv("CATALOG_COMPACT", "1") != "0"
+
+SCALARS = (str, int, float, bool, type(None))
+
+
+class Pool:
+    """Canonical instances of the strings and leaf records seen so far"""
+
+    def __init__(self):
+        self.records: Dict[tuple, dict] = {}
+
+    def value(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return sys.intern(value)
+        if isinstance(value, (list, tuple)):
+            return tuple(self.value(item) for item in value)
+        if isinstance(value, dict):
+            return self.record(value)
+        return value
+
+    def record(self, record: dict) -> dict:
+        compacted = {sys.intern(key): self.value(item) for key, item in record.items()}
+        # Only records of plain values are shared; equal ones collapse into the first
+        if not all(isinstance(item, SCALARS) for item in compacted.values()):
+            return compacted
+        key = tuple((key, type(item), item) for key, item in compacted.items())
+        return self.records.setdefault(key, compacted)
+
+
+def compact_catalog(products: List[dict], companies: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """Interned, tuple-backed copies of (products, companies), or the originals when CATALOG_COMPACT=0.
+
+    Companies go through the same pool, so each product's `company` is the
+    very dict listed in `companies`.
+    """
+    if not COMPACT_CATALOG:
+        return products, companies
+    pool = Pool()
+    companies = [pool.record(company) for company in companies]
+    products = [{sys.intern(key): pool.value(value) for key, value in product.items()} for product in products]
+    return products, companies
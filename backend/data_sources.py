@@ -0,0 +1,388 @@
+"""Registry-driven loader for the insurer files in data/.
+
+Every `data/*.json` file is picked up automatically. The file's `insurer`
+is mapped to a company through COMPANY_REGISTRY (unknown insurers get a new
+company) and its top-level collection (`plans` or `products`) decides how
+the entries are normalized. Adding an insurer means dropping in a file.
+
+A file's `document_year` is the year its prices take effect. A new year's
+price list goes next to the old one (e.g. medical_pulamed_2026.json beside
+medical_pulamed_2025.json) instead of replacing it: entries of the same
+insurer, category and name become one product, described by its newest
+version and carrying every version's premiums in `price_schedule`.
+
+Product and company ids are handed out once and kept in `data/_ids.json`,
+keyed by (insurer, category, name). A new file appends ids after the highest
+one ever issued, so adding, removing or renaming files never renumbers the
+products that were already there, and an id is never reused. Builds hold a
+lock on the file while they issue ids, so prefork workers, the seeder and
+the snapshot builder running at once agree on every new id.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from contextlib import contextmanager
+
+from compact import compact_catalog
+from images import product_image
+from metrics import span
+from parsing import extract_number, flat_premium
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, builds should not run concurrently there
+    fcntl = None
+
+# DATA_DIR points the loaders somewhere else, e.g. at a generated benchmark catalog
+DATA_DIR = Path(os.getenv("DATA_DIR") or Path(__file__).parent.parent / "data")
+
+# Issued product and company ids; files starting with "_" are not insurer files
+IDS_FILE = "_ids.json"
+
+# Known insurers, in the order their ids were handed out
+COMPANY_REGISTRY = [
+    {"id": 1, "name": "Liberty Life Botswana (Pty) Limited", "type": "life_funeral"},
+    {"id": 2, "name": "Metropolitan Life Botswana", "type": "life"},
+    {"id": 3, "name": "Botsogo Health Plan", "type": "medical"},
+    {"id": 4, "name": "Botswana Public Officers Medical Aid Scheme (BPOMAS)", "type": "medical"},
+    {"id": 5, "name": "Pula Medical Aid Fund (Pulamed)", "type": "medical"},
+]
+
+# Top-level collection key -> category used when an entry does not name one
+COLLECTION_CATEGORIES = {
+    "plans": "medical",
+    "products": None,
+}
+
+# File name prefix -> category, the fallback for `products` entries without one
+FILE_PREFIX_CATEGORIES = {
+    "funeral": "funeral",
+    "hospital": "hospital_cash",
+    "life": "life",
+    "medical": "medical",
+}
+
+# Below this many files a pool costs more than it saves
+PARALLEL_THRESHOLD = 16
+
+
+def discover(data_dir: Path = DATA_DIR) -> List[Path]:
+    return sorted(path for path in Path(data_dir).glob("*.json") if not path.name.startswith("_"))
+
+
+def read_source(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_sources(paths: List[Path], workers: Optional[int] = None, processes: bool = False) -> List[dict]:
+    """Parse the files, in parallel when there are many of them.
+
+    Results come back in the order of `paths` so product ids stay stable.
+    """
+    if workers is None:
+        workers = int(os.getenv("DATA_LOAD_WORKERS", "0")) or min(32, (os.cpu_count() or 1) + 4)
+    if len(paths) < PARALLEL_THRESHOLD or workers <= 1:
+        return [read_source(path) for path in paths]
+
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        return list(executor.map(read_source, paths))
+
+
+class IdMap:
+    """Every product and company id issued so far for one data folder.
+
+    Ids are looked up by natural key; a key seen for the first time gets the
+    next id after the highest one ever issued. Entries are never dropped, so
+    a removed product's id is not handed to another one.
+    """
+
+    def __init__(self, path: Optional[Path] = None, companies: Optional[Dict[str, int]] = None,
+                 products: Optional[Dict[tuple, int]] = None):
+        self.path = path
+        self.companies: Dict[str, int] = dict(companies or {})
+        self.products: Dict[tuple, int] = dict(products or {})
+        self.changed = False
+
+    @classmethod
+    @contextmanager
+    def locked(cls, data_dir: Path = DATA_DIR) -> Iterator["IdMap"]:
+        """The id map of `data_dir`, read, extended and saved under an exclusive lock.
+
+        Another process issuing ids at the same time waits, then reads the ids
+        this one issued instead of handing out its own.
+        """
+        with _file_lock(Path(data_dir) / (IDS_FILE + ".lock")):
+            ids = cls.load(data_dir)
+            yield ids
+            ids.save()
+
+    @classmethod
+    def load(cls, data_dir: Path = DATA_DIR) -> "IdMap":
+        path = Path(data_dir) / IDS_FILE
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path)
+        products = {
+            (entry["company"], entry["category"], entry["name"], entry.get("copy", 0)): entry["id"]
+            for entry in data.get("products", [])
+        }
+        return cls(path, data.get("companies", {}), products)
+
+    def company_id(self, name: str, default: Optional[int] = None) -> int:
+        if name not in self.companies:
+            self.companies[name] = default or max(self.companies.values(), default=0) + 1
+            self.changed = True
+        return self.companies[name]
+
+    def product_id(self, company: str, category: str, name: str, copy: int = 0) -> int:
+        """Id of a product; `copy` tells apart products sharing insurer, category and name"""
+        key = (company, category, name, copy)
+        if key not in self.products:
+            self.products[key] = max(self.products.values(), default=0) + 1
+            self.changed = True
+        return self.products[key]
+
+    def save(self):
+        """Write newly issued ids back; a read-only data folder keeps them for this process only"""
+        if not self.changed or self.path is None:
+            return
+        products = []
+        for (company, category, name, copy), product_id in sorted(self.products.items(), key=lambda item: item[1]):
+            entry = {"id": product_id, "company": company, "category": category, "name": name}
+            if copy:
+                entry["copy"] = copy
+            products.append(entry)
+        data = {"companies": dict(sorted(self.companies.items(), key=lambda item: item[1])), "products": products}
+        # Write a uniquely named file next to the target and rename, so a reader never sees half a file
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+        except OSError as e:
+            print(f"⚠️ Could not save product ids to {self.path}: {e}")
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save product ids to {self.path}: {e}")
+            os.unlink(tmp)
+            return
+        self.changed = False
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive lock on `path` for the block; none where it can't be taken"""
+    try:
+        f = open(path, "a") if fcntl is not None else None
+    except OSError:  # read-only data folder: nothing gets saved there either
+        f = None
+    if f is None:
+        yield
+        return
+    with f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class CompanyRegistry:
+    """Maps insurer names from the data files to company records"""
+
+    def __init__(self, companies: Iterable[dict] = COMPANY_REGISTRY, ids: Optional[IdMap] = None):
+        self.ids = ids if ids is not None else IdMap()
+        self.companies: List[dict] = [dict(company) for company in companies]
+        self._by_name: Dict[str, dict] = {company["name"]: company for company in self.companies}
+        for company in self.companies:
+            self.ids.company_id(company["name"], company["id"])
+
+    def resolve(self, insurer: str, category: str) -> dict:
+        company = self._by_name.get(insurer)
+        if company is None:
+            company = {"id": self.ids.company_id(insurer), "name": insurer, "type": category}
+            self.companies.append(company)
+            self._by_name[insurer] = company
+        return company
+
+
+def _file_category(path: Path) -> Optional[str]:
+    return FILE_PREFIX_CATEGORIES.get(path.stem.split("_", 1)[0])
+
+
+def _medical_premiums(premiums) -> list:
+    if isinstance(premiums, list):
+        return premiums
+    if premiums and isinstance(premiums, str):
+        # Free-text premiums that state an amount become a flat monthly premium
+        premium = flat_premium(premiums)
+        if premium is not None:
+            return [{"monthly_premium": premium}]
+    return []
+
+
+def effective_from(data: dict) -> Optional[str]:
+    """First day a file's prices apply, from its `document_year` (2025 or "2025"); None without one"""
+    match = re.search(r"\b(19|20)\d\d\b", str(data.get("document_year") or ""))
+    return f"{match.group(0)}-01-01" if match else None
+
+
+def normalize_plan(plan: dict, company: dict, category: str) -> dict:
+    """A `plans` entry (medical aid option)"""
+    return {
+        "name": plan.get("plan_name", "Unknown Plan"),
+        "category": category,
+        "company_id": company["id"],
+        "company": company,
+        "annual_limit": extract_number(plan.get("annual_limit", "0")),
+        "co_payment": plan.get("co_payment"),
+        "hospital_network": plan.get("hospital_network"),
+        "maternity_cover": plan.get("maternity_cover"),
+        "chronic_cover": plan.get("chronic_cover"),
+        "dental_optical": plan.get("dental_optical"),
+        "waiting_period_natural": plan.get("waiting_period"),
+        "premiums": _medical_premiums(plan.get("premiums")),
+        "key_features": [],
+    }
+
+
+def normalize_product(product: dict, company: dict, category: str) -> dict:
+    """A `products` entry (life, funeral or hospital cash policy)"""
+    premiums = product.get("premiums", [])
+    return {
+        "name": product.get("name") or product.get("product_name") or "Unknown Product",
+        "category": category,
+        "company_id": company["id"],
+        "company": company,
+        "sum_assured": product.get("sum_assured"),
+        "premiums": premiums if isinstance(premiums, list) else [],
+        "waiting_period_natural": product.get("waiting_period_natural"),
+        "waiting_period_accidental": product.get("waiting_period_accidental"),
+        "age_min": product.get("age_min"),
+        "age_max": product.get("age_max"),
+        "key_features": product.get("key_features", []),
+        "exclusions": product.get("exclusions"),
+    }
+
+
+NORMALIZERS = {
+    "plans": normalize_plan,
+    "products": normalize_product,
+}
+
+
+def iter_products(sources: Iterable[Tuple[Path, dict]], registry: CompanyRegistry) -> Iterator[dict]:
+    """Normalize every entry of every parsed file, in id order.
+
+    Ids come from `registry.ids`; call its save() afterwards to keep new ones.
+    """
+    # Per (company, category, name) the products seen so far, each a list of its versions
+    lineages: Dict[tuple, List[List[dict]]] = {}
+    for path, data in sources:
+        starts = effective_from(data)
+        for collection, normalize in NORMALIZERS.items():
+            entries = data.get(collection)
+            if not isinstance(entries, list):
+                continue
+            default_category = COLLECTION_CATEGORIES[collection] or _file_category(path)
+            for entry in entries:
+                category = entry.get("category") or default_category
+                company = registry.resolve(data.get("insurer") or path.stem, category)
+                record = normalize(entry, company, category)
+                record["effective_from"] = starts
+                # A product already holding a version from this date is a different
+                # product of the same name, e.g. a copied file: it starts its own
+                candidates = lineages.setdefault((company["name"], category, record["name"]), [])
+                lineage = next((c for c in candidates if all(version["effective_from"] != starts for version in c)), None)
+                if lineage is None:
+                    lineage = []
+                    candidates.append(lineage)
+                lineage.append(record)
+
+    numbered = [
+        (registry.ids.product_id(*key, copy), lineage)
+        for key, candidates in lineages.items()
+        for copy, lineage in enumerate(candidates)
+    ]
+    for product_id, lineage in sorted(numbered, key=lambda item: item[0]):
+        lineage.sort(key=lambda version: version["effective_from"] or "")
+        product = {"id": product_id}
+        product.update(lineage[-1])
+        if len(lineage) > 1:
+            product["price_schedule"] = [
+                {"effective_from": version["effective_from"], "premiums": version["premiums"]} for version in lineage
+            ]
+        # Resized variants from images.py build, None until they have been built
+        product["image"] = product_image(product)
+        yield product
+
+
+def build_catalog_data(sources: Iterable[Tuple[Path, dict]], data_dir: Path = DATA_DIR) -> Tuple[List[dict], List[dict]]:
+    """(products, companies) for already parsed files, with the data folder's stable ids"""
+    with IdMap.locked(data_dir) as ids:
+        registry = CompanyRegistry(ids=ids)
+        products = list(iter_products(sources, registry))
+    return compact_catalog(products, sorted(registry.companies, key=lambda company: company["id"]))
+
+
+def load_catalog_data(data_dir: Path = DATA_DIR, workers: Optional[int] = None) -> Tuple[List[dict], List[dict]]:
+    """(products, companies) for every data file in `data_dir`"""
+    with span("load_data"):
+        paths = discover(data_dir)
+        return build_catalog_data(zip(paths, read_sources(paths, workers)), data_dir)
+
+
+def check_stable_ids(data_dir: Path = DATA_DIR) -> List[str]:
+    """Problems found when a new insurer file is added to a copy of `data_dir`.
+
+    The new file sorts before every other one, which is where positional
+    numbering would have shifted everything; the ids already issued must not move.
+    """
+    problems = []
+    before = {product["id"]: product for product in load_catalog_data(data_dir)[0]}
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / "data"
+        shutil.copytree(data_dir, copy)
+        probe = {"insurer": "Id Check Assurance", "document_year": 2025, "products": [{"name": "Id Check Plan"}]}
+        (copy / "aaa_id_check.json").write_text(json.dumps(probe), encoding="utf-8")
+        after = {product["id"]: product for product in load_catalog_data(copy)[0]}
+
+    for product_id, product in before.items():
+        moved = after.get(product_id)
+        if moved is None or (moved["company"]["name"], moved["name"]) != (product["company"]["name"], product["name"]):
+            problems.append(f"id {product_id} ({product['name']}) changed after adding a file")
+    added = [product for product_id, product in after.items() if product_id not in before]
+    if len(added) != 1 or added[0]["id"] <= max(before, default=0):
+        problems.append("the added product did not get a new id after the existing ones")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that product ids survive adding a data file")
+    parser.add_argument("command", choices=["check-ids"])
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    args = parser.parse_args()
+
+    problems = check_stable_ids(args.data_dir)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ Product ids in {args.data_dir} are stable")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,37 @@ import os
 # CHANGED LINE: PostgreSQL → SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./botsuinsure.db")
 
-engine = create_engine(DATABASE_URL)
+# Pool sizing (ignored for SQLite, which pools per file)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Serve requests through the async engine instead of the sync one
+DB_ASYNC = os.getenv("DB_ASYNC", "").lower() in ("1", "true", "yes")
+
+def engine_options(url):
+    if url.startswith("sqlite"):
+        # Sessions are used from FastAPI's threadpool, not the creating thread
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+
+def async_database_url(url):
+    """Same database through its async driver: aiosqlite for SQLite, asyncpg for Postgres"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return url.replace(prefix, "postgresql+asyncpg:", 1)
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -15,4 +45,24 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# The async engine is only created when first used, so aiosqlite/asyncpg are
+# needed only by deployments that turn DB_ASYNC on.
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        options = engine_options(ASYNC_DATABASE_URL)
+        options.pop("connect_args", None)  # aiosqlite runs each connection on its own thread
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **options)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
@@ -0,0 +1,290 @@
+"""Seeded generator of synthetic insurer files shaped like the ones in data/.
+
+Medical aid schemes get a `plans` file with salary-banded premiums (the top
+band open-ended, or capped like Pulamed's), and now and then a premium that
+only points at a contribution table, as Botsogo's do. Life and funeral
+insurers get `products` files: funeral and hospital cash products with
+cover_amount tiers and life products priced on request. Limits, co-payments,
+waiting periods and benefits are free text in the same styles as the real
+documents, so the loaders and parsers do the same work on them.
+
+With --history N every file also gets the N price lists before it, one
+per earlier year and a little cheaper each (e.g. medical_00001_2023.json),
+which the loader merges into dated price versions of the same products.
+
+The same seed always writes the same files. Point the app at them with
+DATA_DIR, or seed a database with `python seed_data.py --data-dir DIR`:
+
+    python generate_catalog.py /tmp/catalog --insurers 200 --products 20000
+    python generate_catalog.py /tmp/catalog --history 3
+    DATA_DIR=/tmp/catalog python server_json.py
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+DEFAULT_SEED = 2025
+# Share of insurers that are medical aid schemes; the rest sell life/funeral cover
+MEDICAL_SHARE = 0.6
+# Yearly premium increase between the price lists written by --history
+YEARLY_INCREASE = 0.06
+
+PLACES = [
+    "Kgalagadi", "Okavango", "Limpopo", "Tati", "Shashe", "Chobe", "Makgadikgadi", "Tsodilo", "Serowe",
+    "Mahalapye", "Kanye", "Molepolole", "Maun", "Palapye", "Lobatse", "Selebi", "Tlokweng", "Mochudi",
+]
+MEDICAL_NAMES = ["Medical Aid Fund", "Health Plan", "Medical Scheme", "Health Cover Society"]
+LIFE_NAMES = ["Life Assurance", "Life Botswana (Pty) Limited", "Mutual Life", "Funeral Services Society"]
+PLAN_NAMES = [
+    "Bronze", "Silver", "Gold", "Platinum", "Diamond", "Ruby", "Sapphire", "Standard", "Classic", "Essential",
+    "Comprehensive", "Executive", "Deluxe", "Galaxy", "Flexi", "Saver", "Core", "Premier",
+]
+HOSPITAL_NETWORKS = [
+    "Government and private hospitals in Botswana (scheme-approved providers)",
+    "Public Hospitals and select mission hospitals",
+    "General medical and surgical wards; May obtain service in RSA",
+    "Private Ward; May obtain service in RSA",
+    "Designated service provider network only",
+]
+CO_PAYMENTS = [
+    "No co-payment",
+    "No 10% co-payment; scheme absorbs co-payments beyond P1,000 per family per financial year",
+    "{p}% for out-patient services",
+    "{p}% for out-patient visits",
+    "{name} attracts {p}% co-payment on out-patient services",
+]
+WAITING_PERIODS = [
+    "3 months general, {m} months maternity",
+    "{m} months for maternity if not previously covered; 12 months for limited dentistry; "
+    "2 years for pre-existing conditions (except HIV/AIDS)",
+    "Standard industry periods apply: {m} months for maternity, 12 months for pre-existing conditions (unless waived)",
+    "3 months general, 12 months for specialized procedures",
+    "No waiting period",
+]
+FUNERAL_FEATURES = [
+    "Family cover: policyholder, spouse, up to {children} children",
+    "Double accidental death benefit for policyholder",
+    "Grocery Benefit (P{grocery:,}) and Tombstone Benefit (P{tombstone:,})",
+    "Premium waiver feature included",
+    "Children covered up to age 21 (or 25 if student)",
+    "Claims paid within 48 hours",
+]
+HOSPITAL_FEATURES = [
+    "Daily cash benefit for hospital stays (P{low}-P{high} per day)",
+    "Family cover option (main member, spouse, up to {children} children)",
+    "Double daily payout for ICU stays",
+    "Cover in Botswana and South Africa",
+    "No medicals required",
+]
+LIFE_FEATURES = [
+    "Whole life cover (no expiry)",
+    "Fixed term cover (5-30 years)",
+    "Accidental Death Cover automatically included",
+    "Terminal Illness Benefit: 100% payout on diagnosis",
+    "Cash-Back Benefit: 5% of total premiums refunded every 5 years if no claims",
+    "Optional add-ons: Death Premium Waiver, Disability Premium Waiver, Permanent Disability Benefit",
+]
+EXCLUSIONS = [
+    "Suicide within first 24 months",
+    "Suicide within first 24 months; death due to war, riot, terrorism; death while under influence of alcohol/illegal drugs",
+    "Pre-existing conditions in the first 12 months; self-inflicted injuries; hazardous sports",
+]
+
+
+def money(amount: int) -> str:
+    return f"{amount:,}"
+
+
+def salary_bands(rng: random.Random) -> list:
+    """3-5 contiguous bands from P0; the top band is open (null) or capped at P1,000,000"""
+    edges = sorted(rng.sample(range(2_500, 40_001, 500), rng.randint(2, 4)))
+    premium = rng.randrange(90, 1_400, 10)
+    bands = []
+    low = 0
+    for high in edges + [None]:
+        bands.append({"min_salary": low, "max_salary": high, "monthly_premium": premium})
+        if high is not None:
+            low = high + 1
+            premium += rng.randrange(0, 200, 10)
+    if rng.random() < 0.3:
+        bands[-1]["max_salary"] = 1_000_000
+    return bands
+
+
+def medical_plan(rng: random.Random, name: str, year: int) -> dict:
+    limit = rng.randrange(30_000, 2_500_000, 1_000)
+    if rng.random() < 0.25:
+        annual_limit = (
+            f"In-Patient: BWP {money(limit)} (Single) / BWP {money(limit * 2)} (Family); "
+            f"Out-Patient: BWP {money(limit // 6)} (Single) / BWP {money(limit // 3)} (Family)"
+        )
+    else:
+        annual_limit = limit
+    premiums = salary_bands(rng)
+    if rng.random() < 0.1:
+        premiums = f"Refer to {year} Monthly Contribution Table"
+    co_payment = rng.choice(CO_PAYMENTS).format(p=rng.choice([5, 10, 15, 20, 25]), name=name)
+    return {
+        "plan_name": name,
+        "category": "medical",
+        "premiums": premiums,
+        "annual_limit": annual_limit,
+        "co_payment": co_payment,
+        "hospital_network": rng.choice(HOSPITAL_NETWORKS),
+        "maternity_cover": (
+            f"Normal delivery up to P{money(rng.randrange(5_000, 30_000, 10))} per family per annum; "
+            f"Caesarean section up to P{money(rng.randrange(10_000, 45_000, 10))} per family per annum"
+        ),
+        "chronic_cover": f"Chronic medicines up to P{money(rng.randrange(3_000, 70_000, 10))} per member per annum",
+        "dental_optical": (
+            f"Dental: P{money(rng.randrange(1_000, 20_000, 10))} per family per annum; "
+            f"Optical: P{money(rng.randrange(500, 6_000, 10))} per beneficiary every two years"
+        ),
+        "waiting_period": rng.choice(WAITING_PERIODS).format(m=rng.choice([3, 6, 9, 10, 12])),
+    }
+
+
+def cover_tiers(rng: random.Random, covers: List[int], rate: float) -> list:
+    """Premiums rising with cover, a little cheaper per Pula at the top"""
+    tiers = []
+    for index, cover in enumerate(covers):
+        discount = 1 - 0.04 * index
+        tiers.append({"cover_amount": cover, "monthly_premium": max(10, round(cover * rate * discount))})
+    return tiers
+
+
+def funeral_product(rng: random.Random, name: str) -> dict:
+    covers = sorted(rng.sample([5_000, 7_500, 10_000, 15_000, 20_000, 30_000, 40_000, 50_000, 75_000], rng.randint(3, 6)))
+    features = [
+        feature.format(children=rng.randint(2, 8), grocery=rng.randrange(1_000, 5_001, 500), tombstone=rng.randrange(1_000, 5_001, 500))
+        for feature in rng.sample(FUNERAL_FEATURES, rng.randint(3, len(FUNERAL_FEATURES)))
+    ]
+    return {
+        "product_name": name,
+        "category": "funeral",
+        "premiums": cover_tiers(rng, covers, rng.uniform(0.0035, 0.0055)),
+        "sum_assured": f"P{money(covers[0])}-P{money(covers[-1])} (varies by package)",
+        "waiting_period_natural": rng.choice(["3 months", "6 months", "12 months"]),
+        "waiting_period_accidental": "immediate",
+        "age_min": 18,
+        "age_max": rng.choice([60, 65, 70, 75]),
+        "key_features": features,
+        "exclusions": rng.choice(EXCLUSIONS),
+    }
+
+
+def hospital_product(rng: random.Random, name: str) -> dict:
+    covers = sorted(rng.sample([100, 150, 200, 250, 300, 500, 750, 1_000, 1_500], rng.randint(3, 5)))
+    days = rng.choice([60, 90, 105, 120])
+    features = [
+        feature.format(low=covers[0], high=covers[-1], children=rng.randint(2, 6))
+        for feature in rng.sample(HOSPITAL_FEATURES, rng.randint(2, len(HOSPITAL_FEATURES)))
+    ]
+    return {
+        "product_name": name,
+        "category": "hospital_cash",
+        "premiums": cover_tiers(rng, covers, rng.uniform(0.3, 0.5)),
+        "sum_assured": (
+            f"Daily benefit up to P{covers[-1]}, with maximum {days} days per person "
+            f"(total potential P{money(covers[-1] * days)} per person)"
+        ),
+        "waiting_period_natural": rng.choice(["3 months", "6 months"]),
+        "waiting_period_accidental": "immediate",
+        "age_min": 18,
+        "age_max": rng.choice([55, 60, 62, 65]),
+        "key_features": features,
+        "exclusions": rng.choice(EXCLUSIONS),
+    }
+
+
+def life_product(rng: random.Random, name: str) -> dict:
+    if rng.random() < 0.5:
+        low, high = rng.choice([50_000, 100_000, 200_000]), rng.choice([2_000_000, 5_000_000, 10_000_000])
+        sum_assured = f"BWP {money(low)} to BWP {money(high)}"
+    else:
+        sum_assured = f"Up to BWP {money(rng.choice([500_000, 1_000_000, 2_500_000]))} (no automatic medical underwriting)"
+    return {
+        "product_name": name,
+        "category": "life",
+        "premiums": [],
+        "sum_assured": sum_assured,
+        "waiting_period_natural": rng.choice(["No waiting period", "6 months", "12 months"]),
+        "waiting_period_accidental": "No waiting period",
+        "age_min": rng.choice([18, 19, 21]),
+        "age_max": rng.choice([60, 65, 66, 70]),
+        "key_features": rng.sample(LIFE_FEATURES, rng.randint(2, len(LIFE_FEATURES))),
+        "exclusions": rng.choice(EXCLUSIONS),
+    }
+
+
+LIFE_LINES = {"funeral": funeral_product, "hospital": hospital_product, "life": life_product}
+
+
+def earlier_prices(entries: list, years: int) -> list:
+    """`entries` with the premiums they had `years` years before"""
+    factor = (1 + YEARLY_INCREASE) ** -years
+    earlier = []
+    for entry in entries:
+        premiums = entry["premiums"]
+        if isinstance(premiums, list):
+            premiums = [dict(premium, monthly_premium=round(premium["monthly_premium"] * factor)) for premium in premiums]
+        earlier.append(dict(entry, premiums=premiums))
+    return earlier
+
+
+def generate(
+    output_dir: Path, insurers: int = 20, products: int = 200, seed: int = DEFAULT_SEED, history: int = 0
+) -> Dict[str, int]:
+    """Write `insurers` insurers' files holding `products` products in all; returns products per file"""
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Spread the products over the insurers as evenly as they go
+    per_insurer = [products // insurers + (1 if index < products % insurers else 0) for index in range(insurers)]
+    written = {}
+    for index, count in enumerate(per_insurer):
+        place = PLACES[index % len(PLACES)]
+        year = rng.choice([2023, 2024, 2025])
+        if rng.random() < MEDICAL_SHARE:
+            insurer = f"{place} {rng.choice(MEDICAL_NAMES)} {index + 1}"
+            names = [f"{PLAN_NAMES[i % len(PLAN_NAMES)]} {i // len(PLAN_NAMES) + 1}" for i in range(count)]
+            files = {f"medical_{index + 1:05d}.json": ("plans", [medical_plan(rng, name, year) for name in names])}
+        else:
+            insurer = f"{place} {rng.choice(LIFE_NAMES)} {index + 1}"
+            # One file per product line, like Liberty's funeral and hospital cash documents
+            lines: Dict[str, list] = {}
+            for number in range(count):
+                line = rng.choice(list(LIFE_LINES))
+                lines.setdefault(line, []).append(LIFE_LINES[line](rng, f"{place} {line.title()} Cover {number + 1}"))
+            files = {f"{line}_{index + 1:05d}.json": ("products", entries) for line, entries in lines.items()}
+
+        for file_name, (collection, entries) in files.items():
+            for years in range(history + 1):
+                name = file_name if not years else file_name.replace(".json", f"_{year - years}.json")
+                listed = earlier_prices(entries, years) if years else entries
+                document = {"insurer": insurer, "document_year": str(year - years), collection: listed}
+                (output_dir / name).write_text(json.dumps(document, indent=2, ensure_ascii=False), encoding="utf-8")
+                written[name] = len(listed)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic catalog shaped like data/")
+    parser.add_argument("output", type=Path, help="folder to write the JSON files to")
+    parser.add_argument("--insurers", type=int, default=20)
+    parser.add_argument("--products", type=int, default=200, help="products across all insurers")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--history", type=int, default=0, help="earlier yearly price lists to write per file")
+    args = parser.parse_args()
+    if args.insurers < 1 or args.products < args.insurers:
+        parser.error("need at least one insurer and one product per insurer")
+
+    written = generate(args.output, args.insurers, args.products, args.seed, args.history)
+    print(f"✅ Wrote {sum(written.values())} products in {len(written)} files to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Responsive derivatives of the images in frontend/images.
+
+`python images.py build` (needs Pillow, a build-time dependency only) writes
+every source image as WebP plus a JPEG (PNG when it has transparency) at
+each width in WIDTHS that is smaller than the original. File names carry a
+hash of their bytes, so the URLs never change meaning and can be cached
+forever. derived/manifest.json maps each source to its variants; sources
+whose content and settings did not change since the last build are skipped.
+
+At runtime the manifest is read once: products get an `image` entry with
+`srcset` strings ready for <img>/<picture>, and both servers serve the
+variants under /images/derived/ with immutable cache headers. Without a
+manifest products simply have no image entry and the frontend falls back to
+its bundled full-size images.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+IMAGES_DIR = Path(os.getenv("IMAGES_DIR") or Path(__file__).parent.parent / "frontend" / "images")
+DERIVED_DIR = IMAGES_DIR / "derived"
+MANIFEST_PATH = DERIVED_DIR / "manifest.json"
+# Where the variants are served; the frontend prefixes relative URLs with its API base
+IMAGE_URL_PREFIX = os.getenv("IMAGE_URL_PREFIX", "/images/derived/")
+
+SOURCE_SUFFIXES = {".jpg", ".jpeg", ".jfif", ".png", ".webp"}
+WIDTHS = [160, 320, 480, 640, 960, 1280]
+WEBP_QUALITY = 72
+JPEG_QUALITY = 78
+# Bump when the encoder settings change so every source is rebuilt
+MANIFEST_FORMAT = 1
+
+# A product card is a third of the row from md up, the full width below
+CARD_SIZES = "(min-width: 768px) 33vw, 100vw"
+# Width of the plain `src` fallback for browsers without srcset
+FALLBACK_WIDTH = 640
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+MEDIA_TYPES = {".webp": "image/webp", ".jpg": "image/jpeg", ".png": "image/png"}
+
+# Product name fragment -> source image, first match wins (mirrors frontend/app.js)
+PRODUCT_IMAGES = [
+    ("Executive", "products/pulamed/executive.jpg"),
+    ("Deluxe", "products/pulamed/deluxe.jpg"),
+    ("Galaxy", "products/pulamed/galaxy.jpg"),
+    ("Flexi", "products/pulamed/flexi.jpg"),
+    ("Standard", "products/bpomas/standard.jpg"),
+    ("High", "products/bpomas/high.jpg"),
+    ("Premium", "products/bpomas/premium.jpg"),
+    ("Diamond", "products/botsogo/diamond.jpg"),
+    ("Platinum", "products/botsogo/platinum.jpg"),
+    ("Ruby", "products/botsogo/ruby.jpg"),
+    ("Bronze", "products/botsogo/bronze.jpg"),
+    ("Lifeline", "products/metropolitan/lifeline.jpg"),
+    ("Term Shield", "products/metropolitan/termshield.jpg"),
+    ("Home Secure", "products/metropolitan/homesecure.jpg"),
+    ("Mothusi", "products/metropolitan/download.jfif"),
+    ("Boago", "products/liberty/boago.jpg"),
+    ("Funeral", "products/liberty/boago.jpg"),
+    ("Hospital Cash", "products/liberty/hospitalcash.jpg"),
+]
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def discover_sources(images_dir: Path = IMAGES_DIR) -> List[Path]:
+    derived = images_dir / "derived"
+    return sorted(
+        path for path in images_dir.rglob("*")
+        if path.suffix.lower() in SOURCE_SUFFIXES and derived not in path.parents
+    )
+
+
+def _encode(image, media_type: str) -> bytes:
+    out = io.BytesIO()
+    if media_type == "image/webp":
+        image.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif media_type == "image/png":
+        image.save(out, "PNG", optimize=True)
+    else:
+        image.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def build_variants(source: Path, images_dir: Path, derived_dir: Path) -> dict:
+    """Write every variant of one source image; its manifest entry"""
+    from PIL import Image, ImageOps
+
+    data = source.read_bytes()
+    with Image.open(io.BytesIO(data)) as opened:
+        # Phone photos store rotation as metadata; bake it in since metadata is dropped
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if alpha else "RGB")
+    fallback = "image/png" if alpha else "image/jpeg"
+
+    width, height = image.size
+    widths = [w for w in WIDTHS if w < width] + [min(width, WIDTHS[-1])]
+    relative = source.relative_to(images_dir)
+    target_dir = derived_dir / relative.parent
+    target_dir.mkdir(parents=True, exist_ok=True)
+    suffixes = {media_type: suffix for suffix, media_type in MEDIA_TYPES.items()}
+
+    variants: Dict[str, List[list]] = {"image/webp": [], fallback: []}
+    for w in widths:
+        resized = image if w == width else image.resize((w, round(height * w / width)), Image.LANCZOS)
+        for media_type in variants:
+            body = _encode(resized, media_type)
+            name = f"{relative.stem}-{w}.{_digest(body)}{suffixes[media_type]}"
+            path = target_dir / name
+            if not path.exists():
+                path.write_bytes(body)
+            variants[media_type].append([w, (relative.parent / name).as_posix()])
+
+    return {
+        "digest": _digest(data),
+        "width": width,
+        "height": height,
+        "fallback": fallback,
+        "variants": variants,
+    }
+
+
+def build(images_dir: Path = IMAGES_DIR, derived_dir: Optional[Path] = None, force: bool = False) -> dict:
+    """Bring derived/ up to date with images_dir and write the manifest"""
+    derived_dir = derived_dir or images_dir / "derived"
+    manifest_path = derived_dir / "manifest.json"
+    derived_dir.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest(manifest_path)
+    reusable = previous.get("images", {}) if previous.get("format") == MANIFEST_FORMAT and previous.get("widths") == WIDTHS else {}
+
+    images = {}
+    built = 0
+    for source in discover_sources(images_dir):
+        key = source.relative_to(images_dir).as_posix()
+        entry = reusable.get(key)
+        fresh = (
+            not force and entry is not None
+            and entry["digest"] == _digest(source.read_bytes())
+            and all((derived_dir / name).exists() for variants in entry["variants"].values() for _, name in variants)
+        )
+        if not fresh:
+            entry = build_variants(source, images_dir, derived_dir)
+            built += 1
+        images[key] = entry
+
+    # Variants no manifest entry points at any more (changed or deleted sources)
+    keep = {name for entry in images.values() for variants in entry["variants"].values() for _, name in variants}
+    for path in derived_dir.rglob("*"):
+        if path.is_file() and path != manifest_path and path.relative_to(derived_dir).as_posix() not in keep:
+            path.unlink()
+
+    manifest = {"format": MANIFEST_FORMAT, "widths": WIDTHS, "images": images}
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, manifest_path)
+    return {"sources": len(images), "built": built, "variants": len(keep)}
+
+
+def read_manifest(path: Path = MANIFEST_PATH) -> dict:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+@lru_cache(maxsize=1)
+def manifest() -> dict:
+    """The manifest this process serves, read once"""
+    return read_manifest(MANIFEST_PATH)
+
+
+def manifest_version() -> Optional[str]:
+    """Content hash of the manifest, so caches built from it notice a rebuild"""
+    try:
+        return _digest(MANIFEST_PATH.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+@lru_cache(maxsize=1)
+def served_files() -> frozenset:
+    return frozenset(
+        name for entry in manifest().get("images", {}).values()
+        for variants in entry["variants"].values() for _, name in variants
+    )
+
+
+def image_source(product_name: str) -> Optional[str]:
+    for fragment, source in PRODUCT_IMAGES:
+        if fragment in product_name:
+            return source
+    return None
+
+
+def srcset(variants: List[list]) -> str:
+    return ", ".join(f"{IMAGE_URL_PREFIX}{name} {width}w" for width, name in variants)
+
+
+def responsive_image(source: str) -> Optional[dict]:
+    """`src`, `srcset` and per-format `sources` of a source image, or None if it was not built"""
+    entry = manifest().get("images", {}).get(source)
+    if entry is None:
+        return None
+    fallback = entry["variants"][entry["fallback"]]
+    src = next((name for width, name in fallback if width >= FALLBACK_WIDTH), fallback[-1][1])
+    return {
+        "src": IMAGE_URL_PREFIX + src,
+        "srcset": srcset(fallback),
+        "sources": [{"type": "image/webp", "srcset": srcset(entry["variants"]["image/webp"])}],
+        "sizes": CARD_SIZES,
+        "width": entry["width"],
+        "height": entry["height"],
+    }
+
+
+def product_image(product: dict) -> Optional[dict]:
+    source = image_source(product.get("name") or "")
+    return responsive_image(source) if source else None
+
+
+def image_response(path: str):
+    """A derived variant with immutable cache headers; 404 for anything not in the manifest"""
+    from fastapi import HTTPException
+    from fastapi.responses import FileResponse
+
+    if path not in served_files():
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(
+        DERIVED_DIR / path,
+        media_type=MEDIA_TYPES.get(Path(path).suffix, "application/octet-stream"),
+        headers={"Cache-Control": IMMUTABLE},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build resized, content-hashed variants of frontend/images")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--images-dir", type=Path, default=IMAGES_DIR)
+    parser.add_argument("--force", action="store_true", help="rebuild every source, not just changed ones")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        stats = build(args.images_dir, force=args.force)
+    except ImportError:
+        raise SystemExit("❌ Building image variants needs Pillow: pip install Pillow")
+    before = sum(path.stat().st_size for path in discover_sources(args.images_dir))
+    print(f"✅ {stats['sources']} images ({stats['built']} rebuilt), {stats['variants']} variants "
+          f"in {time.perf_counter() - started:.2f}s; sources total {before:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
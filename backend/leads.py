@@ -0,0 +1,277 @@
+"""Lead ingestion for POST /api/leads.
+
+Handlers validate the lead, give it a ULID-style id and put it on an asyncio
+queue. One writer task drains the queue in batches, so a campaign burst costs
+one transaction (or one fsync) per batch instead of one per lead.
+
+Each lead keeps the product it was submitted for as it was then: its id
+plus its category, name and company, the key that identifies it across
+catalog changes. Queue depth and the written, retried and dropped counts
+are exported on /metrics.
+
+LEAD_SINK         "jsonl": append-only segment files in LEAD_LOG_DIR
+                  "db": the leads table, one transaction per batch
+LEAD_DURABILITY   "async": answer once the lead is queued (default)
+                  "sync": answer once the batch holding it is committed
+LEAD_BATCH_SIZE   most leads written per batch
+LEAD_BATCH_DELAY  seconds the writer waits for more leads before writing
+LEAD_QUEUE_SIZE   queued leads before new ones are turned away
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from metrics import format_labels, register_collector
+from schemas import LeadCreate
+
+LEAD_SINK = os.getenv("LEAD_SINK", "jsonl").lower()
+LEAD_DURABILITY = os.getenv("LEAD_DURABILITY", "async").lower()
+LEAD_LOG_DIR = Path(os.getenv("LEAD_LOG_DIR", Path(__file__).resolve().parent / "lead_log"))
+LEAD_SEGMENT_BYTES = int(os.getenv("LEAD_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+LEAD_BATCH_SIZE = int(os.getenv("LEAD_BATCH_SIZE", "200"))
+LEAD_BATCH_DELAY = float(os.getenv("LEAD_BATCH_DELAY", "0.005"))
+LEAD_QUEUE_SIZE = int(os.getenv("LEAD_QUEUE_SIZE", "10000"))
+WRITE_RETRIES = 3
+
+# Crockford base32: no I, L, O or U
+ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ulid_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def new_lead_id() -> str:
+    """LEAD-<ULID>: 48-bit millisecond timestamp + 80 random bits.
+
+    Ids sort by submission time; within one millisecond the random part is
+    incremented, so ids from this process are strictly increasing.
+    """
+    global _last_ms, _last_random
+    with _ulid_lock:
+        ms = time.time_ns() // 1_000_000
+        if ms <= _last_ms:
+            ms, random = _last_ms, _last_random + 1
+            if random >> 80:
+                ms, random = ms + 1, int.from_bytes(os.urandom(10), "big")
+        else:
+            random = int.from_bytes(os.urandom(10), "big")
+        _last_ms, _last_random = ms, random
+    value = (ms << 80) | random
+    return "LEAD-" + "".join(ULID_ALPHABET[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+
+class LeadsUnavailable(Exception):
+    """The lead could not be accepted or stored; the client should retry"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JsonlSink:
+    """Append-only JSON lines, one fsync per batch.
+
+    Each process writes its own segment, named after the first lead id it
+    holds, and starts a new one past LEAD_SEGMENT_BYTES. Anything past the
+    last fsynced offset belongs to a batch that failed, so a write first cuts
+    it off and a retried batch is never stored twice.
+    """
+
+    def __init__(self, directory: Path = LEAD_LOG_DIR, segment_bytes: int = LEAD_SEGMENT_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self._file = None
+        self._size = 0
+
+    def write(self, records: List[dict]):
+        if self._file is not None and os.fstat(self._file.fileno()).st_size > self._size:
+            self._file.truncate(self._size)
+        if self._file is None or self._size >= self.segment_bytes:
+            self.close()
+            # Unbuffered, so a failed write leaves nothing behind to be flushed later
+            self._file = open(self.directory / f"leads-{records[0]['id']}.jsonl", "ab", buffering=0)
+            self._size = self._file.tell()
+        data = b"".join(
+            json.dumps({**record, "created_at": record["created_at"].isoformat()}).encode("utf-8") + b"\n"
+            for record in records
+        )
+        view = memoryview(data)
+        while view:
+            view = view[self._file.write(view):]
+        os.fsync(self._file.fileno())
+        self._size += len(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class DatabaseSink:
+    """One multi-row INSERT per batch in its own transaction"""
+
+    def __init__(self):
+        from database import engine
+        from models import Lead
+        from seed_data import ensure_schema
+
+        self.engine = engine
+        self.table = Lead.__table__
+        # Also adds the product snapshot columns to an older leads table
+        with engine.begin() as conn:
+            ensure_schema(conn)
+
+    def write(self, records: List[dict]):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.insert(), records)
+
+    def close(self):
+        pass
+
+
+SINKS = {"jsonl": JsonlSink, "db": DatabaseSink}
+
+
+class LeadPipeline:
+    def __init__(self, sink: str = LEAD_SINK, durability: str = LEAD_DURABILITY,
+                 batch_size: int = LEAD_BATCH_SIZE, batch_delay: float = LEAD_BATCH_DELAY,
+                 queue_size: int = LEAD_QUEUE_SIZE):
+        if sink not in SINKS:
+            raise ValueError(f"LEAD_SINK must be one of {', '.join(SINKS)}, not {sink!r}")
+        if durability not in ("async", "sync"):
+            raise ValueError(f"LEAD_DURABILITY must be 'async' or 'sync', not {durability!r}")
+        self.sink_name = sink
+        self.durability = durability
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.queue_size = queue_size
+        self._sink = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.retried = 0
+        self.dropped = 0
+        register_collector("leads", self.render)
+
+    async def start(self):
+        self._sink = await asyncio.to_thread(SINKS[self.sink_name])
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._writer = asyncio.create_task(self._run())
+        print(f"✅ Lead pipeline writing to {self.sink_name} ({self.durability} acknowledgement)")
+
+    async def stop(self):
+        """Write everything still queued, then close the sink"""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+        self._sink.close()
+
+    async def submit(self, lead: LeadCreate, product: dict) -> dict:
+        """Queue `lead` for `product`, the catalog record of lead.product_id"""
+        if self._writer is None or self._writer.done():
+            raise LeadsUnavailable("Lead intake is not running")
+        record = {
+            "id": new_lead_id(),
+            **lead.model_dump(),
+            "product_category": product.get("category"),
+            "product_name": product.get("name"),
+            "company_name": (product.get("company") or {}).get("name"),
+            "created_at": datetime.now(timezone.utc),
+        }
+        stored = asyncio.get_running_loop().create_future() if self.durability == "sync" else None
+        try:
+            self._queue.put_nowait((record, stored))
+        except asyncio.QueueFull:
+            raise LeadsUnavailable("Too many leads queued")
+        if stored is not None:
+            await stored
+        return record
+
+    def stats(self) -> dict:
+        return {
+            "sink": self.sink_name,
+            "durability": self.durability,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
+
+    def render(self) -> List[str]:
+        stats = self.stats()
+        labels = format_labels((("sink", self.sink_name), ("durability", self.durability)))
+        lines = ["# TYPE app_leads_queued gauge", f"app_leads_queued{labels} {stats['queued']}"]
+        for name in ("written", "batches", "retried", "dropped"):
+            lines.append(f"# TYPE app_leads_{name}_total counter")
+            lines.append(f"app_leads_{name}_total{labels} {stats[name]}")
+        return lines
+
+    async def _next_batch(self):
+        """Wait for one lead, then take whatever arrives within batch_delay.
+
+        Returns (batch, stopping); stopping is set once stop()'s marker is reached.
+        """
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = loop.time() + self.batch_delay
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch):
+        records = [record for record, _ in batch]
+        error = None
+        for attempt in range(WRITE_RETRIES):
+            try:
+                await asyncio.to_thread(self._sink.write, records)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt + 1 < WRITE_RETRIES:
+                    self.retried += 1
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        if error is None:
+            self.written += len(records)
+            self.batches += 1
+        else:
+            self.dropped += len(records)
+            print(f"❌ Could not store {len(records)} leads: {error}")
+        for _, stored in batch:
+            if stored is not None and not stored.done():
+                if error is None:
+                    stored.set_result(None)
+                else:
+                    stored.set_exception(LeadsUnavailable("Lead could not be stored"))
@@ -0,0 +1,278 @@
+"""Range filters, multi-key sorting and keyset pagination for /api/products.
+
+Work is done on catalog positions. Each sort order is computed once per
+catalog (and salary band segment when it sorts by premium) and kept as a
+sorted array of keys. A page starts with a bisect to the cursor's key, so
+page 1,000 costs the same as page 1.
+
+A page comes from one of two places:
+  * a short candidate list: the category/company index, or the products
+    inside one range filter, found by bisect on that field's presorted
+    values. The list is filtered and sorted directly;
+  * otherwise the presorted order, walked from the cursor, with every filter
+    checked. At most MAX_SCAN products are checked per request. A page that
+    hits that budget can come back short, with a cursor to carry on from.
+
+Cursors hold the sort key of the last product looked at, not a position,
+so they stay valid across catalog reloads.
+"""
+import base64
+import binascii
+import json
+import math
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from cache import LRUCache
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PRODUCTS_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("PRODUCTS_MAX_PAGE_SIZE", "500"))
+# Candidate lists up to this long are filtered and sorted directly
+DIRECT_THRESHOLD = 512
+# Most products one request checks against its filters
+MAX_SCAN = int(os.getenv("PRODUCTS_MAX_SCAN", "20000"))
+
+# Sort/filter field -> ProductTerms attribute
+TERM_FIELDS = {
+    "annual_limit": "annual_limit",
+    "premium": "premium_min",  # the premium at `salary` when one is given
+    "cover": "cover_max",  # the most cover a product offers
+    "age_min": "age_min",
+    "age_max": "age_max",
+    "co_payment": "co_payment_percent",
+    "waiting_period": "waiting_months",
+}
+SORT_FIELDS = ("id", "name") + tuple(TERM_FIELDS)
+
+# ((field, descending), ...), always ending with the id
+Sort = Tuple[Tuple[str, bool], ...]
+
+
+def parse_sort(text: Optional[str]) -> Sort:
+    """"premium,-annual_limit" -> (("premium", False), ("annual_limit", True), ("id", False))"""
+    sort = []
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        field, descending = (part[1:], True) if part.startswith("-") else (part.lstrip("+"), False)
+        if field not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {field!r}; use one of {', '.join(SORT_FIELDS)}")
+        if field not in (name for name, _ in sort):
+            sort.append((field, descending))
+    if "id" not in (name for name, _ in sort):
+        sort.append(("id", False))
+    return tuple(sort)
+
+
+def format_sort(sort: Sort) -> str:
+    return ",".join(("-" if descending else "") + field for field, descending in sort)
+
+
+class Descending:
+    """Reverses the order of a value that cannot be negated (names)"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def sort_key(values: Sequence, sort: Sort) -> tuple:
+    """Comparable key of one product's sort values; missing values sort last either way"""
+    key = []
+    for value, (_, descending) in zip(values, sort):
+        if value is None:
+            key.append((1, 0))
+        elif descending:
+            key.append((0, Descending(value) if isinstance(value, str) else -value))
+        else:
+            key.append((0, value))
+    return tuple(key)
+
+
+def encode_cursor(sort: Sort, values: Sequence) -> str:
+    data = json.dumps({"sort": format_sort(sort), "after": list(values)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: Sort) -> tuple:
+    """Sort key to continue after; ValueError if the cursor is not from this sort"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = data["after"]
+        same_sort = data["sort"] == format_sort(sort)
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ValueError("Malformed cursor")
+    if not same_sort or not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError("Cursor belongs to a different sort order")
+    for value, (field, _) in zip(values, sort):
+        if not _valid_cursor_value(field, value):
+            raise ValueError("Malformed cursor")
+    return sort_key(values, sort)
+
+
+def _valid_cursor_value(field: str, value) -> bool:
+    """Whether `value` is something encode_cursor could have written for `field`"""
+    if field == "id":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if field == "name":
+        return isinstance(value, str)
+    # Term fields are numbers, or null for products without one
+    if value is None:
+        return True
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class ProductListing:
+    """Presorted views of one catalog; get it with `catalog.listing()`"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        # (field, segment) -> value per catalog position
+        self._values = LRUCache(maxsize=64)
+        # (field, segment) -> (sorted non-null values, their positions)
+        self._ranges = LRUCache(maxsize=32)
+        # (sort, segment, category) -> (sorted keys, their positions)
+        self._orders = LRUCache(maxsize=32)
+
+    def segment(self, salary: Optional[float]) -> Optional[int]:
+        """Band segment of `salary` over every product; premiums are constant within one"""
+        if salary is None:
+            return None
+        return self.catalog.premium_matrix().segment(salary)
+
+    def values(self, field: str, segment: Optional[int] = None) -> Sequence:
+        if field != "premium":
+            segment = None
+        return self._values.get_or_set((field, segment), lambda: self._build_values(field, segment))
+
+    def _build_values(self, field: str, segment: Optional[int]) -> Sequence:
+        products = self.catalog.products
+        if field == "id":
+            return [product["id"] for product in products]
+        if field == "name":
+            return [(product.get("name") or "").lower() for product in products]
+        if field == "premium" and segment is not None:
+            return self.catalog.premium_matrix().segment_row(segment)
+        attribute = TERM_FIELDS[field]
+        return [getattr(self.catalog.terms(product), attribute) for product in products]
+
+    def in_range(self, field: str, segment: Optional[int], low: Optional[float], high: Optional[float]) -> Sequence[int]:
+        """Positions whose `field` lies within [low, high], by bisect on the presorted values"""
+        if field != "premium":
+            segment = None
+        values, positions = self._ranges.get_or_set((field, segment), lambda: self._build_range(field, segment))
+        start = 0 if low is None else bisect_left(values, low)
+        end = len(values) if high is None else bisect_right(values, high)
+        return positions[start:end]
+
+    def _build_range(self, field: str, segment: Optional[int]):
+        column = self.values(field, segment)
+        present = sorted((value, position) for position, value in enumerate(column) if value is not None)
+        return [value for value, _ in present], array("i", [position for _, position in present])
+
+    def order(self, sort: Sort, segment: Optional[int], category: Optional[str]) -> Tuple[List[tuple], array]:
+        """Keys and positions of the products (of `category`) in `sort` order"""
+        if not any(field == "premium" for field, _ in sort):
+            segment = None
+        return self._orders.get_or_set((sort, segment, category), lambda: self._build_order(sort, segment, category))
+
+    def _build_order(self, sort: Sort, segment: Optional[int], category: Optional[str]):
+        columns = [self.values(field, segment) for field, _ in sort]
+        if category is None:
+            positions = range(len(self.catalog))
+        else:
+            positions = [self.catalog.position(product["id"]) for product in self.catalog.by_category(category)]
+        rows = sorted((sort_key([column[position] for column in columns], sort), position) for position in positions)
+        return [key for key, _ in rows], array("i", [position for _, position in rows])
+
+    def page(
+        self,
+        category: Optional[str] = None,
+        company: Optional[str] = None,
+        salary: Optional[float] = None,
+        age: Optional[int] = None,
+        ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        sort: Sort = (("id", False),),
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """One page of matching products and the cursor of the next page (None on the last)"""
+        catalog = self.catalog
+        segment = self.segment(salary)
+        ranges = {
+            field: bounds for field, bounds in (ranges or {}).items()
+            if bounds[0] is not None or bounds[1] is not None
+        }
+        after = decode_cursor(cursor, sort) if cursor else None
+        sort_columns = [self.values(field, segment) for field, _ in sort]
+
+        company_ids = set(catalog.match_companies(company)) if company else None
+        range_columns = [(self.values(field, segment), low, high) for field, (low, high) in ranges.items()]
+        age_columns = (self.values("age_min"), self.values("age_max")) if age is not None else None
+        products = catalog.products
+
+        def matches(position):
+            product = products[position]
+            if category is not None and product.get("category") != category:
+                return False
+            if company_ids is not None and product.get("company_id") not in company_ids:
+                return False
+            for column, low, high in range_columns:
+                value = column[position]
+                if value is None or (low is not None and value < low) or (high is not None and value > high):
+                    return False
+            if age_columns is not None:
+                age_min, age_max = age_columns[0][position], age_columns[1][position]
+                if (age_min is not None and age < age_min) or (age_max is not None and age > age_max):
+                    return False
+            return True
+
+        def key_of(position):
+            return sort_key([column[position] for column in sort_columns], sort)
+
+        # The shortest list known to hold every match
+        sources = []
+        if category or company:
+            sources.append((catalog.filter(category, company), True))
+        for field, (low, high) in ranges.items():
+            sources.append((self.in_range(field, segment, low, high), False))
+        candidates, are_products = min(sources, key=lambda source: len(source[0])) if sources else (None, False)
+
+        resume = None
+        if candidates is not None and len(candidates) <= DIRECT_THRESHOLD:
+            if are_products:
+                candidates = [catalog.position(product["id"]) for product in candidates]
+            rows = sorted((key_of(position), position) for position in candidates if matches(position))
+            start = bisect_right([key for key, _ in rows], after) if after is not None else 0
+            found = [position for _, position in rows[start:start + limit]]
+            more = start + limit < len(rows)
+        else:
+            keys, positions = self.order(sort, segment, category)
+            index = bisect_right(keys, after) if after is not None else 0
+            end = min(len(positions), index + MAX_SCAN)
+            found = []
+            while index < end and len(found) < limit:
+                position = positions[index]
+                index += 1
+                if matches(position):
+                    found.append(position)
+            more = index < len(positions)
+            if more and len(found) < limit:
+                # Scan budget used up: carry on after the last product checked
+                resume = positions[index - 1]
+
+        next_cursor = None
+        if more and (found or resume is not None):
+            last = resume if resume is not None else found[-1]
+            next_cursor = encode_cursor(sort, [column[last] for column in sort_columns])
+        return [products[position] for position in found], next_cursor
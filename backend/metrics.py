@@ -0,0 +1,300 @@
+"""Request metrics and timing spans in Prometheus text format, plus an opt-in profiler.
+
+`MetricsMiddleware` records per-route latency and request/response sizes;
+`span("name")` times a block of code anywhere in the app (loading data,
+pricing, serializing). `render()` writes everything, with the hit ratios of
+the caches registered via `watch_cache` and the lines of any
+`register_collector` function, for GET /metrics.
+
+With METRICS_PROFILING=1 and ADMIN_TOKEN set, a request carrying an
+`X-Profile` header and the matching X-Admin-Token is run under a profiler
+and answered with the profile instead of its own body:
+
+  * `X-Profile: cprofile` - cProfile of the event loop thread, sorted by
+    cumulative time. Shows async endpoints; sync ones run in a worker thread;
+  * any other value - a sampling profiler reading every thread's stack every
+    PROFILE_INTERVAL seconds, as folded stacks (flamegraph.pl input).
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from cache import LRUCache
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+PROFILING_ENABLED = os.getenv("METRICS_PROFILING", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+# Our responses mostly take microseconds, so the buckets start well below Prometheus' 5 ms default
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(labels + (('le', le),))} {running}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {running}")
+        return lines
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time to answer a request", LATENCY_BUCKETS)
+REQUEST_BYTES = Histogram("http_request_size_bytes", "Request body size", SIZE_BUCKETS)
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size as sent (after compression)", SIZE_BUCKETS)
+SPAN_SECONDS = Histogram("app_span_duration_seconds", "Time spent in instrumented code", LATENCY_BUCKETS)
+
+# name -> the cache, or a function returning the current one (caches owned by a catalog)
+_caches: Dict[str, Union[LRUCache, Callable[[], Optional[LRUCache]]]] = {}
+
+
+def watch_cache(name: str, cache: Union[LRUCache, Callable[[], Optional[LRUCache]]]):
+    """Export hits, misses, size and hit ratio of an LRUCache"""
+    _caches[name] = cache
+
+
+# name -> function returning more exposition lines (gauges and counters kept elsewhere)
+_collectors: Dict[str, Callable[[], List[str]]] = {}
+
+
+def register_collector(name: str, collect: Callable[[], List[str]]):
+    """Append `collect()`'s lines to every render(); registering a name again replaces it"""
+    _collectors[name] = collect
+
+
+@contextmanager
+def span(name: str):
+    """Time the block into app_span_duration_seconds{span=name}"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - started, span=name)
+
+
+def render() -> str:
+    lines = []
+    for histogram in (REQUEST_SECONDS, REQUEST_BYTES, RESPONSE_BYTES, SPAN_SECONDS):
+        lines.extend(histogram.render())
+
+    stats = []
+    for name, cache in sorted(_caches.items()):
+        cache = cache if isinstance(cache, LRUCache) else cache()
+        if cache is not None:
+            stats.append((name, cache.stats()))
+    for metric, kind, field in (
+        ("app_cache_hits_total", "counter", "hits"),
+        ("app_cache_misses_total", "counter", "misses"),
+        ("app_cache_entries", "gauge", "size"),
+        ("app_cache_hit_ratio", "gauge", "hit_ratio"),
+    ):
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f"{metric}{format_labels((('cache', name),))} {values[field]}" for name, values in stats)
+    for _, collect in sorted(_collectors.items()):
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template.
+
+    Routes are labelled by their path template ("/api/products/{product_id}"),
+    and requests no route matched by "unmatched", so the number of series
+    stays bounded.
+    """
+
+    def __init__(self, app, skip: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.skip = frozenset(skip)
+        self._templates: Dict[Callable, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED or scope["path"] in self.skip:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = header(scope, b"x-profile") if PROFILING_ENABLED else None
+        if profiler is not None and is_admin(scope):
+            await self._profile(profiler, scope, receive, send)
+            return
+
+        received = 0
+        sent = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal sent, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = self._template(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=route, status=str(status))
+            REQUEST_BYTES.observe(received, route=route)
+            RESPONSE_BYTES.observe(sent, route=route)
+
+    def _template(self, scope) -> str:
+        # The router leaves the matched endpoint in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # Requests refused before routing (admission.py) name their route themselves
+            return scope.get("route_path", "unmatched")
+        template = self._templates.get(endpoint)
+        if template is None:
+            app = scope.get("app")
+            routes = app.routes if app is not None else []
+            template = next((route.path for route in routes if getattr(route, "endpoint", None) is endpoint), "unmatched")
+            self._templates[endpoint] = template
+        return template
+
+    async def _profile(self, kind: str, scope, receive, send):
+        """Run the request under a profiler and answer with the profile as text"""
+        status = 500
+
+        async def discard(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        if kind == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                profile.disable()
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(60)
+            report = out.getvalue()
+        else:
+            sampler = StackSampler(PROFILE_INTERVAL)
+            with sampler:
+                await self.app(scope, receive, discard)
+            report = sampler.folded()
+
+        body = report.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"x-profiled-status", str(status).encode("ascii")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def header(scope, name: bytes, lower: bool = True) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            value = value.decode("latin-1").strip()
+            return value.lower() if lower else value
+    return None
+
+
+def is_admin(scope) -> bool:
+    """Whether the request carries the ADMIN_TOKEN; always False when none is configured"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        return False
+    given = header(scope, b"x-admin-token", lower=False) or ""
+    return hmac.compare_digest(given.encode("latin-1"), admin_token.encode())
+
+
+class StackSampler:
+    """Counts the stacks of every other thread, sampled every `interval` seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
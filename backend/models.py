@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, JSON, ForeignKey, Index, Date, DateTime
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -19,6 +19,8 @@ class Product(Base):
     name = Column(String(200), nullable=False)
     category = Column(String(50), nullable=False)  # medical, life, funeral, hospital_cash
     company_id = Column(Integer, ForeignKey("companies.id"))
+    # Tells apart products sharing company, category and name (0 for the first)
+    variant = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Common fields
     description = Column(Text, nullable=True)
@@ -41,9 +43,21 @@ class Product(Base):
     sum_assured = Column(String(200), nullable=True)
     
     # Pricing
-    premiums = Column(JSON, nullable=True)  # Store premium array
+    premiums = Column(JSON, nullable=True)  # Store premium array (newest version)
+    effective_from = Column(Date, nullable=True)  # Day the newest premiums apply from
+    price_schedule = Column(JSON, nullable=True)  # Every dated version, when there are several
+    
+    # Hash of the normalized source record; reseeding skips unchanged products
+    content_hash = Column(String(64), nullable=True)
     
     company = relationship("Company", back_populates="products")
+    
+    __table_args__ = (
+        # Category listings, optionally narrowed to one company
+        Index("ix_products_category_company", "category", "company_id"),
+        # Natural key: reseeding matches rows by it, the id is only a surrogate
+        Index("uq_products_natural_key", "company_id", "category", "name", "variant", unique=True),
+    )
 
 class PricingRule(Base):
     __tablename__ = "pricing_rules"
@@ -52,6 +66,39 @@ class PricingRule(Base):
     product_id = Column(Integer, ForeignKey("products.id"))
     min_salary = Column(Float, nullable=True)
     max_salary = Column(Float, nullable=True)
+    # Sum assured of a cover tier (funeral, hospital cash); null for salary bands and flat premiums
+    cover_amount = Column(Float, nullable=True)
     monthly_premium = Column(Float, nullable=False)
+    # The band applies from effective_from (null: always has) until the day
+    # before effective_to (null: still does, the product's current prices)
+    effective_from = Column(Date, nullable=True)
+    effective_to = Column(Date, nullable=True)
+    
+    product = relationship("Product")
+    
+    __table_args__ = (
+        # Premium lookup is a range scan within one product's bands
+        Index("ix_pricing_rules_lookup", "product_id", "min_salary", "max_salary"),
+        # ... of the version in force: current bands by effective_to IS NULL, past ones by date
+        Index("ix_pricing_rules_effective", "product_id", "effective_to", "effective_from"),
+    )
+
+class Lead(Base):
+    __tablename__ = "leads"
+    
+    id = Column(String(32), primary_key=True)  # LEAD-<ULID>, sortable by submission time
+    product_id = Column(Integer, nullable=False)
+    # The product as it was when the lead came in; ids alone say nothing once it is gone
+    product_category = Column(String(50), nullable=True)
+    product_name = Column(String(200), nullable=True)
+    company_name = Column(String(200), nullable=True)
+    name = Column(String(200), nullable=False)
+    phone = Column(String(50), nullable=False)
+    email = Column(String(200), nullable=False)
+    notes = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
     
-    product = relationship("Product")
\ No newline at end of file
+    __table_args__ = (
+        # Insurers pull the leads for their products, newest first
+        Index("ix_leads_product_created", "product_id", "created_at"),
+    )
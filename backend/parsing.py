@@ -0,0 +1,207 @@
+"""Numbers out of the free text in the insurer files, parsed once per catalog.
+
+Cover amounts, limits, co-payments and waiting periods arrive as prose like
+"P10,000-P50,000 (varies by package)" or "3 months general, 9 months
+maternity". `parse_terms` reads them into a compact `ProductTerms` record
+when the catalog is built, so sorting and range filters compare floats
+instead of running regexes per request.
+"""
+import re
+from typing import List, Optional, Tuple
+
+# 2,215,000 / 1000 / 12.50
+NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+ANY_NUMBER = re.compile(NUMBER)
+# An amount marked as money: "P9,240", "BWP 2,215,000"
+MONEY = re.compile(rf"\b(?:BWP|P)\s?({NUMBER})", re.IGNORECASE)
+# A free-text premium that is nothing but an amount: "P450", "BWP 1,200 per month"
+FLAT_AMOUNT = re.compile(rf"^\s*(?:BWP|P)?\s?({NUMBER})\b", re.IGNORECASE)
+RANGE = re.compile(rf"(?:BWP|P)?\s?({NUMBER})\s*(?:-|–|to)\s*(?:BWP|P)?\s?({NUMBER})", re.IGNORECASE)
+UP_TO = re.compile(rf"\bup to\s+(?:BWP|P)?\s?({NUMBER})", re.IGNORECASE)
+PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s?%")
+NO_CO_PAYMENT = re.compile(r"^\s*no\b[^;,]*co-?payment", re.IGNORECASE)
+# "12 months", "2 years", "12-24 months" (the lower bound is taken)
+PERIOD = re.compile(r"(\d+)(?:\s*-\s*\d+)?\s*(months?|years?)", re.IGNORECASE)
+NO_WAITING = re.compile(r"\b(?:immediate|no waiting)", re.IGNORECASE)
+CLAUSE_END = re.compile(r"[,;:]")
+# "policyholder, spouse, up to 6 children"
+CHILDREN = re.compile(r"up to (\d+) (?:children|child)", re.IGNORECASE)
+
+
+def to_number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def extract_number(text) -> float:
+    """First number in strings like 'BWP 2,215,000'; 0 when there is none"""
+    if text is None or text == "":
+        return 0
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = ANY_NUMBER.search(str(text))
+    return to_number(match.group()) if match else 0
+
+
+def flat_premium(text: str) -> Optional[float]:
+    """Monthly premium of a free-text premium that states one amount.
+
+    Text that only points elsewhere ("Refer to 2025 Monthly Contribution
+    Table") has no premium, rather than a premium of 2025.
+    """
+    match = FLAT_AMOUNT.match(text)
+    return to_number(match.group(1)) if match else None
+
+
+def cover_range(text) -> Tuple[Optional[float], Optional[float]]:
+    """(min, max) cover of "P10,000-P50,000", "Up to BWP 2,500,000" or "BWP 200,000" """
+    if text is None:
+        return None, None
+    if isinstance(text, (int, float)):
+        return float(text), float(text)
+    text = str(text)
+    up_to = UP_TO.search(text)
+    match = RANGE.search(text)
+    if match and (up_to is None or match.start() < up_to.start()):
+        low, high = to_number(match.group(1)), to_number(match.group(2))
+        return min(low, high), max(low, high)
+    if up_to:
+        return None, to_number(up_to.group(1))
+    amounts = [to_number(amount) for amount in MONEY.findall(text)]
+    if amounts:
+        return min(amounts), max(amounts)
+    return None, None
+
+
+def first_amount(text) -> Optional[float]:
+    """First money amount: 9240 for "Normal delivery up to P9,240 per family" """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = MONEY.search(str(text))
+    return to_number(match.group(1)) if match else None
+
+
+def co_payment_percent(text) -> Optional[float]:
+    """10 for "10% for out-patient services", 0 for "No 10% co-payment; ..." """
+    if not text:
+        return None
+    text = str(text)
+    if NO_CO_PAYMENT.search(text):
+        return 0.0
+    match = PERCENT.search(text)
+    return float(match.group(1)) if match else None
+
+
+def periods(text) -> List[Tuple[int, str]]:
+    """[(months, rest of its clause)] for every period in a waiting-period text"""
+    text = str(text)
+    found = []
+    for match in PERIOD.finditer(text):
+        months = int(match.group(1)) * (12 if match.group(2).lower().startswith("year") else 1)
+        found.append((months, CLAUSE_END.split(text[match.end():], 1)[0].lower()))
+    return found
+
+
+def waiting_months(text, condition: Optional[str] = None) -> Optional[int]:
+    """Months of the general waiting period, or of the one for `condition`.
+
+    "3 months general, 9 months maternity" -> 3 (general), 9 (maternity).
+    "immediate" and "No waiting period" are 0 months.
+    """
+    if not text:
+        return None
+    found = periods(text)
+    if condition is not None:
+        return next((months for months, rest in found if condition in rest), None)
+    if not found:
+        return 0 if NO_WAITING.search(str(text)) else None
+    general = next((months for months, rest in found if "general" in rest), None)
+    if general is not None:
+        return general
+    # A list of condition-specific periods has no general one
+    if len(found) > 1 or any(word in found[0][1] for word in ("maternity", "pre-existing", "dent")):
+        return None
+    return found[0][0]
+
+
+def max_dependants(features) -> Optional[int]:
+    """Dependants a family cover takes: "spouse, up to 6 children" -> 7; None when not stated"""
+    for feature in features or []:
+        match = CHILDREN.search(str(feature))
+        if match:
+            return int(match.group(1)) + (1 if "spouse" in str(feature).lower() else 0)
+    return None
+
+
+class ProductTerms:
+    """Parsed numeric fields of one product; None where the text says nothing"""
+
+    __slots__ = (
+        "cover_min",
+        "cover_max",
+        "annual_limit",
+        "maternity_limit",
+        "premium_min",
+        "premium_max",
+        "co_payment_percent",
+        "waiting_months",
+        "waiting_months_accidental",
+        "maternity_waiting_months",
+        "age_min",
+        "age_max",
+        "max_dependants",
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.as_dict().items() if value is not None)
+        return f"ProductTerms({fields})"
+
+
+def parse_terms(product: dict) -> ProductTerms:
+    premiums = [
+        premium for premium in product.get("premiums") or []
+        if isinstance(premium, dict) and isinstance(premium.get("monthly_premium"), (int, float))
+    ]
+    monthly = [float(premium["monthly_premium"]) for premium in premiums]
+    cover_amounts = [float(premium["cover_amount"]) for premium in premiums if isinstance(premium.get("cover_amount"), (int, float))]
+
+    annual_limit = first_amount(product.get("annual_limit")) or None
+    if cover_amounts:
+        # The priced cover options are exact; the sum_assured text is a summary
+        cover_min, cover_max = min(cover_amounts), max(cover_amounts)
+    elif product.get("sum_assured"):
+        cover_min, cover_max = cover_range(product.get("sum_assured"))
+    else:
+        cover_min = cover_max = annual_limit
+
+    waiting = product.get("waiting_period_natural")
+    return ProductTerms(
+        cover_min=cover_min,
+        cover_max=cover_max,
+        annual_limit=annual_limit,
+        maternity_limit=first_amount(product.get("maternity_cover")),
+        premium_min=min(monthly) if monthly else None,
+        premium_max=max(monthly) if monthly else None,
+        co_payment_percent=co_payment_percent(product.get("co_payment")),
+        waiting_months=waiting_months(waiting),
+        waiting_months_accidental=waiting_months(product.get("waiting_period_accidental")),
+        maternity_waiting_months=waiting_months(waiting, "maternity"),
+        age_min=product.get("age_min"),
+        age_max=product.get("age_max"),
+        max_dependants=max_dependants(product.get("key_features")),
+    )
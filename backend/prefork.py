@@ -0,0 +1,140 @@
+"""Pre-forking launcher: build the catalog once and share it with every worker.
+
+`uvicorn server_json:app --workers N` starts N fresh interpreters, and each
+one parses data/ and builds its own catalog. Here the parent imports the app
+once (the catalog is compacted on load, see compact.py), builds the parts
+of the catalog that are otherwise built on first request (the module's
+warm_up()), then forks the workers, which share the parent's memory pages
+until they write to them.
+
+Two things would otherwise make workers copy those pages anyway: the cyclic
+GC writes to the header of every object it visits, and a collection in a
+worker visits the whole catalog. So the parent keeps the GC off while it
+loads, then moves everything it built into the permanent generation with
+gc.freeze() right before forking. Workers re-enable the GC and only ever
+collect what they allocate themselves.
+
+A catalog reload (data watcher or /api/admin/reload) happens per worker and
+builds an unshared copy; restart the launcher after large data changes to
+share memory again.
+
+Run from the backend folder:
+    python prefork.py --workers 4 --port 8000
+    python prefork.py --app server:app --workers 8
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# A worker that dies sooner than this after starting is not restarted again
+MIN_WORKER_LIFETIME = 5.0
+
+
+def preload(app_path: str):
+    """Import `module:attribute` with the GC off, build what it builds lazily, then freeze it all"""
+    module_name, _, attribute = app_path.partition(":")
+    gc.disable()
+    module = importlib.import_module(module_name)
+    if hasattr(module, "warm_up"):
+        module.warm_up()
+    freeze()
+    return getattr(module, attribute or "app")
+
+
+def freeze():
+    """Collect the garbage once, then exempt every live object from future collections"""
+    gc.collect()
+    gc.freeze()
+
+
+def bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def fork_worker(app, sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Worker: default signal handling for uvicorn, and a GC for its own objects only
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gc.enable()
+    try:
+        import uvicorn
+
+        # Start-up events (lead pipeline, data watcher) run here, per worker, after the fork
+        config = uvicorn.Config(app, lifespan="on", log_level=log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def serve(app, workers: int, host: str, port: int, log_level: str = "info"):
+    """Fork `workers` workers on one listening socket and keep them running until SIGINT/SIGTERM"""
+    sock = bind(host, port)
+    started: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in started:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        started[fork_worker(app, sock, log_level)] = time.monotonic()
+    print(f"✅ Serving on {host}:{port} with {workers} pre-forked workers (parent {os.getpid()})")
+
+    while started:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        lifetime = time.monotonic() - started.pop(pid, time.monotonic())
+        if stopping:
+            continue
+        if lifetime < MIN_WORKER_LIFETIME:
+            print(f"❌ Worker {pid} exited after {lifetime:.1f}s (status {status}); not restarting it")
+            continue
+        print(f"⚠️ Worker {pid} exited (status {status}); starting a new one")
+        started[fork_worker(app, sock, log_level)] = time.monotonic()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked workers sharing one catalog")
+    parser.add_argument("--app", default="server_json:app", help="module:attribute of the ASGI app")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("❌ prefork.py needs os.fork(); use uvicorn --workers on this platform")
+    serve(preload(args.app), args.workers, args.host, args.port, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
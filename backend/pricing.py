@@ -0,0 +1,180 @@
+"""Salary band pricing compiled into sorted arrays searched with bisect.
+
+A premiums list such as
+
+    [{"min_salary": 0, "max_salary": 3500, "monthly_premium": 101},
+     {"min_salary": 3501, "max_salary": None, "monthly_premium": 251}]
+
+is a step function of salary. Every band edge becomes a breakpoint; between
+two breakpoints (and exactly on one) the answer cannot change, so it is
+worked out once at load time and a lookup is a single bisect.
+
+Price lists change over time, so a product can also carry several dated
+versions of its premiums (see data_sources.iter_products). PriceSchedule
+finds the version in force on a day with one more bisect, over the days
+the versions start.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Iterable, List, Optional, Sequence
+
+INF = float("inf")
+
+
+def _salary_bands(premiums) -> list:
+    """(min_salary, max_salary, monthly_premium) for every band, in list order.
+
+    A missing or null `min_salary` means 0 and a missing or null `max_salary`
+    means no upper bound (e.g. the last BPOMAS band).
+    """
+    bands = []
+    for premium in premiums or []:
+        if not isinstance(premium, dict):
+            continue
+        low = premium.get("min_salary")
+        high = premium.get("max_salary")
+        bands.append((
+            0 if low is None else low,
+            INF if high is None else high,
+            premium.get("monthly_premium"),
+        ))
+    return bands
+
+
+def _first_match(bands, salary):
+    for low, high, monthly_premium in bands:
+        if low <= salary <= high:
+            return monthly_premium
+    return None
+
+
+def _breakpoints(bands) -> List[float]:
+    return sorted({edge for low, high, _ in bands for edge in (low, high) if edge not in (INF, -INF)})
+
+
+def _segment(points: Sequence[float], salary: float) -> int:
+    """Index of the piece of the salary axis that `salary` falls in.
+
+    Piece 2j is the open interval just below points[j], piece 2j+1 is
+    points[j] itself and piece 2n is everything above the last point.
+    """
+    j = bisect_left(points, salary)
+    if j < len(points) and points[j] == salary:
+        return 2 * j + 1
+    return 2 * j
+
+
+def _representative(points: Sequence[float], segment: int) -> float:
+    """A salary lying inside the given piece"""
+    j, on_point = divmod(segment, 2)
+    if on_point:
+        return points[j]
+    if not points:
+        return 0
+    if j == 0:
+        return points[0] - 1
+    if j == len(points):
+        return points[-1] + 1
+    return (points[j - 1] + points[j]) / 2
+
+
+class SalaryBands:
+    """Compiled premium lookup for a single product.
+
+    Gives the same answer as scanning the premiums list for the first band
+    with min_salary <= salary <= max_salary, including for overlapping bands.
+    """
+
+    __slots__ = ("points", "values")
+
+    def __init__(self, premiums):
+        bands = _salary_bands(premiums)
+        self.points = _breakpoints(bands)
+        self.values = [
+            _first_match(bands, _representative(self.points, segment))
+            for segment in range(2 * len(self.points) + 1)
+        ]
+
+    def lookup(self, salary: float) -> Optional[float]:
+        return self.values[_segment(self.points, salary)]
+
+
+def day_number(effective_from: Optional[str]) -> int:
+    """Ordinal of an ISO date such as "2025-01-01"; 0 (before any day) for an undated version"""
+    return date.fromisoformat(effective_from).toordinal() if effective_from else 0
+
+
+# Lookup for products with no price in force: every salary gets None
+NO_PRICE = SalaryBands([])
+
+
+class PriceSchedule:
+    """Effective-dated versions of one product's premiums, oldest first.
+
+    Each version ({"effective_from", "premiums"}) applies from its start day
+    until the next one starts, the newest for good. Products without a
+    `price_schedule` have one version: their own premiums. Pass the
+    product's already compiled current bands as `current` to share them.
+    """
+
+    __slots__ = ("starts", "versions", "bands")
+
+    def __init__(self, product: dict, current: Optional[SalaryBands] = None):
+        versions = product.get("price_schedule") or (
+            {"effective_from": product.get("effective_from"), "premiums": product.get("premiums")},
+        )
+        self.versions = tuple(versions)
+        self.starts = tuple(day_number(version.get("effective_from")) for version in self.versions)
+        last = len(self.versions) - 1
+        self.bands = tuple(
+            current if position == last and current is not None else SalaryBands(version.get("premiums"))
+            for position, version in enumerate(self.versions)
+        )
+
+    def index(self, day: int) -> int:
+        """Position of the version in force on `day` (a date ordinal), -1 before the first"""
+        return bisect_right(self.starts, day) - 1
+
+    def version(self, day: int) -> Optional[dict]:
+        position = self.index(day)
+        return self.versions[position] if position >= 0 else None
+
+    def bands_at(self, day: int) -> SalaryBands:
+        position = self.index(day)
+        return self.bands[position] if position >= 0 else NO_PRICE
+
+
+class BandMatrix:
+    """Prices one or many salaries against a fixed list of products at once.
+
+    The breakpoints of all products are merged, so a single bisect finds the
+    row of premiums (one per product) for a salary. Rows are built the first
+    time their segment is asked for and reused afterwards.
+    """
+
+    def __init__(self, tables: Sequence[SalaryBands]):
+        self.tables = list(tables)
+        self.points = sorted({point for table in self.tables for point in table.points})
+        self._rows: List[Optional[tuple]] = [None] * (2 * len(self.points) + 1)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def segment(self, salary: float) -> int:
+        return _segment(self.points, salary)
+
+    def segment_row(self, segment: int) -> tuple:
+        row = self._rows[segment]
+        if row is None:
+            salary = _representative(self.points, segment)
+            row = tuple(table.lookup(salary) for table in self.tables)
+            self._rows[segment] = row
+        return row
+
+    def row(self, salary: float) -> tuple:
+        """Premium of every product for one salary"""
+        return self.segment_row(self.segment(salary))
+
+    def matrix(self, salaries: Iterable[float]) -> List[tuple]:
+        """Dense salaries x products premium matrix"""
+        return [self.row(salary) for salary in salaries]
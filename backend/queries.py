@@ -0,0 +1,121 @@
+"""Product queries shared by the sync and async database paths.
+
+The helpers take a sync Session; the async path runs them through
+AsyncSession.run_sync. Every product query eager-loads `Product.company`
+with a join, so turning a list of products into `schemas.ProductResponse`
+objects costs one query instead of one per product (and never lazy-loads,
+which the async session does not allow).
+"""
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session, joinedload
+
+from images import product_image
+from models import Company, PricingRule, Product
+from schemas import CompanyResponse, ProductDetailResponse
+
+
+def products_query(category: Optional[str] = None, company: Optional[str] = None):
+    query = select(Product).options(joinedload(Product.company)).order_by(Product.id)
+    if category:
+        query = query.where(Product.category == category)
+    if company:
+        # A literal, case-insensitive substring like the JSON catalog's: % and _ are escaped.
+        # has() filters through EXISTS, leaving the joinedload as the only join
+        query = query.where(Product.company.has(Company.name.icontains(company, autoescape=True)))
+    return query
+
+
+def products_page_query(
+    category: Optional[str] = None,
+    company: Optional[str] = None,
+    age: Optional[int] = None,
+    min_annual_limit: Optional[float] = None,
+    max_annual_limit: Optional[float] = None,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+):
+    """One keyset page in id order; ix_products_category_company and the primary key serve it"""
+    query = products_query(category, company).limit(limit)
+    if after_id is not None:
+        query = query.where(Product.id > after_id)
+    if age is not None:
+        query = query.where(
+            or_(Product.age_min <= age, Product.age_min.is_(None)),
+            or_(Product.age_max >= age, Product.age_max.is_(None)),
+        )
+    if min_annual_limit is not None:
+        query = query.where(Product.annual_limit >= min_annual_limit)
+    if max_annual_limit is not None:
+        query = query.where(Product.annual_limit <= max_annual_limit)
+    return query
+
+
+def products_by_ids_query(product_ids: Iterable[int]):
+    return select(Product).options(joinedload(Product.company)).where(Product.id.in_(list(product_ids))).order_by(Product.id)
+
+
+def premiums_query(product_ids: Iterable[int], salary: float, as_of: Optional[date] = None):
+    """Matching bands of the given products, served by ix_pricing_rules_lookup/_effective.
+
+    A null min_salary means 0 and a null max_salary means no upper bound.
+    Bands are the current ones (no effective_to), or those in force on `as_of`.
+    """
+    query = (
+        select(PricingRule.product_id, PricingRule.monthly_premium)
+        .where(
+            PricingRule.product_id.in_(list(product_ids)),
+            or_(PricingRule.min_salary <= salary, PricingRule.min_salary.is_(None)),
+            or_(PricingRule.max_salary >= salary, PricingRule.max_salary.is_(None)),
+        )
+        .order_by(PricingRule.product_id, PricingRule.id)
+    )
+    if as_of is None:
+        return query.where(PricingRule.effective_to.is_(None))
+    return query.where(
+        or_(PricingRule.effective_from <= as_of, PricingRule.effective_from.is_(None)),
+        or_(PricingRule.effective_to > as_of, PricingRule.effective_to.is_(None)),
+    )
+
+
+def list_products(db: Session, category: Optional[str] = None, company: Optional[str] = None) -> List[Product]:
+    return list(db.scalars(products_query(category, company)))
+
+
+def list_products_page(db: Session, limit: int = 100, **filters) -> List[Product]:
+    return list(db.scalars(products_page_query(limit=limit, **filters)))
+
+
+def get_product(db: Session, product_id: int) -> Optional[Product]:
+    return db.get(Product, product_id, options=[joinedload(Product.company)])
+
+
+def get_products(db: Session, product_ids: Iterable[int]) -> List[Product]:
+    return list(db.scalars(products_by_ids_query(product_ids)))
+
+
+def premiums_for_salary(db: Session, product_ids: Iterable[int], salary: float, as_of: Optional[date] = None) -> Dict[int, float]:
+    """product id -> monthly premium of its first band containing `salary` (on `as_of`)"""
+    premiums: Dict[int, float] = {}
+    for product_id, monthly_premium in db.execute(premiums_query(product_ids, salary, as_of)):
+        premiums.setdefault(product_id, monthly_premium)
+    return premiums
+
+
+def list_companies(db: Session) -> List[dict]:
+    companies = db.scalars(select(Company).order_by(Company.id))
+    return [CompanyResponse.model_validate(company).model_dump() for company in companies]
+
+
+def serialize_product(product: Product) -> dict:
+    """Same shape as the products served from the JSON catalog"""
+    data = ProductDetailResponse.model_validate(product).model_dump()
+    data["company_id"] = product.company_id
+    if data["effective_from"] is not None:
+        data["effective_from"] = data["effective_from"].isoformat()
+    if data["price_schedule"] is None:
+        del data["price_schedule"]
+    data["image"] = product_image(data)
+    return data
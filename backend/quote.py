@@ -0,0 +1,253 @@
+"""Eligibility and premium of every product for one household profile.
+
+A profile is an age, a salary, a number of dependants and the cover wanted.
+Each product is compiled once per catalog into a `ProductPricer`: its age
+limits, how many dependants it takes, its cover range and how it is priced.
+
+  * medical plans are priced by salary band. One bisect into the catalog's
+    premium matrix gives the premium of every banded product at once;
+  * funeral, hospital cash and life products are sold by cover. A product
+    with priced cover options quotes the cheapest option of at least the
+    cover wanted (a bisect into the options sorted by cover);
+  * products without published premiums are quoted with no premium and
+    ranked after the priced ones.
+
+Nothing is priced product by product per request. For each salary band
+segment (and each step of the cover axis) the priced products are sorted by
+premium once and kept; a quote walks those orders merged, cheapest first,
+and stops after `limit` eligible products. Eligible products are counted by
+AND-ing bitmaps kept per age, number of dependants, cover and category.
+
+Brokers quote thousands of profiles at a time and many of them repeat once
+salaries are reduced to their band segment, so `quote_many` works out each
+distinct profile only once.
+"""
+import os
+from bisect import bisect_left
+from heapq import merge
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cache import LRUCache
+from metrics import span
+from search import bitmap
+
+DEFAULT_QUOTES = 20
+MAX_QUOTES = 100
+# Most profiles one /api/quote/batch request may hold
+MAX_BATCH_PROFILES = int(os.getenv("QUOTE_BATCH_MAX", "10000"))
+INF = float("inf")
+
+
+class CoverTiers:
+    """Cheapest priced cover option giving at least a given cover"""
+
+    __slots__ = ("covers", "best")
+
+    def __init__(self, premiums):
+        options = sorted(
+            (float(premium["cover_amount"]), float(premium["monthly_premium"]))
+            for premium in premiums or []
+            if isinstance(premium, dict)
+            and isinstance(premium.get("cover_amount"), (int, float))
+            and isinstance(premium.get("monthly_premium"), (int, float))
+        )
+        self.covers = [cover for cover, _ in options]
+        # best[i]: cheapest (premium, cover) among options[i:], the smaller cover on a tie
+        self.best: List[Tuple[float, float]] = []
+        current = None
+        for cover, premium in reversed(options):
+            if current is None or premium <= current[0]:
+                current = (premium, cover)
+            self.best.append(current)
+        self.best.reverse()
+
+    def __len__(self):
+        return len(self.covers)
+
+    def lookup(self, cover: Optional[float]) -> Optional[Tuple[float, float]]:
+        """(monthly premium, cover) of the option to sell; None if no option is big enough"""
+        index = bisect_left(self.covers, cover or 0)
+        return self.best[index] if index < len(self.best) else None
+
+
+class ProductPricer:
+    """Everything a quote needs from one product, read once per catalog"""
+
+    __slots__ = (
+        "position", "item", "age_min", "age_max", "max_dependants",
+        "sells_cover", "cover_min", "cover_max", "cover_limit", "tiers", "bands",
+    )
+
+    def __init__(self, catalog, product: dict):
+        terms = catalog.terms(product)
+        company = product.get("company")
+        self.position = catalog.position(product["id"])
+        self.item = {
+            "id": product["id"],
+            "name": product.get("name"),
+            "company": company.get("name") if isinstance(company, dict) else company,
+            "category": product.get("category"),
+        }
+        self.age_min = terms.age_min
+        self.age_max = terms.age_max
+        self.max_dependants = terms.max_dependants
+        self.tiers = CoverTiers(product.get("premiums"))
+        self.sells_cover = bool(self.tiers) or bool(product.get("sum_assured"))
+        self.cover_min = terms.cover_min
+        self.cover_max = terms.cover_max
+        # The most cover one can ask for and still be quoted
+        if self.tiers:
+            self.cover_limit = self.tiers.covers[-1]
+        elif self.sells_cover and self.cover_max is not None:
+            self.cover_limit = self.cover_max
+        else:
+            self.cover_limit = INF
+        bands = catalog.salary_bands(product)
+        self.bands = bands if not self.tiers and any(value is not None for value in bands.values) else None
+
+    def eligible(self, age: int, dependants: int, cover: Optional[float]) -> bool:
+        if (self.age_min is not None and age < self.age_min) or (self.age_max is not None and age > self.age_max):
+            return False
+        if self.max_dependants is not None and dependants > self.max_dependants:
+            return False
+        return cover is None or cover <= self.cover_limit
+
+    def quoted_cover(self, cover: Optional[float]) -> Optional[float]:
+        """Cover quoted for a product without a priced option; less than the minimum sum assured gets the minimum"""
+        if not self.sells_cover:
+            return self.cover_max
+        if cover is None or (self.cover_min is not None and cover < self.cover_min):
+            return self.cover_min
+        return cover
+
+
+class QuoteEngine:
+    """Quotes against one catalog; get it with `catalog.quotes()`"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.pricers = [ProductPricer(catalog, product) for product in catalog.products]
+        positions: Dict[Optional[str], List[int]] = {}
+        for pricer in self.pricers:
+            positions.setdefault(pricer.item["category"], []).append(pricer.position)
+        self._categories = {category: bitmap(found) for category, found in positions.items()}
+        self._everyone = (1 << len(self.pricers)) - 1
+
+        by_limit = sorted((pricer.cover_limit, pricer.position) for pricer in self.pricers)
+        self._cover_limits = [limit for limit, _ in by_limit]
+        self._by_cover_limit = [position for _, position in by_limit]
+        # A tier lookup gives the same option for every cover between two of these
+        self._tier_covers = sorted({cover for pricer in self.pricers for cover in pricer.tiers.covers})
+
+        # ("age", 40) / ("dependants", 3) / ("cover", index) -> bitmap of eligible positions
+        self._masks = LRUCache(maxsize=512)
+        # (kind, segment or cover step, category) -> products in the order they are quoted
+        self._orders = LRUCache(maxsize=128)
+
+    def key(self, age: int, salary: Optional[float] = None, dependants: int = 0,
+            cover: Optional[float] = None, category: Optional[str] = None) -> tuple:
+        """Profiles with the same key get the same quotes"""
+        segment = self.catalog.premium_matrix().segment(salary) if salary is not None else None
+        return age, segment, dependants, cover, category
+
+    def quote(self, age: int, salary: Optional[float] = None, dependants: int = 0,
+              cover: Optional[float] = None, category: Optional[str] = None, limit: int = DEFAULT_QUOTES) -> dict:
+        """{"total": eligible products, "ineligible": the others, "quotes": best `limit`, cheapest first}"""
+        with span("quote"):
+            return self._quote(self.key(age, salary, dependants, cover, category), limit)
+
+    def quote_many(self, profiles: Iterable[dict], limit: int = DEFAULT_QUOTES) -> List[dict]:
+        """`quote` for each profile dict, each distinct profile worked out once"""
+        done: Dict[tuple, dict] = {}
+        results = []
+        with span("quote_batch"):
+            for profile in profiles:
+                key = self.key(**profile)
+                result = done.get(key)
+                if result is None:
+                    result = done[key] = self._quote(key, limit)
+                results.append(result)
+        return results
+
+    def _quote(self, key: tuple, limit: int) -> dict:
+        age, segment, dependants, cover, category = key
+        offered = self._everyone if category is None else self._categories.get(category, 0)
+        eligible = offered & self._age_mask(age) & self._dependants_mask(dependants) & self._cover_mask(cover)
+        total = eligible.bit_count()
+
+        quotes = []
+        wanted = min(limit, total)
+        if wanted:
+            step = bisect_left(self._tier_covers, cover or 0)
+            priced = merge(self._salary_order(segment, category), self._tier_order(step, category))
+            for premium, position, quoted_cover in priced:
+                pricer = self.pricers[position]
+                if pricer.eligible(age, dependants, cover):
+                    quotes.append({**pricer.item, "monthly_premium": premium, "cover": quoted_cover})
+                    if len(quotes) == wanted:
+                        break
+        if len(quotes) < wanted:
+            # The rest have no published premium and go in catalog order
+            for pricer in self._unpriced_order(segment, category):
+                if pricer.eligible(age, dependants, cover):
+                    quotes.append({**pricer.item, "monthly_premium": None, "cover": pricer.quoted_cover(cover)})
+                    if len(quotes) == wanted:
+                        break
+        return {"total": total, "ineligible": offered.bit_count() - total, "quotes": quotes}
+
+    def _offered(self, category: Optional[str]) -> List[ProductPricer]:
+        if category is None:
+            return self.pricers
+        return [pricer for pricer in self.pricers if pricer.item["category"] == category]
+
+    def _age_mask(self, age: int) -> int:
+        return self._masks.get_or_set(("age", age), lambda: bitmap(
+            pricer.position for pricer in self.pricers
+            if (pricer.age_min is None or pricer.age_min <= age) and (pricer.age_max is None or age <= pricer.age_max)
+        ))
+
+    def _dependants_mask(self, dependants: int) -> int:
+        return self._masks.get_or_set(("dependants", dependants), lambda: bitmap(
+            pricer.position for pricer in self.pricers
+            if pricer.max_dependants is None or dependants <= pricer.max_dependants
+        ))
+
+    def _cover_mask(self, cover: Optional[float]) -> int:
+        if cover is None:
+            return self._everyone
+        start = bisect_left(self._cover_limits, cover)
+        return self._masks.get_or_set(("cover", start), lambda: bitmap(self._by_cover_limit[start:]))
+
+    def _salary_order(self, segment: Optional[int], category: Optional[str]) -> List[tuple]:
+        """(premium, position, cover) of the products priced at this salary band segment, cheapest first"""
+        if segment is None:
+            return []
+
+        def build():
+            row = self.catalog.premium_matrix().segment_row(segment)
+            return sorted(
+                (row[pricer.position], pricer.position, pricer.cover_max)
+                for pricer in self._offered(category)
+                if pricer.bands is not None and row[pricer.position] is not None
+            )
+        return self._orders.get_or_set(("salary", segment, category), build)
+
+    def _tier_order(self, step: int, category: Optional[str]) -> List[tuple]:
+        """(premium, position, cover) of the option each tiered product sells for covers up to step `step`"""
+        if step == len(self._tier_covers):
+            return []
+        cover = self._tier_covers[step]
+
+        def build():
+            options = ((pricer.tiers.lookup(cover), pricer.position) for pricer in self._offered(category) if pricer.tiers)
+            return sorted((option[0], position, option[1]) for option, position in options if option is not None)
+        return self._orders.get_or_set(("cover", step, category), build)
+
+    def _unpriced_order(self, segment: Optional[int], category: Optional[str]) -> Iterator[ProductPricer]:
+        def build():
+            row = self.catalog.premium_matrix().segment_row(segment) if segment is not None else None
+            return [
+                pricer for pricer in self._offered(category)
+                if not pricer.tiers and (pricer.bands is None or row is None or row[pricer.position] is None)
+            ]
+        return iter(self._orders.get_or_set(("unpriced", segment, category), build))
@@ -0,0 +1,163 @@
+"""Pre-encoded JSON responses with strong ETags and precompressed variants.
+
+A payload is encoded to bytes once (orjson when installed, otherwise the same
+json.dumps call FastAPI uses), gzip and brotli variants are compressed once,
+and every request after that only picks a variant or answers 304.
+
+Payloads built while serving a request use fast compression levels, since
+clients choose the cache keys (search terms, filters, cursors, id sets) and
+could otherwise make every request pay for the slowest ones. Payloads built
+ahead of time (static_export.py) use the highest levels.
+"""
+import gzip
+import hashlib
+import os
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from cache import dump_json
+from metrics import span
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+# Below this size compression costs more than it saves
+MIN_COMPRESS_SIZE = 512
+# Levels of payloads built on the request path: brotli 11 costs tens of ms a page
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Levels of payloads built ahead of time, whose size matters more than the time
+THOROUGH_BROTLI_QUALITY = 11
+THOROUGH_GZIP_LEVEL = 9
+# Responses built for one request only get a quick gzip instead of the cached variants
+ONE_OFF_GZIP_LEVEL = 1
+CACHE_CONTROL = "public, no-cache"
+
+
+def encode_json(content: Any) -> bytes:
+    with span("serialize"):
+        if orjson is not None:
+            return orjson.dumps(content)
+        return dump_json(content)
+
+
+def strong_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class EncodedPayload:
+    """One JSON document in identity, gzip and (optionally) brotli encodings"""
+
+    __slots__ = ("body", "etag", "variants")
+
+    def __init__(self, body: bytes, thorough: bool = False):
+        """`thorough` compresses at the highest levels, for payloads built ahead of time"""
+        self.body = body
+        self.etag = strong_etag(body)
+        # content-coding -> (compressed body, etag of that representation)
+        self.variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                quality = THOROUGH_BROTLI_QUALITY if thorough else BROTLI_QUALITY
+                self._add_variant("br", brotli.compress(body, quality=quality))
+            level = THOROUGH_GZIP_LEVEL if thorough else GZIP_LEVEL
+            self._add_variant("gzip", gzip.compress(body, compresslevel=level, mtime=0))
+
+    @classmethod
+    def from_content(cls, content: Any) -> "EncodedPayload":
+        body = encode_json(content)
+        with span("compress"):
+            return cls(body)
+
+    def _add_variant(self, coding: str, data: bytes):
+        if len(data) < len(self.body):
+            self.variants[coding] = (data, '%s-%s"' % (self.etag[:-1], coding))
+
+    def etags(self):
+        return [self.etag] + [etag for _, etag in self.variants.values()]
+
+    def pick(self, accept_encoding: str):
+        """(body, etag, content-coding or None) for the client's Accept-Encoding"""
+        accepted = _accepted_codings(accept_encoding)
+        for coding in ("br", "gzip"):
+            if coding in self.variants and coding in accepted:
+                data, etag = self.variants[coding]
+                return data, etag, coding
+        return self.body, self.etag, None
+
+
+class TimedJSONResponse(JSONResponse):
+    """FastAPI's default response class, with rendering timed as a "serialize" span"""
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize"):
+            return super().render(content)
+
+
+def _accepted_codings(header: str) -> set:
+    codings = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and _is_zero(params[2:]):
+            continue
+        codings.add(coding.strip().lower())
+    return codings
+
+
+def _is_zero(q: str) -> bool:
+    try:
+        return float(q) == 0
+    except ValueError:
+        return False
+
+
+def _not_modified(if_none_match: Optional[str], payload: EncodedPayload) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    if "*" in candidates:
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = {tag[2:] if tag.startswith("W/") else tag for tag in candidates}
+    return any(etag in candidates for etag in payload.etags())
+
+
+def respond(payload: EncodedPayload, request: Request) -> Response:
+    body, etag, coding = payload.pick(request.headers.get("accept-encoding", ""))
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": CACHE_CONTROL}
+
+    if _not_modified(request.headers.get("if-none-match"), payload):
+        return Response(status_code=304, headers=headers)
+
+    if coding:
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def respond_once(content: Any, request: Request) -> Response:
+    """JSON response that is not worth caching, e.g. a batch of quotes"""
+    body = encode_json(content)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= MIN_COMPRESS_SIZE and "gzip" in _accepted_codings(request.headers.get("accept-encoding", "")):
+        with span("compress"):
+            body = gzip.compress(body, compresslevel=ONE_OFF_GZIP_LEVEL, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def link_next_page(response: Response, request: Request, cursor: Optional[str]) -> Response:
+    """Point paginated list responses at the next page (X-Next-Cursor and a Link header)"""
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
+    return response
@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from datetime import date
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 
+from quote import MAX_BATCH_PROFILES
+
 class CompanyResponse(BaseModel):
     id: int
     name: str
@@ -29,6 +32,8 @@ class ProductDetailResponse(ProductResponse):
     exclusions: Optional[str] = None
     key_features: List[str] = []
     premiums: List[Dict[str, Any]] = []
+    effective_from: Optional[date] = None
+    price_schedule: Optional[List[Dict[str, Any]]] = None
     co_payment: Optional[str] = None
     hospital_network: Optional[str] = None
     maternity_cover: Optional[str] = None
@@ -43,4 +48,19 @@ class LeadCreate(BaseModel):
     notes: Optional[str] = None
 
 class ComparisonResponse(BaseModel):
-    comparison: List[Dict[str, Any]]
\ No newline at end of file
+    comparison: List[Dict[str, Any]]
+
+class QuoteProfile(BaseModel):
+    age: int = Field(ge=0, le=120)
+    salary: Optional[float] = Field(None, ge=0)
+    dependants: int = Field(0, ge=0, le=20)
+    cover: Optional[float] = Field(None, gt=0)
+    category: Optional[str] = None
+
+class QuoteRequest(QuoteProfile):
+    limit: int = Field(20, ge=1, le=100)
+
+class QuoteBatchRequest(BaseModel):
+    # Refused with a 422 while validating, rather than after every profile has been
+    profiles: List[QuoteProfile] = Field(max_length=MAX_BATCH_PROFILES)
+    limit: int = Field(5, ge=1, le=100)
@@ -0,0 +1,255 @@
+"""Full-text product search over an inverted index built with each catalog.
+
+Product text is tokenized once, when the index is built. Every posting
+carries its BM25 score already worked out (idf, term frequency and length
+normalization are all known at build time) and postings are kept best-first,
+so answering a query only adds up stored numbers. A query word matches every
+indexed word it is a prefix of, found by bisecting the sorted vocabulary;
+all query words have to match (AND).
+
+Multi-word queries walk the best-first postings in step and stop as soon as
+nothing further down can beat the current top `limit` (Fagin's threshold
+algorithm), so a query costs about the same with 500 or 50,000 products.
+"""
+import os
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import heappush, heapreplace, nlargest
+from math import log
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cache import LRUCache
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+THOUSANDS_SEPARATOR = re.compile(r"(?<=\d),(?=\d{3})")
+# Pula amounts are written "P9,240" or "BWP 9240"; the number is a word of its own
+CURRENCY_PREFIX = re.compile(r"\b(p|bwp)(?=\d)")
+NONZERO_BYTE = re.compile(rb"[^\x00]")
+STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+
+# BM25F-style field weights: a word in the name counts three times one in the features
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "company": 2.0,
+    "category": 2.0,
+    "key_features": 1.0,
+    "hospital_network": 1.0,
+    "maternity_cover": 1.0,
+    "chronic_cover": 1.0,
+    "dental_optical": 1.0,
+    "co_payment": 0.5,
+    "sum_assured": 0.5,
+    "exclusions": 0.5,
+}
+K1 = 1.2
+B = 0.75
+# Query words shorter than this only match whole words
+MIN_PREFIX = 2
+# A prefix match scores this fraction of a whole-word match
+PREFIX_WEIGHT = 0.8
+# Up to this many matches are simply all scored instead of walking the postings
+DIRECT_SCORING = 64
+# Query words whose doc -> score lookups are kept around
+TERM_CACHE_SIZE = int(os.getenv("SEARCH_TERM_CACHE_SIZE", "64"))
+
+# (docs best-first, their scores, doc -> score, bitmap of the docs)
+Matches = Tuple[Sequence[int], Sequence[float], Dict[int, float], int]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric words without stopwords; "P5,000" -> ["p", "5000"]"""
+    text = CURRENCY_PREFIX.sub(r"\1 ", THOUSANDS_SEPARATOR.sub("", text.lower()))
+    return [token for token in TOKEN_PATTERN.findall(text) if token not in STOPWORDS]
+
+
+def field_text(product: dict, field: str) -> str:
+    value = product.get(field)
+    if field == "company" and isinstance(value, dict):
+        value = value.get("name")
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value) if value is not None else ""
+
+
+class SearchIndex:
+    def __init__(self, products: Iterable[dict]):
+        self.products: List[dict] = list(products)
+
+        # Insurers repeat the same network, exclusion and co-payment text
+        # across plans, so each distinct string is only tokenized once
+        counted: Dict[str, Tuple[Tuple[Tuple[str, int], ...], int]] = {}
+        docs_by_term: Dict[str, List[int]] = {}
+        frequencies_by_term: Dict[str, List[float]] = {}
+        lengths: List[float] = []
+        categories: Dict[Optional[str], List[int]] = {}
+
+        for doc, product in enumerate(self.products):
+            frequencies: Dict[str, float] = {}
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                text = field_text(product, field)
+                if text not in counted:
+                    tokens = tokenize(text)
+                    counted[text] = (tuple(Counter(tokens).items()), len(tokens))
+                counts, count = counted[text]
+                length += weight * count
+                for token, n in counts:
+                    frequencies[token] = frequencies.get(token, 0.0) + weight * n
+            for token, frequency in frequencies.items():
+                if token in docs_by_term:
+                    docs_by_term[token].append(doc)
+                    frequencies_by_term[token].append(frequency)
+                else:
+                    docs_by_term[token] = [doc]
+                    frequencies_by_term[token] = [frequency]
+            lengths.append(length)
+            categories.setdefault(product.get("category"), []).append(doc)
+
+        average = (sum(lengths) / len(lengths)) if lengths else 1.0
+        self._norms = array("d", [K1 * (1 - B + B * length / (average or 1.0)) for length in lengths])
+
+        self.vocabulary: List[str] = sorted(docs_by_term)
+        # word -> (doc numbers, weighted term frequencies), in catalog order
+        self._frequencies: Dict[str, Tuple[array, array]] = {
+            term: (array("i", docs), array("d", frequencies_by_term[term])) for term, docs in docs_by_term.items()
+        }
+        # word -> (doc numbers, BM25 scores) best first, filled in on first use
+        self._postings: Dict[str, Tuple[array, array]] = {}
+
+        self._categories: Dict[Optional[str], int] = {category: bitmap(docs) for category, docs in categories.items()}
+        self.match_cache = LRUCache(maxsize=TERM_CACHE_SIZE)
+
+    def __len__(self):
+        return len(self.products)
+
+    def postings(self, term: str) -> Tuple[array, array]:
+        """(doc numbers, BM25 scores) of an indexed word, best first; ties stay in catalog order.
+
+        Scoring every word at build time would double the build, and most
+        words are never searched for.
+        """
+        postings = self._postings.get(term)
+        if postings is None:
+            docs, frequencies = self._frequencies[term]
+            norms = self._norms
+            idf = log(1 + (len(norms) - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores = [idf * f * (K1 + 1) / (f + norms[doc]) for doc, f in zip(docs, frequencies)]
+            order = sorted(range(len(docs)), key=scores.__getitem__, reverse=True)
+            postings = (array("i", map(docs.__getitem__, order)), array("d", map(scores.__getitem__, order)))
+            self._postings[term] = postings
+        return postings
+
+    def expand(self, token: str) -> List[str]:
+        """Indexed words starting with `token`, the word itself first if indexed"""
+        if len(token) < MIN_PREFIX:
+            return [token] if token in self._frequencies else []
+        vocabulary = self.vocabulary
+        end = start = bisect_left(vocabulary, token)
+        while end < len(vocabulary) and vocabulary[end].startswith(token):
+            end += 1
+        return vocabulary[start:end]
+
+    def matches(self, token: str) -> Matches:
+        """Products matching one query word, best first, with a doc -> score lookup"""
+        return self.match_cache.get_or_set(token, lambda: self._build_matches(token))
+
+    def _build_matches(self, token: str) -> Matches:
+        terms = self.expand(token)
+        if len(terms) == 1:
+            docs, scores = self.postings(terms[0])
+            if terms[0] != token:
+                scores = array("d", [score * PREFIX_WEIGHT for score in scores])
+            return docs, scores, dict(zip(docs, scores)), bitmap(docs)
+
+        best: Dict[int, float] = {}
+        for term in terms:
+            weight = 1.0 if term == token else PREFIX_WEIGHT
+            docs, scores = self.postings(term)
+            for doc, score in zip(docs, scores):
+                score *= weight
+                if score > best.get(doc, 0.0):
+                    best[doc] = score
+        docs = sorted(sorted(best), key=best.__getitem__, reverse=True)
+        return docs, [best[doc] for doc in docs], best, bitmap(best)
+
+    def search(self, query: str, limit: int = 20, category: Optional[str] = None) -> Tuple[int, List[Tuple[dict, float]]]:
+        """(number of matching products, best `limit` of them with their scores)"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or limit <= 0:
+            return 0, []
+        lists = sorted((self.matches(token) for token in tokens), key=lambda matches: len(matches[0]))
+        if not lists[0][0]:
+            return 0, []
+
+        if len(lists) == 1 and category is None:
+            # One query word: its matches are already in rank order
+            docs, scores, _, _ = lists[0]
+            return len(docs), [(self.products[doc], score) for doc, score in zip(docs[:limit], scores[:limit])]
+
+        # Matches are counted by AND-ing bitmaps, a few microseconds even for
+        # tens of thousands of products
+        common = lists[0][3]
+        for matches in lists[1:]:
+            common &= matches[3]
+        if category is not None:
+            common &= self._categories.get(category, 0)
+        total = common.bit_count()
+        if not total:
+            return 0, []
+
+        lookups = [matches[2] for matches in lists]
+        if total <= DIRECT_SCORING:
+            candidates = members(common)
+            best = nlargest(limit, ((sum(lookup[doc] for lookup in lookups), -doc) for doc in candidates))
+        else:
+            best = self._threshold_top(lists, common, limit)
+        return total, [(self.products[-negative_doc], score) for score, negative_doc in best]
+
+    def _threshold_top(self, lists: List[Matches], common: int, limit: int) -> List[Tuple[float, int]]:
+        """Best `limit` (score, -doc) among the docs in bitmap `common`, reading the best-first lists in step"""
+        lookups = [matches[2] for matches in lists]
+        heap: List[Tuple[float, int]] = []
+        seen = set()
+        for depth in range(len(lists[0][0])):
+            threshold = 0.0
+            for docs, scores, _, _ in lists:
+                # The shortest list runs out first; by then every match has been seen
+                doc = docs[depth]
+                threshold += scores[depth]
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                if not common >> doc & 1:
+                    continue
+                item = (sum(lookup[doc] for lookup in lookups), -doc)
+                if len(heap) < limit:
+                    heappush(heap, item)
+                elif item > heap[0]:
+                    heapreplace(heap, item)
+            # Nothing not yet seen can score above the sum of the current positions
+            if len(heap) == limit and heap[0][0] >= threshold:
+                break
+        return sorted(heap, reverse=True)
+
+
+def bitmap(docs: Iterable[int]) -> int:
+    """Set of doc numbers as an int with bit `doc` set for each"""
+    bits = bytearray()
+    for doc in docs:
+        byte = doc >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        bits[byte] |= 1 << (doc & 7)
+    return int.from_bytes(bits, "little")
+
+
+def members(mask: int) -> List[int]:
+    """Doc numbers set in `mask`, ascending"""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    docs = []
+    for match in NONZERO_BYTE.finditer(data):
+        byte, offset = match.group()[0], match.start() * 8
+        docs.extend(offset + bit for bit in range(8) if byte >> bit & 1)
+    return docs
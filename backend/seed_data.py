@@ -1,168 +1,244 @@
+import argparse
+import hashlib
 import json
-import os
-import re
-from sqlalchemy.orm import Session
+import time
+from datetime import date
+from pathlib import Path
+from sqlalchemy import Date, String, delete, func, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
 from models import Company, Product, PricingRule
 from database import engine, Base
+from data_sources import DATA_DIR, load_catalog_data
 
-def extract_number(text):
-    """Extract numbers from strings like 'BWP 2,215,000'"""
-    if not text:
-        return 0
-    numbers = re.findall(r'[\d,]+\.?\d*', str(text))
-    if numbers:
-        return float(numbers[0].replace(',', ''))
-    return 0
-
-def seed_database():
-    Base.metadata.create_all(bind=engine)
-    
-    from database import SessionLocal
-    db = SessionLocal()
-    
-    try:
-        # Clear existing data
-        db.query(PricingRule).delete()
-        db.query(Product).delete()
-        db.query(Company).delete()
-        
-        # Create companies from YOUR data
-        companies_data = [
-            {"name": "Liberty Life Botswana (Pty) Limited", "type": "life_funeral"},
-            {"name": "Metropolitan Life Botswana", "type": "life"},
-            {"name": "Botsogo Health Plan", "type": "medical"},
-            {"name": "Botswana Public Officers Medical Aid Scheme (BPOMAS)", "type": "medical"},
-            {"name": "Pula Medical Aid Fund (Pulamed)", "type": "medical"},
-        ]
-        
-        companies = {}
-        for company_data in companies_data:
-            company = Company(**company_data)
-            db.add(company)
-            db.flush()  # Get ID
-            companies[company.name] = company.id
-        
-        db.commit()
-        
-        # Load and process YOUR JSON files
-        json_files = [
-            ("funeral_liberty_boago.json", "Liberty Life Botswana (Pty) Limited"),
-            ("hospital_cashback.json", "Liberty Life Botswana (Pty) Limited"),
-            ("life_metropolitan_mothusi.json", "Metropolitan Life Botswana"),
-            ("medical_botsogo_2025.json", "Botsogo Health Plan"),
-            ("medical_bpomas_2025.json", "Botswana Public Officers Medical Aid Scheme (BPOMAS)"),
-            ("medical_pulamed_2025.json", "Pula Medical Aid Fund (Pulamed)"),
-        ]
-        
-        for filename, company_name in json_files:
-            filepath = os.path.join("..", "data", filename)
-            
-            if not os.path.exists(filepath):
-                print(f"Warning: {filepath} not found")
+# Chunk size for IN (...) lists and multi-row statements
+BATCH_SIZE = 500
+
+def ensure_schema(conn):
+    """Create missing tables, and columns/indexes added to existing ones since"""
+    Base.metadata.create_all(bind=conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                # products.effective_from used to be a VARCHAR of ISO dates; SQLite reads those as dates already
+                if (
+                    isinstance(column.type, Date) and isinstance(existing[column.name], String)
+                    and conn.dialect.name == "postgresql"
+                ):
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE DATE USING {column.name}::date"
+                    ))
                 continue
-                
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            company_id = companies[company_name]
-            
-            if "plans" in data:  # Medical data
-                for plan in data["plans"]:
-                    # Handle premiums properly
-                    premiums = []
-                    if isinstance(plan.get("premiums"), list):
-                        premiums = plan["premiums"]
-                    elif plan.get("premiums") and isinstance(plan["premiums"], str):
-                        # Try to extract premium from string
-                        premium_text = plan["premiums"]
-                        if "P" in premium_text or "p" in premium_text:
-                            # Extract first number found
-                            matches = re.findall(r'(\d+(?:,\d+)*(?:\.\d+)?)', premium_text)
-                            if matches:
-                                try:
-                                    premium_value = float(matches[0].replace(',', ''))
-                                    premiums = [{"monthly_premium": premium_value}]
-                                except:
-                                    pass
-                    
-                    product = Product(
-                        name=plan["plan_name"],
-                        category="medical",
-                        company_id=company_id,
-                        annual_limit=extract_number(plan.get("annual_limit", "0")),
-                        co_payment=plan.get("co_payment"),
-                        hospital_network=plan.get("hospital_network"),
-                        maternity_cover=plan.get("maternity_cover"),
-                        chronic_cover=plan.get("chronic_cover"),
-                        dental_optical=plan.get("dental_optical"),
-                        waiting_period_natural=plan.get("waiting_period"),
-                        key_features=[],
-                        premiums=premiums
-                    )
-                    db.add(product)
-                    db.flush()
-                    
-                    # Add pricing rules if premiums exist as structured data
-                    if isinstance(plan.get("premiums"), list):
-                        for premium_data in plan["premiums"]:
-                            if isinstance(premium_data, dict) and "monthly_premium" in premium_data:
-                                pricing_rule = PricingRule(
-                                    product_id=product.id,
-                                    min_salary=premium_data.get("min_salary"),
-                                    max_salary=premium_data.get("max_salary"),
-                                    monthly_premium=premium_data["monthly_premium"]
-                                )
-                                db.add(pricing_rule)
-            
-            elif "products" in data:  # Life/Funeral data
-                for product_data in data["products"]:
-                    # Ensure premiums is a list
-                    premiums = product_data.get("premiums", [])
-                    if not isinstance(premiums, list):
-                        premiums = []
-                    
-                    product = Product(
-                        name=product_data["product_name"],
-                        category=product_data["category"],
-                        company_id=company_id,
-                        sum_assured=product_data.get("sum_assured"),
-                        waiting_period_natural=product_data.get("waiting_period_natural"),
-                        waiting_period_accidental=product_data.get("waiting_period_accidental"),
-                        age_min=product_data.get("age_min"),
-                        age_max=product_data.get("age_max"),
-                        exclusions=product_data.get("exclusions"),
-                        key_features=product_data.get("key_features", []),
-                        premiums=premiums
-                    )
-                    db.add(product)
-        
-        db.commit()
-        print("=" * 60)
-        print("Database seeded successfully with REAL Botswana insurance data!")
-        print("=" * 60)
-        print(f"✓ Added {len(companies)} companies")
-        
-        # Count products by category
-        medical_count = db.query(Product).filter(Product.category == "medical").count()
-        life_count = db.query(Product).filter(Product.category == "life").count()
-        funeral_count = db.query(Product).filter(Product.category == "funeral").count()
-        hospital_cash_count = db.query(Product).filter(Product.category == "hospital_cash").count()
-        
-        print(f"✓ Medical Plans: {medical_count}")
-        print(f"✓ Life Insurance: {life_count}")
-        print(f"✓ Funeral Plans: {funeral_count}")
-        print(f"✓ Hospital Cash: {hospital_cash_count}")
-        print(f"✓ TOTAL PRODUCTS: {medical_count + life_count + funeral_count + hospital_cash_count}")
-        print("=" * 60)
-        
+            column_type = column.type.compile(dialect=conn.dialect)
+            default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+# Bump when pricing_rows() changes, so the next reseed rewrites every product's rules
+PRICING_RULES_FORMAT = 2
+
+def content_hash(row):
+    data = json.dumps([PRICING_RULES_FORMAT, row], sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+PRODUCT_COLUMNS = [column.name for column in Product.__table__.columns if column.name not in ("content_hash", "variant")]
+NATURAL_KEY = ("company_id", "category", "name", "variant")
+
+def product_row(product_data, variant=0):
+    # Every row carries every column so rows can share one multi-row INSERT
+    row = {column: product_data.get(column) for column in PRODUCT_COLUMNS}
+    row["effective_from"] = to_date(row["effective_from"])
+    row["variant"] = variant
+    # The id is left out of the hash: it is a surrogate, the natural key identifies the row
+    row["content_hash"] = content_hash({column: value for column, value in row.items() if column != "id"})
+    return row
+
+def natural_key(row):
+    return tuple(row[column] for column in NATURAL_KEY)
+
+def product_rows(products):
+    """Rows of the catalog's products by natural key; same-named products are numbered in id order"""
+    rows = {}
+    for product_data in sorted(products, key=lambda product: product["id"]):
+        variant = 0
+        while (product_data.get("company_id"), product_data.get("category"), product_data.get("name"), variant) in rows:
+            variant += 1
+        row = product_row(product_data, variant)
+        rows[natural_key(row)] = row
+    return rows
+
+def pricing_rows(product_data, product_id):
+    """Every premium becomes a pricing rule, one set per dated version, in list order.
+
+    Salary bands fill min/max_salary, cover tiers cover_amount; a flat premium
+    has neither. The order matters: a lookup takes the first matching rule,
+    as SalaryBands takes the first matching premium.
+    """
+    versions = product_data.get("price_schedule") or [product_data]
+    rows = []
+    for position, version in enumerate(versions):
+        # A version applies until the next one starts; the last has no end
+        following = versions[position + 1]["effective_from"] if position + 1 < len(versions) else None
+        rows.extend(
+            {
+                "product_id": product_id,
+                "min_salary": premium_data.get("min_salary"),
+                "max_salary": premium_data.get("max_salary"),
+                "cover_amount": premium_data.get("cover_amount"),
+                "monthly_premium": premium_data["monthly_premium"],
+                "effective_from": to_date(version.get("effective_from")),
+                "effective_to": to_date(following),
+            }
+            for premium_data in version.get("premiums") or []
+            if isinstance(premium_data, dict) and premium_data.get("monthly_premium") is not None
+        )
+    return rows
+
+def to_date(value):
+    return date.fromisoformat(value) if value else None
+
+def upsert(conn, model, rows, conflict=("id",)):
+    """INSERT ... ON CONFLICT (`conflict`) DO UPDATE for every row, returning the ids written.
+
+    On a natural key conflict the row keeps its id; pass rows whose id already matches.
+    """
+    if not rows:
+        return []
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(conn.dialect.name)
+    written = []
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        if dialect is None:
+            # No portable upsert: replace the rows instead
+            conn.execute(delete(model).where(model.id.in_([row["id"] for row in batch])))
+            conn.execute(model.__table__.insert(), batch)
+            written.extend(row["id"] for row in batch)
+            continue
+        statement = dialect.insert(model).values(batch)
+        statement = statement.on_conflict_do_update(
+            index_elements=[getattr(model, column) for column in conflict],
+            set_={column: statement.excluded[column] for column in batch[0] if column != "id"},
+        ).returning(model.id)
+        written.extend(conn.execute(statement).scalars())
+    return written
+
+def chunks(values):
+    values = list(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+def seed_database(data_dir: Path = DATA_DIR):
+    """Bring the database in line with data/ (or `data_dir`), rewriting only what changed.
+
+    Products are matched by their natural key (company, category, name) and
+    carry a hash of their normalized record, so a reseed with unchanged data
+    writes nothing. New products take the id the JSON API hands out; stored
+    rows keep theirs, which is only a surrogate. The whole load is one
+    transaction: readers see either the old or the new catalog, never empty
+    tables.
+    """
+    timings = {}
+    started = time.perf_counter()
+    products, companies_data = load_catalog_data(data_dir)
+    timings["load"] = time.perf_counter() - started
+
+    try:
+        with engine.begin() as conn:
+            phase = time.perf_counter()
+            ensure_schema(conn)
+
+            # Companies are a handful of rows: upsert them all
+            upsert(conn, Company, [dict(company) for company in companies_data])
+
+            rows = product_rows(products)
+            # natural key -> (id, content hash) of every product already stored
+            existing = {
+                tuple(key): (product_id, digest)
+                for product_id, digest, *key in conn.execute(
+                    select(Product.id, Product.content_hash, *(getattr(Product, column) for column in NATURAL_KEY))
+                )
+            }
+            changed = [row for key, row in rows.items() if existing.get(key, (None, None))[1] != row["content_hash"]]
+            removed = [product_id for key, (product_id, _) in existing.items() if key not in rows]
+            new_keys = {natural_key(row) for row in changed if natural_key(row) not in existing}
+
+            # Stored products keep their id; a new one takes the catalog's unless a stored row holds it
+            catalog_ids = {row["id"] for row in rows.values()}
+            kept_ids = {product_id for key, (product_id, _) in existing.items() if key in rows}
+            next_id = max(catalog_ids | kept_ids | set(removed), default=0) + 1
+            # Catalog id -> database id of every product about to be written
+            stored_ids = {}
+            for row in changed:
+                catalog_id = row["id"]
+                key = natural_key(row)
+                if key in existing:
+                    row["id"] = existing[key][0]
+                elif row["id"] in kept_ids:
+                    row["id"], next_id = next_id, next_id + 1
+                stored_ids[catalog_id] = row["id"]
+            timings["diff"] = time.perf_counter() - phase
+
+            phase = time.perf_counter()
+            # Old pricing rules of changed or removed products go, then the products themselves
+            stale_ids = [row["id"] for row in changed] + removed
+            rules_deleted = 0
+            for batch in chunks(stale_ids):
+                rules_deleted += conn.execute(delete(PricingRule).where(PricingRule.product_id.in_(batch))).rowcount
+            for batch in chunks(removed):
+                conn.execute(delete(Product).where(Product.id.in_(batch)))
+
+            upsert(conn, Product, changed, conflict=NATURAL_KEY)
+
+            new_rules = [
+                rule
+                for product_data in products if product_data["id"] in stored_ids
+                for rule in pricing_rows(product_data, stored_ids[product_data["id"]])
+            ]
+            if new_rules:
+                conn.execute(PricingRule.__table__.insert(), new_rules)
+            conn.execute(delete(Company).where(Company.id.notin_([c["id"] for c in companies_data])))
+            timings["write"] = time.perf_counter() - phase
+
+            counts = dict(conn.execute(select(Product.category, func.count()).group_by(Product.category)).all())
     except Exception as e:
-        db.rollback()
         print(f"Error seeding database: {e}")
         import traceback
         traceback.print_exc()
         raise
-    finally:
-        db.close()
+
+    timings["total"] = time.perf_counter() - started
+    inserted = len(new_keys)
+
+    print("=" * 60)
+    print("Database seeded successfully with REAL Botswana insurance data!")
+    print("=" * 60)
+    print(f"✓ Companies: {len(companies_data)}")
+    print(f"✓ Products inserted: {inserted}, updated: {len(changed) - inserted}, "
+          f"unchanged: {len(rows) - len(changed)}, removed: {len(removed)}")
+    print(f"✓ Pricing rules written: {len(new_rules)}, removed: {rules_deleted}")
+    print(f"✓ Medical Plans: {counts.get('medical', 0)}")
+    print(f"✓ Life Insurance: {counts.get('life', 0)}")
+    print(f"✓ Funeral Plans: {counts.get('funeral', 0)}")
+    print(f"✓ Hospital Cash: {counts.get('hospital_cash', 0)}")
+    print(f"✓ TOTAL PRODUCTS: {sum(counts.values())}")
+    print("✓ Timings: " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items()))
+    print("=" * 60)
+
+    return {
+        "companies": len(companies_data),
+        "products_inserted": inserted,
+        "products_updated": len(changed) - inserted,
+        "products_unchanged": len(rows) - len(changed),
+        "products_removed": len(removed),
+        "pricing_rules_written": len(new_rules),
+        "pricing_rules_removed": rules_deleted,
+        "products_by_category": counts,
+        "timings": timings,
+    }
 
 if __name__ == "__main__":
-    seed_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the insurer files into the database")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="e.g. a catalog from generate_catalog.py")
+    seed_database(parser.parse_args().data_dir)
@@ -1,196 +1,353 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
-from datetime import datetime
-import json
-import re
-from pathlib import Path
+import asyncio
+import os
+import time
 
-app = FastAPI(title="BotsuInsure API", description="Botswana Insurance Comparison")
+from admission import AdmissionMiddleware
+from cache import LRUCache
+from catalog import ProductCatalog, comparison_row, dated_row, parse_as_of, parse_fields, priced_row, project
+from data_sources import load_catalog_data
+from database import DB_ASYNC, AsyncSessionLocal, SessionLocal
+from images import image_response
+from leads import LeadPipeline, LeadsUnavailable
+from metrics import MetricsMiddleware, render as render_metrics, span, watch_cache
+from listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, parse_sort
+from responses import EncodedPayload, TimedJSONResponse, link_next_page, respond, respond_once
+from schemas import LeadCreate, QuoteBatchRequest, QuoteRequest
+import queries
 
+app = FastAPI(
+    title="BotsuInsure API",
+    description="Botswana Insurance Comparison",
+    default_response_class=TimedJSONResponse,
+)
+
+# Innermost, so refused requests still get CORS headers and show up in the metrics
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "Retry-After"],
 )
+# Outermost, so the timings include CORS handling
+app.add_middleware(MetricsMiddleware)
+
+# "json" serves an in-memory catalog built from data/; "db" queries the
+# tables seed_data.py fills, so listings, product pages, comparisons and
+# premium calculations do not need the catalog in memory. Search and quotes
+# still do: in DB mode they run on a full copy built from the tables.
+#
+# CPU-bound work (encoding, listing, search, pricing, quoting) goes through
+# run_in_threadpool, so one slow request does not stall the event loop.
+DATA_BACKEND = os.getenv("DATA_BACKEND", "json").lower()
+USE_DB = DATA_BACKEND == "db"
 
 # Load data from JSON files
 def load_products():
-    data_dir = Path(__file__).parent.parent / "data"
-    products = []
-    
-    companies = [
-        {"id": 1, "name": "Liberty Life Botswana (Pty) Limited", "type": "life_funeral"},
-        {"id": 2, "name": "Metropolitan Life Botswana", "type": "life"},
-        {"id": 3, "name": "Botsogo Health Plan", "type": "medical"},
-        {"id": 4, "name": "Botswana Public Officers Medical Aid Scheme (BPOMAS)", "type": "medical"},
-        {"id": 5, "name": "Pula Medical Aid Fund (Pulamed)", "type": "medical"},
-    ]
-    
-    # Load Liberty files
-    with open(data_dir / "funeral_liberty_boago.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for p in data["products"]:
-            products.append({
-                "id": len(products) + 1,
-                "name": p["product_name"],
-                "category": p["category"],
-                "company": companies[0],
-                "sum_assured": p.get("sum_assured"),
-                "premiums": p.get("premiums", []),
-                "waiting_period_natural": p.get("waiting_period_natural"),
-                "waiting_period_accidental": p.get("waiting_period_accidental"),
-                "key_features": p.get("key_features", [])
-            })
-    
-    with open(data_dir / "hospital_cashback.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for p in data["products"]:
-            products.append({
-                "id": len(products) + 1,
-                "name": p["product_name"],
-                "category": p["category"],
-                "company": companies[0],
-                "sum_assured": p.get("sum_assured"),
-                "premiums": p.get("premiums", []),
-                "waiting_period_natural": p.get("waiting_period_natural"),
-                "waiting_period_accidental": p.get("waiting_period_accidental"),
-                "key_features": p.get("key_features", [])
-            })
-    
-    with open(data_dir / "life_metropolitan_mothusi.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for p in data["products"]:
-            products.append({
-                "id": len(products) + 1,
-                "name": p["product_name"],
-                "category": p["category"],
-                "company": companies[1],
-                "sum_assured": p.get("sum_assured"),
-                "premiums": p.get("premiums", []),
-                "waiting_period_natural": p.get("waiting_period_natural"),
-                "waiting_period_accidental": p.get("waiting_period_accidental"),
-                "key_features": p.get("key_features", [])
-            })
-    
-    # Load medical plans
-    medical_data = [
-        ("medical_botsogo_2025.json", companies[2]),
-        ("medical_bpomas_2025.json", companies[3]),
-        ("medical_pulamed_2025.json", companies[4]),
-    ]
-    
-    def extract_number(text):
-        if not text: return 0
-        nums = re.findall(r'[\d,]+\.?\d*', str(text))
-        return float(nums[0].replace(',', '')) if nums else 0
-    
-    for filename, company in medical_data:
-        with open(data_dir / filename, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            for plan in data["plans"]:
-                # Handle premiums
-                premiums = []
-                if isinstance(plan.get("premiums"), list):
-                    premiums = plan["premiums"]
-                
-                products.append({
-                    "id": len(products) + 1,
-                    "name": plan["plan_name"],
-                    "category": "medical",
-                    "company": company,
-                    "annual_limit": extract_number(plan.get("annual_limit")),
-                    "co_payment": plan.get("co_payment"),
-                    "hospital_network": plan.get("hospital_network"),
-                    "maternity_cover": plan.get("maternity_cover"),
-                    "chronic_cover": plan.get("chronic_cover"),
-                    "dental_optical": plan.get("dental_optical"),
-                    "waiting_period_natural": plan.get("waiting_period"),
-                    "premiums": premiums
-                })
-    
+    products, companies = load_catalog_data()
     print(f"✅ Loaded {len(products)} products")
-    return products
+    return products, companies
 
 # Load products on startup
-PRODUCTS = load_products()
+if USE_DB:
+    PRODUCTS, COMPANIES = [], []
+    print(f"✅ Serving products from {'async ' if DB_ASYNC else ''}database")
+else:
+    PRODUCTS, COMPANIES = load_products()
+CATALOG = ProductCatalog(PRODUCTS, COMPANIES)
+# Encoded /api/catalog payloads, one per field projection
+CATALOG_PAYLOADS = LRUCache(maxsize=64)
+watch_cache("catalog_payloads", CATALOG_PAYLOADS)
+LEADS = LeadPipeline()
+
+def warm_up():
+    """Called by prefork.py in the parent, so workers share these instead of each building them"""
+    CATALOG.warm()
+
+@app.on_event("startup")
+async def start_lead_pipeline():
+    await LEADS.start()
+
+@app.on_event("shutdown")
+async def stop_lead_pipeline():
+    await LEADS.stop()
+
+# Search and quotes need the whole catalog in memory. DB mode has no catalog
+# load to hook into, so one is built from the tables once the last one is
+# older than DB_CATALOG_TTL seconds. Every product is held in memory then,
+# so DB mode does not lift the memory bound for these two endpoints.
+DB_CATALOG_TTL = float(os.getenv("DB_CATALOG_TTL", os.getenv("SEARCH_INDEX_TTL", "60")))
+_db_catalog = (0.0, None)
+# The rebuild in progress, shared by every request that finds the catalog stale
+_db_catalog_task: Optional[asyncio.Task] = None
+
+def _search_term_cache():
+    catalog = _db_catalog[1] if USE_DB else CATALOG
+    return catalog.search_index.match_cache if catalog is not None else None
+
+watch_cache("search_terms", _search_term_cache)
+
+def _in_session(fn):
+    with SessionLocal() as db:
+        return fn(db)
+
+async def run_db(fn):
+    """Run `fn(session)` on the sync engine's threadpool or on the async engine.
+
+    The query helpers in queries.py are written once against a sync Session;
+    AsyncSession.run_sync hands them a session backed by the async driver.
+    """
+    with span("db"):
+        if DB_ASYNC:
+            async with AsyncSessionLocal() as db:
+                return await db.run_sync(fn)
+        return await run_in_threadpool(_in_session, fn)
+
+def calculated_premium(product, salary, as_of=None):
+    return CATALOG.salary_bands(product, as_of).lookup(salary) if salary else None
+
+def calculation_item(p, premium=None, as_of=None):
+    prices = CATALOG.price_version(p, as_of) or {}
+    return {
+        "id": p["id"],
+        "name": p["name"],
+        "company": p["company"],
+        "category": p["category"],
+        "annual_limit": p.get("annual_limit"),
+        "co_payment": p.get("co_payment"),
+        "waiting_period_natural": p.get("waiting_period_natural"),
+        "effective_from": prices.get("effective_from"),
+        "premiums": prices.get("premiums", []),
+        "calculated_premium": premium
+    }
+
+def parse_date(as_of):
+    try:
+        return parse_as_of(as_of)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/")
 def root():
     return {"message": "BotsuInsure API - Compare Botswana Insurance Plans"}
 
+@app.get("/api/catalog")
+async def get_catalog(request: Request, fields: Optional[str] = None):
+    """Every category in one response, replacing one /api/products call per category"""
+    projection = parse_fields(fields)
+    if USE_DB:
+        products = await run_db(lambda db: [queries.serialize_product(p) for p in queries.list_products(db)])
+        categories = {}
+        for product in products:
+            categories.setdefault(product["category"], []).append(project(product, projection))
+        return respond(EncodedPayload.from_content({"categories": categories}), request)
+
+    payload = await run_in_threadpool(
+        CATALOG_PAYLOADS.get_or_set,
+        projection, lambda: EncodedPayload.from_content({"categories": CATALOG.grouped(projection)}),
+    )
+    return respond(payload, request)
+
 @app.get("/api/products", response_model=List[dict])
-def get_products(category: Optional[str] = None, company: Optional[str] = None):
-    filtered = PRODUCTS
-    
-    if category:
-        filtered = [p for p in filtered if p["category"] == category]
-    if company:
-        filtered = [p for p in filtered if company.lower() in p["company"]["name"].lower()]
-    
-    return filtered
+async def get_products(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    company: Optional[str] = None,
+    salary: Optional[float] = None,
+    age: Optional[int] = None,
+    min_annual_limit: Optional[float] = None,
+    max_annual_limit: Optional[float] = None,
+    min_premium: Optional[float] = None,
+    max_premium: Optional[float] = None,
+    min_cover: Optional[float] = None,
+    max_cover: Optional[float] = None,
+    sort: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """One page of matching products; X-Next-Cursor (and Link) point at the next"""
+    try:
+        order = parse_sort(sort)
+        after = decode_cursor(cursor, order) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/api/products/{product_id}", response_model=dict)
-def get_product(product_id: int):
-    product = next((p for p in PRODUCTS if p["id"] == product_id), None)
+    if USE_DB:
+        # Premium and cover only exist parsed in the in-memory catalog
+        if order != parse_sort(None) or any(v is not None for v in (min_premium, max_premium, min_cover, max_cover)):
+            raise HTTPException(status_code=400, detail="Only id order and annual_limit/age filters are available with DATA_BACKEND=db")
+        products = await run_db(lambda db: [queries.serialize_product(p) for p in queries.list_products_page(
+            db, category=category, company=company, age=age,
+            min_annual_limit=min_annual_limit, max_annual_limit=max_annual_limit,
+            after_id=after[0][1] if after else None, limit=limit + 1,
+        )])
+        next_cursor = encode_cursor(order, [products[limit - 1]["id"]]) if len(products) > limit else None
+        link_next_page(response, request, next_cursor)
+        return products[:limit]
+
+    def page():
+        return CATALOG.listing().page(
+            category=category, company=company, salary=salary, age=age,
+            ranges={
+                "annual_limit": (min_annual_limit, max_annual_limit),
+                "premium": (min_premium, max_premium),
+                "cover": (min_cover, max_cover),
+            },
+            sort=order, limit=limit, cursor=cursor,
+        )
+    try:
+        products, next_cursor = await run_in_threadpool(page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    link_next_page(response, request, next_cursor)
+    return products
+
+async def rebuild_db_catalog():
+    global _db_catalog
+    def load(db):
+        return [queries.serialize_product(p) for p in queries.list_products(db)], queries.list_companies(db)
+    try:
+        products, companies = await run_db(load)
+        with span("build_catalog"):
+            catalog = await run_in_threadpool(ProductCatalog, products, companies)
+    except Exception as e:
+        old = _db_catalog[1]
+        if old is None:
+            raise
+        # Keep serving the old catalog; the next request past the TTL tries again
+        print(f"⚠️ Catalog rebuild from the database failed: {e}")
+        return old
+    _db_catalog = (time.monotonic(), catalog)
+    return catalog
+
+async def current_catalog():
+    """The in-memory catalog; in DB mode the last one built, with at most one rebuild running.
+
+    While a stale catalog is being rebuilt, requests keep getting the old one.
+    """
+    global _db_catalog_task
+    if not USE_DB:
+        return CATALOG
+    built_at, catalog = _db_catalog
+    if catalog is None or time.monotonic() - built_at > DB_CATALOG_TTL:
+        if _db_catalog_task is None or _db_catalog_task.done():
+            _db_catalog_task = asyncio.ensure_future(rebuild_db_catalog())
+        if catalog is None:
+            # A cancelled request must not cancel the load the others wait for
+            return await asyncio.shield(_db_catalog_task)
+    return catalog
+
+@app.get("/api/search")
+async def search_products(
+    q: str,
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = None,
+):
+    """Products ranked by how well their text matches `q`; words match as prefixes"""
+    projection = parse_fields(fields)
+    catalog = await current_catalog()
+    def search():
+        total, hits = catalog.search(q, limit=limit, category=category)
+        return {"total": total, "results": [{**project(product, projection), "score": round(score, 4)} for product, score in hits]}
+    return await run_in_threadpool(search)
+
+@app.get("/api/products/calculate")
+async def calculate_premiums(salary: float, category: str = "medical", as_of: Optional[str] = None):
+    """Premium of every product of a category at `salary`, with the prices in force on `as_of` if given"""
+    day = parse_date(as_of)
+    if USE_DB:
+        def calculate(db):
+            products = [queries.serialize_product(p) for p in queries.list_products(db, category)]
+            premiums = queries.premiums_for_salary(db, [p["id"] for p in products], salary, day) if salary else {}
+            return [calculation_item(p, premiums.get(p["id"]), day) for p in products]
+        return await run_db(calculate)
+
+    def calculate():
+        with span("premiums"):
+            return [calculation_item(p, calculated_premium(p, salary, day), day) for p in CATALOG.by_category(category)]
+    return await run_in_threadpool(calculate)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/images/derived/{path:path}")
+def derived_image(path: str):
+    """Resized product images (images.py build); names change with content, so they are cached forever"""
+    return image_response(path)
+
+async def find_product(product_id):
+    if USE_DB:
+        product = await run_db(lambda db: queries.get_product(db, product_id))
+        product = queries.serialize_product(product) if product else None
+    else:
+        product = CATALOG.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
+@app.get("/api/products/{product_id}", response_model=dict)
+async def get_product(product_id: int):
+    return await find_product(product_id)
+
 @app.get("/api/compare")
-def compare_products(product_ids: str, salary: Optional[float] = None):
+async def compare_products(product_ids: str, salary: Optional[float] = None, as_of: Optional[str] = None):
     ids = [int(id) for id in product_ids.split(",") if id.strip().isdigit()]
-    products = [p for p in PRODUCTS if p["id"] in ids]
-    
-    comparison = []
-    for p in products:
-        item = {
-            "id": p["id"],
-            "name": p["name"],
-            "company": p["company"]["name"],
-            "category": p["category"],
-            "key_features": p.get("key_features", []),
-            "waiting_period_natural": p.get("waiting_period_natural")
-        }
-        
-        if p["category"] == "medical":
-            item.update({
-                "annual_limit": p.get("annual_limit"),
-                "co_payment": p.get("co_payment"),
-                "hospital_network": p.get("hospital_network")
-            })
-        else:
-            item.update({
-                "sum_assured": p.get("sum_assured"),
-                "premiums": p.get("premiums", [])
-            })
-        
-        comparison.append(item)
-    
-    return {"comparison": comparison}
+    day = parse_date(as_of)
+
+    if USE_DB:
+        def compare(db):
+            products = [queries.serialize_product(p) for p in queries.get_products(db, ids)]
+            medical_ids = [p["id"] for p in products if p["category"] == "medical"]
+            premiums = queries.premiums_for_salary(db, medical_ids, salary, day) if salary and medical_ids else {}
+            rows = [comparison_row(p) if day is None else dated_row(comparison_row(p), CATALOG.price_version(p, day)) for p in products]
+            return [priced_row(row, premiums.get(row["id"])) for row in rows]
+        return {"comparison": await run_db(compare)}
+
+    return {"comparison": await run_in_threadpool(CATALOG.compare, ids, salary, day)}
+
+@app.post("/api/quote")
+async def quote_profile(profile: QuoteRequest):
+    """Eligibility and monthly premium of every product for one household, cheapest first"""
+    catalog = await current_catalog()
+    return await run_in_threadpool(lambda: catalog.quotes().quote(**profile.model_dump()))
+
+@app.post("/api/quote/batch")
+async def quote_profiles(request: Request, batch: QuoteBatchRequest):
+    """/api/quote for many households at once; results are in the order of `profiles`"""
+    engine = (await current_catalog()).quotes()
+    results = await run_in_threadpool(engine.quote_many, [profile.model_dump() for profile in batch.profiles], batch.limit)
+    return respond_once({"results": results}, request)
 
 @app.post("/api/leads")
-def create_lead(lead: dict):
+async def create_lead(lead: LeadCreate):
+    product = await find_product(lead.product_id)
+    try:
+        record = await LEADS.submit(lead, product)
+    except LeadsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     return {
         "success": True,
         "message": "Lead submitted successfully.",
-        "lead_id": f"LEAD-{datetime.now().timestamp()}",
-        "data": lead
+        "lead_id": record["id"],
+        "data": lead.model_dump()
     }
 
 @app.get("/api/companies")
-def get_companies():
-    companies = [
-        {"id": 1, "name": "Liberty Life Botswana (Pty) Limited", "type": "life_funeral"},
-        {"id": 2, "name": "Metropolitan Life Botswana", "type": "life"},
-        {"id": 3, "name": "Botsogo Health Plan", "type": "medical"},
-        {"id": 4, "name": "Botswana Public Officers Medical Aid Scheme (BPOMAS)", "type": "medical"},
-        {"id": 5, "name": "Pula Medical Aid Fund (Pulamed)", "type": "medical"},
-    ]
-    return companies
+async def get_companies():
+    if USE_DB:
+        return await run_db(queries.list_companies)
+    return COMPANIES
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
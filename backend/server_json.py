@@ -1,164 +1,91 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import json
+import hmac
 import os
-import re
-from pathlib import Path
 from typing import List, Optional
 
-app = FastAPI(title="BotsuInsure API", description="Botswana Insurance Comparison")
+from admission import AdmissionMiddleware
+from cache import LRUCache
+from catalog import parse_as_of, parse_fields, project
+from catalog_store import CatalogStore
+from images import image_response
+from leads import LeadPipeline, LeadsUnavailable
+from metrics import MetricsMiddleware, render as render_metrics, span, watch_cache
+from listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_sort
+from responses import EncodedPayload, TimedJSONResponse, link_next_page, respond, respond_once
+from schemas import LeadCreate, QuoteBatchRequest, QuoteRequest
+from search import tokenize
 
+app = FastAPI(
+    title="BotsuInsure API",
+    description="Botswana Insurance Comparison",
+    default_response_class=TimedJSONResponse,
+)
+
+# Innermost, so refused requests still get CORS headers and show up in the metrics
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "Retry-After"],
 )
+# Outermost, so the timings include CORS handling
+app.add_middleware(MetricsMiddleware)
 
-# Get the correct path to data folder
-current_dir = Path(__file__).parent
-data_dir = current_dir.parent / "data"
-
-def extract_number(text):
-    """Extract numbers from strings like 'BWP 2,215,000'"""
-    if not text:
-        return 0
-    numbers = re.findall(r'[\d,]+\.?\d*', str(text))
-    if numbers:
-        return float(numbers[0].replace(',', ''))
-    return 0
-
-# Load all JSON data
-def load_all_data():
-    all_products = []
-    product_counter = 1
-    
-    companies = [
-        {"id": 1, "name": "Liberty Life Botswana (Pty) Limited", "type": "life_funeral"},
-        {"id": 2, "name": "Metropolitan Life Botswana", "type": "life"},
-        {"id": 3, "name": "Botsogo Health Plan", "type": "medical"},
-        {"id": 4, "name": "Botswana Public Officers Medical Aid Scheme (BPOMAS)", "type": "medical"},
-        {"id": 5, "name": "Pula Medical Aid Fund (Pulamed)", "type": "medical"},
-    ]
-    
-    # 1. Liberty Funeral
-    with open(data_dir / "funeral_liberty_boago.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for product in data["products"]:
-            product_name = product.get("name") or product.get("product_name") or "Unknown Product"
-            all_products.append({
-                "id": product_counter,
-                "name": product_name,
-                "category": product.get("category", "funeral"),
-                "company_id": 1,
-                "company": companies[0],
-                "sum_assured": product.get("sum_assured"),
-                "premiums": product.get("premiums", []),
-                "waiting_period_natural": product.get("waiting_period_natural"),
-                "waiting_period_accidental": product.get("waiting_period_accidental"),
-                "age_min": product.get("age_min"),
-                "age_max": product.get("age_max"),
-                "key_features": product.get("key_features", []),
-                "exclusions": product.get("exclusions")
-            })
-            product_counter += 1
-    
-    # 2. Liberty Hospital Cash
-    with open(data_dir / "hospital_cashback.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for product in data["products"]:
-            product_name = product.get("name") or product.get("product_name") or "Unknown Product"
-            all_products.append({
-                "id": product_counter,
-                "name": product_name,
-                "category": product.get("category", "hospital_cash"),
-                "company_id": 1,
-                "company": companies[0],
-                "sum_assured": product.get("sum_assured"),
-                "premiums": product.get("premiums", []),
-                "waiting_period_natural": product.get("waiting_period_natural"),
-                "waiting_period_accidental": product.get("waiting_period_accidental"),
-                "age_min": product.get("age_min"),
-                "age_max": product.get("age_max"),
-                "key_features": product.get("key_features", []),
-                "exclusions": product.get("exclusions")
-            })
-            product_counter += 1
-    
-    # 3. Metropolitan Life
-    with open(data_dir / "life_metropolitan_mothusi.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for product in data["products"]:
-            product_name = product.get("name") or product.get("product_name") or "Unknown Product"
-            all_products.append({
-                "id": product_counter,
-                "name": product_name,
-                "category": product.get("category", "life"),
-                "company_id": 2,
-                "company": companies[1],
-                "sum_assured": product.get("sum_assured"),
-                "premiums": product.get("premiums", []),
-                "waiting_period_natural": product.get("waiting_period_natural"),
-                "waiting_period_accidental": product.get("waiting_period_accidental"),
-                "age_min": product.get("age_min"),
-                "age_max": product.get("age_max"),
-                "key_features": product.get("key_features", []),
-                "exclusions": product.get("exclusions")
-            })
-            product_counter += 1
-    
-    # 4. Medical plans
-    medical_files = [
-        ("medical_botsogo_2025.json", 3),
-        ("medical_bpomas_2025.json", 4),
-        ("medical_pulamed_2025.json", 5),
-    ]
-    
-    for filename, company_id in medical_files:
-        with open(data_dir / filename, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if "plans" in data:
-                for plan in data["plans"]:
-                    # Handle premiums
-                    premiums = []
-                    if isinstance(plan.get("premiums"), list):
-                        premiums = plan["premiums"]
-                    elif plan.get("premiums") and isinstance(plan["premiums"], str):
-                        matches = re.findall(r'(\d+(?:,\d+)*(?:\.\d+)?)', plan["premiums"])
-                        if matches:
-                            try:
-                                premium_value = float(matches[0].replace(',', ''))
-                                premiums = [{"monthly_premium": premium_value}]
-                            except:
-                                pass
-                    
-                    all_products.append({
-                        "id": product_counter,
-                        "name": plan.get("plan_name", "Unknown Plan"),
-                        "category": "medical",
-                        "company_id": company_id,
-                        "company": companies[company_id - 1],
-                        "annual_limit": extract_number(plan.get("annual_limit", "0")),
-                        "co_payment": plan.get("co_payment"),
-                        "hospital_network": plan.get("hospital_network"),
-                        "maternity_cover": plan.get("maternity_cover"),
-                        "chronic_cover": plan.get("chronic_cover"),
-                        "dental_optical": plan.get("dental_optical"),
-                        "waiting_period_natural": plan.get("waiting_period"),
-                        "premiums": premiums,
-                        "key_features": []
-                    })
-                    product_counter += 1
-    
-    print(f"✅ Loaded {len(all_products)} products from JSON files")
-    for product in all_products:
-        print(f"  - {product['name']} ({product['company']['name']})")
-    
-    return all_products, companies
+# Load the compiled snapshot (python snapshot.py build) or fall back to parsing data/.
+# The watcher started below swaps in a new catalog when data/ changes.
+STORE = CatalogStore()
+if STORE.load_snapshot():
+    print(f"✅ Loaded {len(STORE.catalog)} products from catalog snapshot")
+else:
+    STORE.refresh()
+    print(f"✅ Loaded {len(STORE.catalog)} products from JSON files")
+
+# Pre-serialized /api/products/calculate responses keyed by (data version, category, price era, band segment)
+CALCULATE_CACHE = LRUCache(maxsize=int(os.getenv("CALCULATE_CACHE_SIZE", "256")))
+# Pre-serialized catalog responses keyed by (data version, route, arguments)
+PAYLOAD_CACHE = LRUCache(maxsize=int(os.getenv("PAYLOAD_CACHE_SIZE", "1024")))
+
+def cached_payload(catalog, key, build):
+    return PAYLOAD_CACHE.get_or_set((catalog.version,) + key, lambda: EncodedPayload.from_content(build()))
+
+def drop_stale_responses(catalog):
+    # Entries are keyed by version, so this only frees memory sooner
+    CALCULATE_CACHE.clear()
+    PAYLOAD_CACHE.clear()
+
+STORE.subscribe(drop_stale_responses)
+
+def warm_up():
+    """Called by prefork.py in the parent, so workers share these instead of each building them"""
+    STORE.catalog.warm()
+
+watch_cache("calculate", CALCULATE_CACHE)
+watch_cache("payloads", PAYLOAD_CACHE)
+watch_cache("search_terms", lambda: STORE.catalog.search_index.match_cache)
+
+@app.on_event("startup")
+def watch_data_dir():
+    interval = float(os.getenv("DATA_WATCH_INTERVAL", "2"))
+    if interval > 0:
+        STORE.start_watching(interval)
+
+@app.on_event("shutdown")
+def stop_watching_data_dir():
+    STORE.stop_watching()
 
-# Load data
-ALL_PRODUCTS, ALL_COMPANIES = load_all_data()
+LEADS = LeadPipeline()
+
+@app.on_event("startup")
+async def start_lead_pipeline():
+    await LEADS.start()
+
+@app.on_event("shutdown")
+async def stop_lead_pipeline():
+    await LEADS.stop()
 
 # Rest of the API endpoints stay the same as before...
 @app.get("/")
@@ -166,94 +93,120 @@ def root():
     return {"message": "BotsuInsure API - Compare Botswana Insurance Plans"}
 
 @app.get("/api/products")
-def get_products(category: Optional[str] = None, company: Optional[str] = None):
-    filtered = ALL_PRODUCTS
-    
-    if category:
-        filtered = [p for p in filtered if p.get("category") == category]
-    
-    if company:
-        filtered = [p for p in filtered if company.lower() in p["company"]["name"].lower()]
-    
-    return filtered
+def get_products(
+    request: Request,
+    category: Optional[str] = None,
+    company: Optional[str] = None,
+    salary: Optional[float] = None,
+    age: Optional[int] = None,
+    min_annual_limit: Optional[float] = None,
+    max_annual_limit: Optional[float] = None,
+    min_premium: Optional[float] = None,
+    max_premium: Optional[float] = None,
+    min_cover: Optional[float] = None,
+    max_cover: Optional[float] = None,
+    sort: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """One page of matching products; X-Next-Cursor (and Link) point at the next.
 
-@app.get("/api/products/{product_id}")
-def get_product(product_id: int):
-    product = next((p for p in ALL_PRODUCTS if p.get("id") == product_id), None)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    Premium filters and sorting use the premium at `salary` when one is given,
+    otherwise the cheapest premium. `age` keeps products the age is eligible
+    for. `sort` is a list of fields such as "premium,-annual_limit".
+    """
+    catalog = STORE.catalog
+    listing = catalog.listing()
+    try:
+        order = parse_sort(sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ranges = {
+        "annual_limit": (min_annual_limit, max_annual_limit),
+        "premium": (min_premium, max_premium),
+        "cover": (min_cover, max_cover),
+    }
 
-@app.get("/api/compare")
-def compare_products(product_ids: str, salary: Optional[float] = None):
-    ids = [int(id.strip()) for id in product_ids.split(",") if id.strip().isdigit()]
-    
-    products = [p for p in ALL_PRODUCTS if p.get("id") in ids]
-    
-    comparison_data = []
-    for product in products:
-        item = {
-            "id": product.get("id"),
-            "name": product.get("name"),
-            "company": product.get("company", {}).get("name", ""),
-            "category": product.get("category", ""),
-            "key_features": product.get("key_features", []),
-            "waiting_period_natural": product.get("waiting_period_natural"),
-            "waiting_period_accidental": product.get("waiting_period_accidental")
-        }
-        
-        if product.get("category") == "medical":
-            item.update({
-                "annual_limit": product.get("annual_limit"),
-                "co_payment": product.get("co_payment"),
-                "hospital_network": product.get("hospital_network"),
-                "calculated_premium": calculate_medical_premium(product, salary) if salary else None
-            })
-        else:
-            item.update({
-                "sum_assured": product.get("sum_assured"),
-                "premiums": product.get("premiums", [])
-            })
-        
-        comparison_data.append(item)
-    
-    return {"comparison": comparison_data}
+    def build():
+        products, next_cursor = listing.page(
+            category=category, company=company, salary=salary, age=age,
+            ranges=ranges, sort=order, limit=limit, cursor=cursor,
+        )
+        return EncodedPayload.from_content(products), next_cursor
 
-def calculate_medical_premium(product, salary):
-    premiums = product.get("premiums", [])
-    if not premiums:
-        return None
-    
-    for premium in premiums:
-        if isinstance(premium, dict):
-            min_salary = premium.get("min_salary", 0)
-            max_salary = premium.get("max_salary", float('inf'))
-            if min_salary <= salary <= max_salary:
-                return premium.get("monthly_premium")
-    
-    return None
+    # Salaries in the same band segment price every product the same
+    key = (
+        catalog.version, "products", category, company.lower() if company else None, listing.segment(salary),
+        age, tuple(ranges.values()), order, limit, cursor,
+    )
+    try:
+        payload, next_cursor = PAYLOAD_CACHE.get_or_set(key, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return link_next_page(respond(payload, request), request, next_cursor)
 
-@app.post("/api/leads")
-def create_lead(lead: dict):
-    return {
-        "success": True,
-        "message": "Lead submitted successfully.",
-        "lead_id": f"LEAD-{len(ALL_PRODUCTS) + 1}",
-        "data": lead
-    }
+@app.get("/api/catalog")
+def get_catalog(request: Request, fields: Optional[str] = None):
+    """Every category in one response, replacing one /api/products call per category"""
+    catalog = STORE.catalog
+    projection = parse_fields(fields)
+    payload = cached_payload(catalog, ("catalog", projection), lambda: {"categories": catalog.grouped(projection)})
+    return respond(payload, request)
 
-@app.get("/api/companies")
-def get_companies():
-    return ALL_COMPANIES
+@app.get("/api/search")
+def search_products(
+    request: Request,
+    q: str,
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = None,
+):
+    """Products ranked by how well their text matches `q`; words match as prefixes"""
+    catalog = STORE.catalog
+    projection = parse_fields(fields)
+
+    def build():
+        total, hits = catalog.search(q, limit=limit, category=category)
+        results = [{**project(product, projection), "score": round(score, 4)} for product, score in hits]
+        return {"total": total, "results": results}
+
+    # Queries differing only in case, punctuation or stopwords share an entry
+    key = ("search", tuple(tokenize(q)), category, limit, projection)
+    return respond(cached_payload(catalog, key, build), request)
 
 @app.get("/api/products/calculate")
-def calculate_premiums(salary: float, category: str = "medical"):
-    products = [p for p in ALL_PRODUCTS if p.get("category") == category]
+def calculate_premiums(request: Request, salary: float, category: str = "medical", as_of: Optional[str] = None):
+    """Premium of every product of a category at `salary`, with the prices in force on `as_of` if given"""
+    # Every salary inside the same band segment of a category gets the same
+    # answer, so the serialized response is cached per (category, era, segment).
+    catalog = STORE.catalog
+    day = parse_date(as_of)
+    matrix = catalog.band_matrix(category, day)
+    segment = matrix.segment(salary) if salary else None
+    era = catalog.era(day)
+    payload = CALCULATE_CACHE.get_or_set(
+        (catalog.version, category, era, segment),
+        lambda: EncodedPayload.from_content(build_calculate_response(catalog, category, matrix, segment, day)),
+    )
+    return respond(payload, request)
+
+def parse_date(as_of):
+    try:
+        return parse_as_of(as_of)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def build_calculate_response(catalog, category, matrix, segment, as_of=None):
+    products = catalog.by_category(category)
+    with span("premiums"):
+        if segment is not None:
+            calculated_premiums = matrix.segment_row(segment)
+        else:
+            calculated_premiums = [None] * len(products)
     
     result = []
-    for product in products:
-        calculated_premium = calculate_medical_premium(product, salary) if salary else None
-        
+    for product, calculated_premium in zip(products, calculated_premiums):
+        prices = catalog.price_version(product, as_of) or {}
         result.append({
             "id": product["id"],
             "name": product["name"],
@@ -262,12 +215,100 @@ def calculate_premiums(salary: float, category: str = "medical"):
             "annual_limit": product.get("annual_limit"),
             "co_payment": product.get("co_payment"),
             "waiting_period_natural": product.get("waiting_period_natural"),
-            "premiums": product.get("premiums", []),
+            "effective_from": prices.get("effective_from"),
+            "premiums": prices.get("premiums", []),
             "calculated_premium": calculated_premium
         })
     
     return result
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/images/derived/{path:path}")
+def derived_image(path: str):
+    """Resized product images (images.py build); names change with content, so they are cached forever"""
+    return image_response(path)
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return {"calculate": CALCULATE_CACHE.stats(), "payloads": PAYLOAD_CACHE.stats()}
+
+@app.get("/api/products/{product_id}")
+def get_product(request: Request, product_id: int):
+    catalog = STORE.catalog
+    product = catalog.get(product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return respond(cached_payload(catalog, ("product", product_id), lambda: product), request)
+
+@app.get("/api/compare")
+def compare_products(request: Request, product_ids: str, salary: Optional[float] = None, as_of: Optional[str] = None):
+    ids = [int(id.strip()) for id in product_ids.split(",") if id.strip().isdigit()]
+
+    # Order and duplicates of the ids do not change the answer, and salaries in
+    # the same band segment price every product the same, as do dates in the same era
+    catalog = STORE.catalog
+    day = parse_date(as_of)
+    known = tuple(sorted({id for id in ids if catalog.get(id) is not None}))
+    segment = catalog.premium_matrix(day).segment(salary) if salary else None
+    payload = cached_payload(
+        catalog, ("compare", known, catalog.era(day), segment), lambda: {"comparison": catalog.compare(known, salary, day)}
+    )
+    return respond(payload, request)
+
+@app.post("/api/quote")
+def quote_profile(request: Request, profile: QuoteRequest):
+    """Eligibility and monthly premium of every product for one household, cheapest first"""
+    catalog = STORE.catalog
+    engine = catalog.quotes()
+    query = profile.model_dump(exclude={"limit"})
+    # Salaries in the same band segment get the same quotes
+    key = ("quote", engine.key(**query), profile.limit)
+    return respond(cached_payload(catalog, key, lambda: engine.quote(**query, limit=profile.limit)), request)
+
+@app.post("/api/quote/batch")
+def quote_profiles(request: Request, batch: QuoteBatchRequest):
+    """/api/quote for many households at once; results are in the order of `profiles`"""
+    results = STORE.catalog.quotes().quote_many((profile.model_dump() for profile in batch.profiles), limit=batch.limit)
+    return respond_once({"results": results}, request)
+
+@app.post("/api/leads")
+async def create_lead(lead: LeadCreate):
+    product = STORE.catalog.get(lead.product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    try:
+        record = await LEADS.submit(lead, product)
+    except LeadsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return {
+        "success": True,
+        "message": "Lead submitted successfully.",
+        "lead_id": record["id"],
+        "data": lead.model_dump()
+    }
+
+@app.get("/api/companies")
+def get_companies(request: Request):
+    catalog = STORE.catalog
+    return respond(cached_payload(catalog, ("companies",), lambda: catalog.companies), request)
+
+@app.post("/api/admin/reload")
+def reload_catalog(x_admin_token: Optional[str] = Header(None), force: bool = False):
+    """Re-read changed data files now instead of waiting for the watcher"""
+    # Without ADMIN_TOKEN the endpoint does not exist: a forced reload is a full rebuild
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    changed = STORE.refresh(force=force)
+    return {"version": STORE.version, "products": len(STORE.catalog), "changed_files": changed}
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # No reload=True: data changes are picked up by the catalog watcher
+    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""Compiled binary snapshot of the catalog for fast worker start-up.
+
+`python snapshot.py build` parses data/, builds the ProductCatalog (indexes,
+compiled salary bands and band matrices included) and pickles it together
+with a content fingerprint of every source file. Workers unpickle it instead
+of re-parsing JSON, and fall back to the JSON path when the snapshot is
+missing, was built by an older format, or no longer matches data/.
+
+The snapshot is a pickle, so only load files this deployment built itself.
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from catalog import ProductCatalog
+from data_sources import DATA_DIR, IDS_FILE, build_catalog_data, discover, read_sources
+from images import manifest_version
+
+# Bump whenever ProductCatalog or the normalized product shape changes
+SNAPSHOT_FORMAT = 10
+SNAPSHOT_PATH = Path(os.getenv("CATALOG_SNAPSHOT", Path(__file__).parent / "catalog.snapshot"))
+
+
+def _stamp(path: Path) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _digest(path: Path) -> str:
+    return hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+
+def source_paths(data_dir: Path) -> List[Path]:
+    """The data files plus the issued-ids file, which the snapshot's ids come from"""
+    paths = discover(data_dir)
+    ids = Path(data_dir) / IDS_FILE
+    return paths + [ids] if ids.exists() else paths
+
+
+def fingerprint(paths: List[Path]) -> Dict[str, Tuple[Tuple[int, int], str]]:
+    """name -> ((mtime_ns, size), content hash) for every source file"""
+    return {path.name: (_stamp(path), _digest(path)) for path in paths}
+
+
+def matches(sources: Dict[str, Tuple[Tuple[int, int], str]], paths: List[Path]) -> bool:
+    """Whether `paths` still hold the content the snapshot was built from.
+
+    An unchanged mtime and size is trusted; otherwise the content hash
+    decides, because checkouts and deploys touch mtimes without edits.
+    """
+    if set(sources) != {path.name for path in paths}:
+        return False
+    for path in paths:
+        stamp, digest = sources[path.name]
+        if _stamp(path) != stamp and _digest(path) != digest:
+            return False
+    return True
+
+
+def build_snapshot(data_dir: Path = DATA_DIR, output: Path = SNAPSHOT_PATH) -> ProductCatalog:
+    paths = discover(data_dir)
+    documents = read_sources(paths)
+    catalog = ProductCatalog(*build_catalog_data(zip(paths, documents), data_dir), version=1)
+
+    # A small header goes first so a stale snapshot is rejected without
+    # unpickling the catalog. Write next to the target and rename, so workers
+    # never see half a file.
+    header = {"format": SNAPSHOT_FORMAT, "sources": fingerprint(source_paths(data_dir)), "images": manifest_version()}
+    output = Path(output)
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, output)
+    return catalog
+
+
+def load_snapshot(data_dir: Path = DATA_DIR, path: Path = SNAPSHOT_PATH) -> Optional[ProductCatalog]:
+    """The snapshot's catalog, or None when the snapshot can't be used"""
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if header.get("format") != SNAPSHOT_FORMAT:
+                return None
+            if not matches(header.get("sources", {}), source_paths(data_dir)):
+                return None
+            # Products carry image URLs, so a rebuilt image manifest makes it stale too
+            if header.get("images") != manifest_version():
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # truncated file, or classes that no longer match
+        print(f"⚠️ Ignoring unreadable catalog snapshot {path}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check the compiled catalog snapshot")
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output", type=Path, default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        catalog = build_snapshot(args.data_dir, args.output)
+        elapsed = time.perf_counter() - started
+        print(f"✅ Wrote {args.output} ({len(catalog)} products, {args.output.stat().st_size:,} bytes) in {elapsed:.3f}s")
+    else:
+        fresh = load_snapshot(args.data_dir, args.output) is not None
+        print(f"{args.output}: {'up to date' if fresh else 'missing or stale'}")
+        raise SystemExit(0 if fresh else 1)
+
+
+if __name__ == "__main__":
+    main()
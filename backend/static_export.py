@@ -0,0 +1,189 @@
+"""Static export of the read-only catalog endpoints, for a CDN or any static file server.
+
+Between data updates the catalog never changes, so its GET responses can be
+files. `python static_export.py build` renders them with the same encoder,
+ETags and compression rules as the servers (responses.py) into a tree that
+mirrors the URLs, query strings included:
+
+    api/catalog.json                       GET /api/catalog
+    api/catalog/fields=<...>.json          GET /api/catalog?fields=<...> (the frontend's fields)
+    api/companies.json                     GET /api/companies
+    api/products.json                      GET /api/products, then ?cursor=... pages
+    api/products/category=<c>.json         GET /api/products?category=<c>, then &cursor=... pages
+    api/products/<id>.json                 GET /api/products/<id>
+
+Each file has .gz and (with brotli installed) .br siblings when they are
+smaller, for gzip_static/brotli_static style serving. manifest.json maps
+every URL to its file, ETag, encodings and extra headers (X-Next-Cursor and
+Link on paginated lists), so a CDN configuration can be generated from it.
+
+Rebuilds are incremental: nothing happens while data/ (and the image
+manifest, since products carry image URLs) is unchanged, and otherwise only
+responses whose bytes changed are compressed and written again. Files of
+URLs that no longer exist are removed. Every file is written next to its
+target and renamed, the manifest last, so none is ever seen half-written.
+
+Run from the backend folder:
+    python static_export.py build                     # into ../static_api
+    python static_export.py build --output /srv/www --force
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlencode
+
+from catalog import ProductCatalog, parse_fields
+from data_sources import DATA_DIR, load_catalog_data
+from images import manifest_version
+from listing import DEFAULT_PAGE_SIZE
+from responses import EncodedPayload, encode_json, strong_etag
+from snapshot import fingerprint, matches, source_paths
+
+EXPORT_DIR = Path(os.getenv("STATIC_EXPORT_DIR") or Path(__file__).parent.parent / "static_api")
+# Bump when the layout or the rendering changes, so the next build redoes everything
+EXPORT_FORMAT = 1
+# /api/catalog projections worth exporting: the fields frontend/app.js asks for
+CATALOG_FIELDS = [
+    "id,name,category,company,premiums,calculated_premium,annual_limit,sum_assured,waiting_period_natural,co_payment,image",
+]
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+
+def url_of(path: str, **params) -> str:
+    query = urlencode([(name, value) for name, value in params.items() if value is not None], safe=",")
+    return f"{path}?{query}" if query else path
+
+
+def file_of(url: str) -> str:
+    """/api/products?category=life -> api/products/category=life.json"""
+    path, _, query = url.partition("?")
+    return path.strip("/") + ("/" + query.replace("&", "/") if query else "") + ".json"
+
+
+def product_pages(catalog: ProductCatalog, category: Optional[str] = None) -> Iterator[Tuple[str, object, dict]]:
+    """Every page of /api/products (optionally of one category), as GET with no other arguments sees them"""
+    listing = catalog.listing()
+    cursor = None
+    while True:
+        products, next_cursor = listing.page(category=category, limit=DEFAULT_PAGE_SIZE, cursor=cursor)
+        headers = {}
+        if next_cursor:
+            headers = {
+                "X-Next-Cursor": next_cursor,
+                "Link": f'<{url_of("/api/products", category=category, cursor=next_cursor)}>; rel="next"',
+            }
+        yield url_of("/api/products", category=category, cursor=cursor), products, headers
+        if not next_cursor:
+            return
+        cursor = next_cursor
+
+
+def routes(catalog: ProductCatalog) -> Iterator[Tuple[str, object, dict]]:
+    """(url, response content, extra headers) of every exported GET"""
+    yield "/api/catalog", {"categories": catalog.grouped()}, {}
+    for fields in CATALOG_FIELDS:
+        yield url_of("/api/catalog", fields=fields), {"categories": catalog.grouped(parse_fields(fields))}, {}
+    yield "/api/companies", catalog.companies, {}
+    yield from product_pages(catalog)
+    for category in sorted({product["category"] for product in catalog.products if product.get("category")}):
+        yield from product_pages(catalog, category)
+    for product in catalog.products:
+        yield f"/api/products/{product['id']}", product, {}
+
+
+def _write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _files(entry: dict) -> Iterator[str]:
+    yield entry["file"]
+    for variant in entry["encodings"].values():
+        yield variant["file"]
+
+
+def read_manifest(output: Path) -> dict:
+    try:
+        manifest = json.loads((output / "manifest.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    # JSON turned the (mtime_ns, size) stamps into lists
+    manifest["sources"] = {name: (tuple(stamp), digest) for name, (stamp, digest) in manifest.get("sources", {}).items()}
+    return manifest
+
+
+def export(data_dir: Path = DATA_DIR, output: Path = EXPORT_DIR, force: bool = False) -> Dict[str, int]:
+    """Bring `output` up to date with `data_dir`; counts of routes, rewritten and removed files"""
+    output = Path(output)
+    paths = source_paths(data_dir)
+    previous = read_manifest(output)
+    if previous.get("format") != EXPORT_FORMAT or force:
+        previous = {}
+    if (
+        previous and previous.get("images") == manifest_version()
+        and matches(previous["sources"], paths)
+        and all((output / entry["file"]).exists() for entry in previous["routes"].values())
+    ):
+        return {"routes": len(previous["routes"]), "written": 0, "removed": 0}
+
+    catalog = ProductCatalog(*load_catalog_data(data_dir))
+    old_routes = previous.get("routes", {})
+    new_routes = {}
+    written = 0
+    for url, content, headers in routes(catalog):
+        body = encode_json(content)
+        etag = strong_etag(body)
+        entry = old_routes.get(url)
+        if entry is None or entry["etag"] != etag or not all((output / name).exists() for name in _files(entry)):
+            # Only changed responses pay for brotli and gzip at their highest levels
+            payload = EncodedPayload(body, thorough=True)
+            entry = {"file": file_of(url), "etag": etag, "bytes": len(body), "encodings": {}}
+            _write(output / entry["file"], body)
+            for coding, (data, variant_etag) in payload.variants.items():
+                name = entry["file"] + SUFFIXES[coding]
+                _write(output / name, data)
+                entry["encodings"][coding] = {"file": name, "etag": variant_etag, "bytes": len(data)}
+            written += 1
+        new_routes[url] = dict(entry, headers=headers)
+
+    keep = {name for entry in new_routes.values() for name in _files(entry)}
+    removed = 0
+    for entry in old_routes.values():
+        for name in _files(entry):
+            if name not in keep and (output / name).exists():
+                (output / name).unlink()
+                removed += 1
+
+    manifest = {
+        "format": EXPORT_FORMAT,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        # Loading may have issued ids for new products, so fingerprint after it
+        "sources": fingerprint(source_paths(data_dir)),
+        "images": manifest_version(),
+        "routes": new_routes,
+    }
+    _write(output / "manifest.json", (json.dumps(manifest, indent=1, sort_keys=True) + "\n").encode("utf-8"))
+    return {"routes": len(new_routes), "written": written, "removed": removed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the catalog GET endpoints into static, precompressed files")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output", type=Path, default=EXPORT_DIR)
+    parser.add_argument("--force", action="store_true", help="re-render and rewrite every file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = export(args.data_dir, args.output, args.force)
+    print(f"✅ {stats['routes']} routes in {args.output} ({stats['written']} rewritten, {stats['removed']} files removed) "
+          f"in {time.perf_counter() - started:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
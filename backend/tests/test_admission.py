@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+import admission
+from admission import RouteGate, RouteLimit, Shed, client_id
+
+
+def gate(**limits):
+    values = {"concurrency": 1, "queue": 1, "timeout": 0.05, "rate": 0, "burst": 2}
+    values.update(limits)
+    return RouteGate("/api/test", RouteLimit(**values))
+
+
+def test_token_bucket_refuses_past_burst():
+    route = gate(burst=2)
+    route.take_token("client", 0.0)
+    route.take_token("client", 0.0)
+    with pytest.raises(Shed) as shed:
+        route.take_token("client", 0.0)
+    assert (shed.value.status, shed.value.reason) == (429, "rate_limited")
+    # Other clients have buckets of their own
+    route.take_token("other", 0.0)
+
+
+def test_token_bucket_refills_at_rate():
+    route = gate(rate=10, burst=1)
+    route.take_token("client", 0.0)
+    with pytest.raises(Shed):
+        route.take_token("client", 0.05)
+    route.take_token("client", 0.2)
+
+
+def test_full_queue_is_refused_right_away():
+    async def run():
+        route = gate(concurrency=1, queue=0)
+        await route.acquire(time.monotonic())
+        with pytest.raises(Shed) as shed:
+            await route.acquire(time.monotonic())
+        return shed.value
+
+    shed = asyncio.run(run())
+    assert (shed.status, shed.reason) == (503, "queue_full")
+
+
+def test_waiter_past_its_deadline_is_shed():
+    async def run():
+        route = gate(concurrency=1, queue=4, timeout=0.02)
+        await route.acquire(time.monotonic())
+        with pytest.raises(Shed) as shed:
+            await route.acquire(time.monotonic())
+        return route, shed.value
+
+    route, shed = asyncio.run(run())
+    assert shed.reason == "deadline"
+    assert not route.waiters
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    async def run():
+        route = gate(concurrency=1, queue=4, timeout=1.0)
+        await route.acquire(time.monotonic())
+        waiter = asyncio.ensure_future(route.acquire(time.monotonic()))
+        await asyncio.sleep(0)
+        assert len(route.waiters) == 1
+        route.release(0.001)
+        await waiter
+        return route
+
+    route = asyncio.run(run())
+    assert route.active == 1
+
+
+def test_expected_wait_over_timeout_is_refused_on_arrival():
+    async def run():
+        route = gate(concurrency=1, queue=4, timeout=0.05)
+        route.service_time = 1.0
+        await route.acquire(time.monotonic())
+        with pytest.raises(Shed) as shed:
+            await route.acquire(time.monotonic())
+        return shed.value
+
+    assert asyncio.run(run()).reason == "deadline"
+
+
+def forwarded(value, client=("10.0.0.9", 1234)):
+    return {"headers": [(b"x-forwarded-for", value.encode())], "client": client}
+
+
+def test_client_id_ignores_forwarded_for_unless_trusted(monkeypatch):
+    monkeypatch.setattr(admission, "TRUST_FORWARDED_FOR", False)
+    assert client_id(forwarded("1.2.3.4")) == "10.0.0.9"
+
+
+def test_client_id_takes_the_entry_the_proxy_appended(monkeypatch):
+    monkeypatch.setattr(admission, "TRUST_FORWARDED_FOR", True)
+    # The client wrote the first two entries itself
+    assert client_id(forwarded("6.6.6.6, 7.7.7.7, 203.0.113.5")) == "203.0.113.5"
+    assert client_id(forwarded("6.6.6.6, 203.0.113.5, 10.0.0.2"), trusted_hops=2) == "203.0.113.5"
+    assert client_id(forwarded("203.0.113.5"), trusted_hops=3) == "203.0.113.5"
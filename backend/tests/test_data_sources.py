@@ -0,0 +1,65 @@
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from data_sources import DATA_DIR, IDS_FILE, check_stable_ids, discover, load_catalog_data
+
+
+@pytest.fixture
+def data_dir(tmp_path) -> Path:
+    copy = tmp_path / "data"
+    shutil.copytree(DATA_DIR, copy)
+    return copy
+
+
+def add_insurer(data_dir: Path, file_name: str, insurer: str, *names: str):
+    document = {"insurer": insurer, "document_year": 2025, "products": [{"name": name} for name in names]}
+    (data_dir / file_name).write_text(json.dumps(document), encoding="utf-8")
+
+
+def ids_by_name(data_dir: Path) -> dict:
+    products, _ = load_catalog_data(data_dir)
+    return {(product["company"]["name"], product["name"]): product["id"] for product in products}
+
+
+def test_ids_file_is_not_a_source(data_dir):
+    assert (data_dir / IDS_FILE).exists()
+    assert IDS_FILE not in {path.name for path in discover(data_dir)}
+
+
+def test_adding_a_file_keeps_issued_ids(data_dir):
+    before = ids_by_name(data_dir)
+    # Sorts before every other file, where positional numbering would shift them all
+    add_insurer(data_dir, "funeral_acme.json", "Acme Assurance", "Acme Funeral Plan")
+    after = ids_by_name(data_dir)
+
+    assert {key: after[key] for key in before} == before
+    assert after[("Acme Assurance", "Acme Funeral Plan")] == max(before.values()) + 1
+
+
+def test_removed_ids_are_not_reused(data_dir):
+    add_insurer(data_dir, "funeral_acme.json", "Acme Assurance", "Acme Funeral Plan")
+    acme_id = ids_by_name(data_dir)[("Acme Assurance", "Acme Funeral Plan")]
+    (data_dir / "funeral_acme.json").unlink()
+    add_insurer(data_dir, "funeral_zulu.json", "Zulu Life", "Zulu Funeral Plan")
+
+    ids = ids_by_name(data_dir)
+    assert ids[("Zulu Life", "Zulu Funeral Plan")] == acme_id + 1
+
+
+def test_concurrent_builds_agree_on_new_ids(data_dir):
+    add_insurer(data_dir, "funeral_acme.json", "Acme Assurance", *(f"Plan {n}" for n in range(20)))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: ids_by_name(data_dir), range(8)))
+
+    assert all(result == results[0] for result in results)
+    saved = json.loads((data_dir / IDS_FILE).read_text(encoding="utf-8"))
+    assert {entry["id"] for entry in saved["products"]} == set(results[0].values())
+    assert not list(data_dir.glob("*.tmp"))
+
+
+def test_check_stable_ids_passes(data_dir):
+    assert check_stable_ids(data_dir) == []
@@ -0,0 +1,82 @@
+import base64
+import json
+
+import pytest
+
+from catalog import ProductCatalog
+from listing import decode_cursor, encode_cursor, parse_sort, sort_key
+
+COMPANY = {"id": 1, "name": "Acme Life", "type": "life"}
+
+
+def product(product_id, name, premium):
+    return {
+        "id": product_id,
+        "name": name,
+        "category": "funeral",
+        "company_id": 1,
+        "company": COMPANY,
+        "premiums": [{"monthly_premium": premium}],
+    }
+
+
+@pytest.fixture
+def catalog():
+    premiums = [50, 20, 20, 80, 35, 60, 10]
+    return ProductCatalog([product(i, f"Plan {i}", premium) for i, premium in enumerate(premiums, 1)], [COMPANY])
+
+
+def raw_cursor(sort, after):
+    data = json.dumps({"sort": sort, "after": after}).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def test_cursor_round_trip():
+    sort = parse_sort("-name")
+    cursor = encode_cursor(sort, ["plan 3", 3])
+    assert decode_cursor(cursor, sort) == sort_key(["plan 3", 3], sort)
+
+
+@pytest.mark.parametrize("after", [
+    ["x", 2],  # a string where premium is a number
+    [1.0, "a"],  # a string id
+    [1.0, 2.5],  # a float id
+    [True, 2],  # booleans are not numbers here
+    [float("nan"), 2],
+    [1.0],  # too few values
+])
+def test_malformed_cursor_values_are_rejected(after):
+    sort = parse_sort("premium")
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor("premium,id", after), sort)
+
+
+def test_name_cursor_needs_a_string():
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor("name,id", [5, 2]), parse_sort("name"))
+
+
+def test_cursor_from_another_sort_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(parse_sort("name"), ["plan 1", 1]), parse_sort("premium"))
+
+
+def test_garbage_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor!", parse_sort(None))
+
+
+def test_pages_cover_every_product_once_in_sort_order(catalog):
+    sort = parse_sort("premium")
+    seen, cursor = [], None
+    while True:
+        page, cursor = catalog.listing().page(sort=sort, limit=3, cursor=cursor)
+        seen.extend(product["id"] for product in page)
+        if cursor is None:
+            break
+    assert seen == [7, 2, 3, 5, 1, 6, 4]
+
+
+def test_null_premium_cursor_is_accepted(catalog):
+    page, _ = catalog.listing().page(sort=parse_sort("premium"), cursor=raw_cursor("premium,id", [None, 2]))
+    assert page == []
@@ -0,0 +1,89 @@
+from datetime import date
+
+import pytest
+
+from catalog import ProductCatalog, parse_as_of
+
+COMPANY = {"id": 1, "name": "Pula Medical", "type": "medical"}
+
+
+def bands(low, high):
+    return [
+        {"min_salary": 0, "max_salary": 9999, "monthly_premium": low},
+        {"min_salary": 10000, "max_salary": None, "monthly_premium": high},
+    ]
+
+
+def medical(product_id, versions):
+    """A product whose price versions are (effective_from, (low, high)) pairs, oldest first"""
+    schedule = [{"effective_from": starts, "premiums": bands(*prices)} for starts, prices in versions]
+    product = {
+        "id": product_id,
+        "name": f"Plan {product_id}",
+        "category": "medical",
+        "company_id": 1,
+        "company": COMPANY,
+        "effective_from": schedule[-1]["effective_from"],
+        "premiums": schedule[-1]["premiums"],
+    }
+    if len(schedule) > 1:
+        product["price_schedule"] = schedule
+    return product
+
+
+@pytest.fixture
+def catalog():
+    return ProductCatalog([
+        medical(1, [("2024-01-01", (100, 200)), ("2025-01-01", (110, 220))]),
+        medical(2, [("2025-07-01", (300, 400))]),
+    ], [COMPANY])
+
+
+def test_parse_as_of():
+    assert parse_as_of("2024") == date(2024, 1, 1)
+    assert parse_as_of("2024-06-30") == date(2024, 6, 30)
+    assert parse_as_of(None) is None
+    with pytest.raises(ValueError):
+        parse_as_of("last year")
+
+
+def test_current_prices_without_as_of(catalog):
+    product = catalog.get(1)
+    assert catalog.price_version(product) is product
+    assert catalog.salary_bands(product).lookup(5000) == 110
+
+
+def test_price_version_in_force_on_a_day(catalog):
+    product = catalog.get(1)
+    assert catalog.price_version(product, date(2024, 6, 1))["effective_from"] == "2024-01-01"
+    assert catalog.salary_bands(product, date(2024, 6, 1)).lookup(20000) == 200
+    assert catalog.salary_bands(product, date(2025, 1, 1)).lookup(20000) == 220
+
+
+def test_nothing_in_force_before_the_first_version(catalog):
+    product = catalog.get(2)
+    assert catalog.price_version(product, date(2025, 1, 1)) is None
+    assert catalog.salary_bands(product, date(2025, 1, 1)).lookup(5000) is None
+
+
+def test_eras_split_time_at_every_start_day(catalog):
+    assert catalog.era(date(2023, 12, 31)) == 0
+    assert catalog.era(date(2024, 1, 1)) == 1
+    assert catalog.era(date(2025, 3, 1)) == 2
+    assert catalog.era(date(2030, 1, 1)) == catalog.era() == catalog.latest_era == 3
+
+
+def test_compare_as_of_uses_past_prices(catalog):
+    rows = {row["id"]: row for row in catalog.compare([1, 2], salary=5000, as_of=date(2024, 6, 1))}
+    assert rows[1]["calculated_premium"] == 100
+    assert rows[1]["effective_from"] == "2024-01-01"
+    assert rows[2]["calculated_premium"] is None
+
+    current = {row["id"]: row for row in catalog.compare([1, 2], salary=5000)}
+    assert (current[1]["calculated_premium"], current[2]["calculated_premium"]) == (110, 300)
+
+
+def test_band_matrix_of_a_past_era(catalog):
+    past = catalog.band_matrix("medical", date(2024, 6, 1))
+    assert past.row(20000) == (200, None)
+    assert catalog.band_matrix("medical").row(20000) == (220, 400)
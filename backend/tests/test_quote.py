@@ -0,0 +1,99 @@
+import pytest
+
+from catalog import ProductCatalog
+
+COMPANY = {"id": 1, "name": "Acme Life", "type": "life"}
+
+
+def product(product_id, category, premiums, age_min=18, age_max=64, **fields):
+    return {
+        "id": product_id,
+        "name": f"Plan {product_id}",
+        "category": category,
+        "company_id": 1,
+        "company": COMPANY,
+        "age_min": age_min,
+        "age_max": age_max,
+        "premiums": premiums,
+        **fields,
+    }
+
+
+def bands(low, high):
+    return [
+        {"min_salary": 0, "max_salary": 5000, "monthly_premium": low},
+        {"min_salary": 5001, "max_salary": None, "monthly_premium": high},
+    ]
+
+
+@pytest.fixture
+def engine():
+    return ProductCatalog([
+        product(1, "medical", bands(100, 300)),
+        product(2, "medical", bands(150, 200), age_max=70),
+        product(3, "funeral", [
+            {"cover_amount": 10000, "monthly_premium": 40},
+            {"cover_amount": 20000, "monthly_premium": 60},
+        ], age_max=75, key_features=["Main member, spouse and up to 4 children"]),
+        product(4, "funeral", [], age_max=60),
+    ], [COMPANY]).quotes()
+
+
+def quoted(result):
+    return [(quote["id"], quote["monthly_premium"]) for quote in result["quotes"]]
+
+
+def test_premium_follows_the_salary_band(engine):
+    assert quoted(engine.quote(age=30, salary=4000, category="medical")) == [(1, 100), (2, 150)]
+    assert quoted(engine.quote(age=30, salary=9000, category="medical")) == [(2, 200), (1, 300)]
+
+
+def test_age_limits_decide_eligibility(engine):
+    result = engine.quote(age=68, salary=4000)
+    assert quoted(result) == [(3, 40), (2, 150)]
+    assert (result["total"], result["ineligible"]) == (2, 2)
+    assert engine.quote(age=80)["total"] == 0
+
+
+def test_cheapest_cover_option_of_at_least_the_cover_wanted(engine):
+    best = engine.quote(age=40, cover=15000, category="funeral")["quotes"][0]
+    assert (best["id"], best["monthly_premium"], best["cover"]) == (3, 60, 20000)
+    # More cover than any option is not quoted
+    assert [quote["id"] for quote in engine.quote(age=40, cover=50000, category="funeral")["quotes"]] == [4]
+
+
+def test_dependants_beyond_the_family_cover(engine):
+    assert 3 in [quote["id"] for quote in engine.quote(age=40, dependants=5)["quotes"]]
+    assert 3 not in [quote["id"] for quote in engine.quote(age=40, dependants=6)["quotes"]]
+
+
+def test_unpriced_products_come_last(engine):
+    assert quoted(engine.quote(age=40, salary=4000)) == [(3, 40), (1, 100), (2, 150), (4, None)]
+
+
+def test_limit(engine):
+    result = engine.quote(age=40, salary=4000, limit=2)
+    assert result["total"] == 4
+    assert quoted(result) == [(3, 40), (1, 100)]
+
+
+def test_quote_many_keeps_profile_order(engine):
+    profiles = [
+        {"age": 30, "salary": 9000, "category": "medical"},
+        {"age": 30, "salary": 4000, "category": "medical"},
+        {"age": 30, "salary": 9500, "category": "medical"},
+    ]
+    results = engine.quote_many(profiles, limit=1)
+    assert [quoted(result) for result in results] == [[(2, 200)], [(1, 100)], [(2, 200)]]
+    assert results == [engine.quote(**profile, limit=1) for profile in profiles]
+
+
+def test_batch_request_is_capped():
+    pytest.importorskip("pydantic")
+    from pydantic import ValidationError
+
+    from quote import MAX_BATCH_PROFILES
+    from schemas import QuoteBatchRequest
+
+    with pytest.raises(ValidationError):
+        QuoteBatchRequest(profiles=[{"age": 30}] * (MAX_BATCH_PROFILES + 1))
@@ -0,0 +1,56 @@
+import pytest
+
+from search import SearchIndex, tokenize
+
+COMPANY = {"id": 1, "name": "Acme Life", "type": "life"}
+
+
+def product(product_id, name, **fields):
+    return {"id": product_id, "name": name, "category": "funeral", "company": COMPANY, **fields}
+
+
+@pytest.fixture
+def index():
+    return SearchIndex([
+        product(1, "Family Funeral Plan", sum_assured="P9,240 per member", key_features=["Repatriation"]),
+        product(2, "Repatriation Cover", key_features=["Grocery benefit"]),
+        product(3, "Basic Plan", sum_assured="BWP 20,000", key_features=["Repatriation", "Tombstone"]),
+    ])
+
+
+def ids(index, query, **options):
+    return [found["id"] for found, _ in index.search(query, **options)[1]]
+
+
+def test_tokenize_splits_currency_from_amount():
+    assert tokenize("P9,240 per month") == ["p", "9240", "per", "month"]
+    assert tokenize("BWP20,000") == ["bwp", "20000"]
+    # Other words that start with p are left alone
+    assert tokenize("Plan for P1") == ["plan", "p", "1"]
+
+
+@pytest.mark.parametrize("query", ["9240", "9,240", "P9,240", "p 9240"])
+def test_amounts_are_found_however_they_are_written(index, query):
+    assert ids(index, query) == [1]
+
+
+def test_name_matches_rank_above_feature_matches(index):
+    assert ids(index, "repatriation")[0] == 2
+    assert sorted(ids(index, "repatriation")) == [1, 2, 3]
+
+
+def test_words_match_as_prefixes_and_all_must_match(index):
+    assert ids(index, "tomb") == [3]
+    assert ids(index, "repatriation tomb") == [3]
+    assert ids(index, "grocery tomb") == []
+
+
+def test_stopwords_and_empty_queries_find_nothing(index):
+    assert index.search("the and of") == (0, [])
+    assert index.search("") == (0, [])
+
+
+def test_limit_and_total(index):
+    total, hits = index.search("repatriation", limit=1)
+    assert total == 3
+    assert len(hits) == 1
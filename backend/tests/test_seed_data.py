@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("pydantic")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import queries  # noqa: E402
+import seed_data  # noqa: E402
+from catalog import ProductCatalog  # noqa: E402
+from data_sources import load_catalog_data  # noqa: E402
+
+COMPARED_FIELDS = ("id", "name", "category", "company_id", "premiums", "effective_from", "sum_assured", "key_features")
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(seed_data, "engine", engine)
+    seed_data.seed_database()
+    return engine
+
+
+def plain(value):
+    # The JSON catalog holds tuples, the database hands back lists
+    return json.loads(json.dumps(value))
+
+
+def test_funeral_product_matches_json_catalog(engine):
+    catalog = ProductCatalog(*load_catalog_data())
+    funeral = catalog.by_category("funeral")[0]
+
+    with Session(engine) as db:
+        stored = queries.serialize_product(queries.get_product(db, funeral["id"]))
+        premiums = queries.premiums_for_salary(db, [funeral["id"]], 5000)
+
+    assert {field: plain(stored.get(field)) for field in COMPARED_FIELDS} == {
+        field: plain(funeral.get(field)) for field in COMPARED_FIELDS
+    }
+    assert stored["premiums"]
+    assert premiums.get(funeral["id"]) == catalog.salary_bands(funeral).lookup(5000)
+
+
+def test_reseeding_unchanged_data_writes_nothing(engine):
+    result = seed_data.seed_database()
+    assert result["products_inserted"] == result["products_updated"] == result["products_removed"] == 0
+    assert result["pricing_rules_written"] == 0
@@ -1,12 +1,15 @@
 const API_BASE = "/api";
 let selectedProducts = new Set();
 
+// Fields the product cards and comparison checkboxes actually use
+const CATALOG_FIELDS = [
+    'id', 'name', 'category', 'company', 'premiums', 'calculated_premium',
+    'annual_limit', 'sum_assured', 'waiting_period_natural', 'co_payment', 'image'
+].join(',');
+
 // Load all products on page load
 document.addEventListener('DOMContentLoaded', function() {
-    loadMedicalPlans();
-    loadLifePlans();
-    loadFuneralPlans();
-    loadHospitalCashPlans();
+    loadCatalog();
     
     // Setup lead form
     document.getElementById('leadForm').addEventListener('submit', submitLead);
@@ -15,43 +18,18 @@ document.addEventListener('DOMContentLoaded', function() {
     updateSelectedCount();
 });
 
-async function loadMedicalPlans() {
-    try {
-        const response = await fetch(`${API_BASE}/api/products?category=medical`);
-        const products = await response.json();
-        displayMedicalPlans(products);
-    } catch (error) {
-        console.error('Error loading medical plans:', error);
-    }
-}
-
-async function loadLifePlans() {
+// One request for every category instead of one per category
+async function loadCatalog() {
     try {
-        const response = await fetch(`${API_BASE}/api/products?category=life`);
-        const products = await response.json();
-        displayProducts(products, 'lifePlans');
+        const response = await fetch(`${API_BASE}/api/catalog?fields=${CATALOG_FIELDS}`);
+        const catalog = await response.json();
+        const categories = catalog.categories || {};
+        displayMedicalPlans(categories.medical || []);
+        displayProducts(categories.life || [], 'lifePlans');
+        displayProducts(categories.funeral || [], 'funeralPlans');
+        displayProducts(categories.hospital_cash || [], 'hospitalCashPlans');
     } catch (error) {
-        console.error('Error loading life plans:', error);
-    }
-}
-
-async function loadFuneralPlans() {
-    try {
-        const response = await fetch(`${API_BASE}/api/products?category=funeral`);
-        const products = await response.json();
-        displayProducts(products, 'funeralPlans');
-    } catch (error) {
-        console.error('Error loading funeral plans:', error);
-    }
-}
-
-async function loadHospitalCashPlans() {
-    try {
-        const response = await fetch(`${API_BASE}/api/products?category=hospital_cash`);
-        const products = await response.json();
-        displayProducts(products, 'hospitalCashPlans');
-    } catch (error) {
-        console.error('Error loading hospital cash plans:', error);
+        console.error('Error loading catalog:', error);
     }
 }
 
@@ -130,7 +108,8 @@ if (logoData.image) {
     div.innerHTML = `
         <div class="card product-card h-100">
             <!-- Product Image with Company Logo -->
-            <div class="product-image" style="background-image: url('${productImage}')">
+            <div class="product-image" ${product.image ? '' : `style="background-image: url('${productImage}')"`}>
+                ${responsiveImageHtml(product.image, product.name, 'product-photo')}
                 <div class="product-overlay"></div>
                 ${logoHtml}
             </div>
@@ -310,14 +289,16 @@ function generateComparisonTable(products) {
                 <!-- Product Image -->
                 <div class="comparison-product-image mb-3" style="
                     height: 80px;
-                    background-image: url('${productImage}');
+                    ${p.image ? '' : `background-image: url('${productImage}');`}
                     background-size: cover;
                     background-position: center;
                     border-radius: 10px;
                     position: relative;
                     margin: 0 auto;
                     width: 90%;
+                    overflow: hidden;
                 ">
+                    ${responsiveImageHtml(p.image, p.name, 'product-photo', '(min-width: 768px) 25vw, 45vw')}
                     <!-- Company Logo in top-right -->
                     <div class="comparison-logo-container" style="
                         position: absolute;
@@ -534,6 +515,26 @@ function scrollToSection(sectionId) {
 
 // ==== IMAGE FUNCTIONS ====
 
+// Resized WebP/JPEG variants the API lists per product (backend/images.py build);
+// the browser downloads only the width the layout needs, and only when scrolled near
+function responsiveImageHtml(image, alt, className, sizes) {
+    if (!image) return '';
+    const url = path => path.startsWith('/') ? `${API_BASE}${path}` : path;
+    const urls = srcset => srcset.split(', ').map(url).join(', ');
+    const sizesAttr = sizes || image.sizes;
+    const sources = (image.sources || []).map(source =>
+        `<source type="${source.type}" srcset="${urls(source.srcset)}" sizes="${sizesAttr}">`
+    ).join('');
+    return `
+        <picture>
+            ${sources}
+            <img src="${url(image.src)}" srcset="${urls(image.srcset)}" sizes="${sizesAttr}"
+                 width="${image.width}" height="${image.height}" alt="${alt}"
+                 class="${className}" loading="lazy" decoding="async">
+        </picture>
+    `;
+}
+
 function getProductImage(productName, companyName) {
     // Map product names to your local images
     const imageMap = {